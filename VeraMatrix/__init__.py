@@ -0,0 +1,48 @@
+"""VeraMatrix: a simulated universe of NPCs.
+
+Importing the package has no side effects. numpy, matplotlib and tkinter are
+only loaded when a simulation draws its first day of random numbers, or
+when the vectorized engine, checkpoints, the social graph, an archive, an
+ensemble, a plot or the GUI is used. Run
+``python -m VeraMatrix --help`` for the command line interface.
+"""
+from .cli import main, simulate
+from .economy import EconomyAggregates, QuantileSketch
+from .metrics import Metrics
+from .npc import NPC, random_age, random_location, random_name
+from .paths import set_base_dir
+from .population import Population
+from .query import QueryReport
+from .reporting import Pacing, StatusReporter
+from .rng import RandomStreams
+from .scheduler import EventScheduler
+from .storage import LogWriter, NullStorage, PerNPCStorage, WorldStorage, log_writer, migrate_per_npc_files
+from .timeseries import PopulationTimeline, TimeSeries
+from .universe import Universe, create_universe
+from .world import Country, Planet, State, Technology, build_earth
+
+__all__ = [
+    "main", "simulate", "NPC", "random_age", "random_location", "random_name", "set_base_dir",
+    "Population", "QueryReport", "EconomyAggregates", "QuantileSketch", "Pacing", "StatusReporter", "Metrics", "RandomStreams", "EventScheduler", "LogWriter", "NullStorage", "PerNPCStorage",
+    "WorldStorage", "log_writer", "migrate_per_npc_files", "PopulationTimeline", "TimeSeries", "Universe", "create_universe",
+    "Country", "Planet", "State", "Technology", "build_earth", "VectorizedPopulation", "NPCApp",
+    "CheckpointManager", "load_checkpoint", "SocialGraph",
+    "EventArchive", "archive_storage", "Ensemble",
+]
+
+_LAZY = {
+    "VectorizedPopulation": "vectorized",
+    "NPCApp": "gui",
+    "CheckpointManager": "checkpoint",
+    "load_checkpoint": "checkpoint",
+    "SocialGraph": "social",
+    "EventArchive": "archive",
+    "archive_storage": "archive",
+    "Ensemble": "ensemble",
+}
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
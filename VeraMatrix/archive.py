@@ -0,0 +1,377 @@
+"""Columnar archives of the NPC records of finished runs.
+
+An archive is a directory of append-only segment files plus `manifest.json`.
+Every segment holds up to `SEGMENT_ROWS` rows of one table, sorted by NPC id
+and date, and stores each column as its own zlib-compressed block:
+
+- NPC ids and dates (days since 1970) are delta encoded, so long runs of the
+  same NPC or day shrink to almost nothing.
+- Text columns (event, thoughts, location, mood, ...) are codes into
+  dictionaries that grow with every append and never renumber.
+- `consequences` is split into a dictionary template and its number, so
+  "Gained 123.45 money" becomes the template "Gained {:.2f} money" and the
+  float 123.45.
+- REAL columns are XORed with the previous row and byte-shuffled before
+  compression. Values that repeat from one day to the next turn into zeros.
+
+The manifest records each segment's NPC id and date ranges, the event codes it
+contains and where each block sits in its file. `EventArchive.query` skips
+segments that cannot match and decompresses only the blocks it reads.
+Appending writes new segment files and atomically replaces the manifest;
+existing segments are never rewritten. Requires numpy.
+"""
+import glob
+import json
+import os
+import re
+import sqlite3
+import zlib
+
+import numpy as np
+
+from . import paths
+from .storage import PLANET_DIR, NullStorage, WorldStorage, location_names, log_writer
+
+FORMAT_VERSION = 1
+SEGMENT_ROWS = 1 << 17  # Rows per segment: the unit of skipping and of decompression
+COMPRESSION_LEVEL = 6
+MANIFEST = "manifest.json"
+
+# Column kinds: "id" and "date" are delta-encoded integers, "text" dictionary codes,
+# "template" a dictionary template plus a float, "real" XOR-encoded floats, "flag" one byte
+TABLES = {
+    "Npcs": (("npc_id", "id"), ("name", "text"), ("country", "text"), ("state", "text")),
+    "LifeEvents": (("npc_id", "id"), ("date", "date"), ("event", "text"), ("consequences", "template"),
+                   ("choice_quality", "text")),
+    "Finances": (("npc_id", "id"), ("date", "date"), ("money", "real")),
+    "Family": (("npc_id", "id"), ("name", "text"), ("relation", "text")),
+    "Status": (("npc_id", "id"), ("date", "date"), ("health", "real"), ("intelligence", "real"),
+               ("work_skill", "real"), ("social_skill", "real"), ("survival_skill", "real"),
+               ("stress_level", "real"), ("thoughts", "text"), ("location", "text"), ("time_of_day", "text"),
+               ("self_awareness", "flag"), ("mood", "text")),
+}
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def _template(text):
+    """(template, value) of a consequences string; value is NaN if no number could be split off losslessly."""
+    if text is None:
+        return None, np.nan
+    match = NUMBER.search(text)
+    if match is not None:
+        number = match.group()
+        decimals = len(number) - number.index(".") - 1 if "." in number else 0
+        template = (text[:match.start()].replace("{", "{{").replace("}", "}}") + f"{{:.{decimals}f}}"
+                    + text[match.end():].replace("{", "{{").replace("}", "}}"))
+        value = float(number)
+        if template.format(value) == text:  # Leading zeros and the like stay in the template
+            return template, value
+    return text.replace("{", "{{").replace("}", "}}"), np.nan
+
+def _dates(values):
+    """Days since 1970 of 'YYYY-MM-DD' strings (or dates); -1 for missing ones."""
+    days = np.array([value if value else "NaT" for value in values], dtype="datetime64[D]")
+    return np.where(np.isnat(days), -1, days.astype(np.int64)).astype(np.int32)
+
+def _day(value):
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+def _code_dtype(size):
+    return np.uint8 if size <= 1 << 8 else np.uint16 if size <= 1 << 16 else np.uint32
+
+def _shuffle(data):
+    """Byte-transpose fixed-width values, so equal high bytes end up next to each other."""
+    return np.ascontiguousarray(data.view(np.uint8).reshape(-1, data.itemsize).T).tobytes()
+
+def _unshuffle(data, dtype, count):
+    width = np.dtype(dtype).itemsize
+    return np.frombuffer(data, dtype=np.uint8).reshape(width, count).T.copy().view(dtype).ravel()
+
+class EventArchive:
+    """An archive directory: `append` segments to it and `query` them back."""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+            if self.manifest["format"] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported archive format {self.manifest['format']} in {path}")
+        else:
+            self.manifest = {"format": FORMAT_VERSION, "dictionaries": {}, "tables": {}, "next_segment": 1}
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.manifest["dictionaries"].items()}
+
+    @property
+    def nbytes(self):
+        """Bytes on disk, manifest included."""
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.path, "*")))
+
+    def segments(self, table):
+        return self.manifest["tables"].get(table, [])
+
+    def rows(self, table):
+        return sum(segment["rows"] for segment in self.segments(table))
+
+    def _encode_text(self, name, values):
+        values_list = self.manifest["dictionaries"].setdefault(name, [])
+        codes = self._codes.setdefault(name, {})
+        encoded = []
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(values_list)
+                values_list.append(value)
+            encoded.append(code)
+        return np.array(encoded, dtype=np.int64)
+
+    def _write_segment(self, table, columns):
+        """Write one segment of already sorted columns and return its manifest entry."""
+        name = f"{table}-{self.manifest['next_segment']:06d}.seg"
+        self.manifest["next_segment"] += 1
+        blocks = {}
+        stats = {"file": name, "rows": len(columns["npc_id"]), "blocks": blocks,
+                 "npc_id": [int(columns["npc_id"][0]), int(columns["npc_id"][-1])]}
+        offset = 0
+        with open(os.path.join(self.path, name), "wb") as f:
+            for column, kind in TABLES[table]:
+                for block, data, dtype, encoding in self._encode_column(table, column, kind, columns[column], stats):
+                    compressed = zlib.compress(data, COMPRESSION_LEVEL)
+                    f.write(compressed)
+                    blocks[block] = {"offset": offset, "length": len(compressed), "dtype": np.dtype(dtype).str,
+                                     "encoding": encoding}
+                    offset += len(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        return stats
+
+    def _encode_column(self, table, column, kind, values, stats):
+        if kind == "id":
+            values = np.asarray(values, dtype=np.int64)
+            yield column, np.diff(values, prepend=0).tobytes(), np.int64, "delta"
+        elif kind == "date":
+            valid = values[values >= 0]
+            stats["date"] = [int(valid.min()), int(valid.max())] if len(valid) else None
+            yield column, np.diff(values.astype(np.int64), prepend=0).astype(np.int32).tobytes(), np.int32, "delta"
+        elif kind == "text" or kind == "template":
+            codes = values if kind == "text" else values[0]
+            dtype = _code_dtype(len(self.manifest["dictionaries"][f"{table}.{column}"]))
+            if column == "event":
+                stats["events"] = np.unique(codes).tolist()
+            yield column, codes.astype(dtype).tobytes(), dtype, "codes"
+            if kind == "template":
+                yield f"{column}.value", _shuffle(values[1]), np.float64, "shuffle"
+        elif kind == "real":
+            bits = values.view(np.uint64)
+            previous = np.zeros_like(bits)
+            previous[1:] = bits[:-1]
+            yield column, _shuffle(bits ^ previous), np.uint64, "xor"
+        else:
+            yield column, values.astype(np.uint8).tobytes(), np.uint8, "raw"
+
+    def append(self, table, rows):
+        """Add `rows` (tuples in `TABLES[table]` column order) to the archive as new segments."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown archive table: {table}")
+        schema = TABLES[table]
+        rows = list(rows)
+        if not rows:
+            return 0
+        values = dict(zip((column for column, _ in schema), zip(*rows)))
+        columns = {}
+        for column, kind in schema:
+            data = values[column]
+            if kind == "id":
+                columns[column] = np.array(data, dtype=np.int64)
+            elif kind == "date":
+                columns[column] = _dates(data)
+            elif kind == "text":
+                columns[column] = self._encode_text(f"{table}.{column}", data)
+            elif kind == "template":
+                templates, numbers = zip(*map(_template, data))
+                columns[column] = (self._encode_text(f"{table}.{column}", templates), np.array(numbers))
+            elif kind == "real":
+                columns[column] = np.array([np.nan if value is None else value for value in data], dtype=np.float64)
+            else:
+                columns[column] = np.array([bool(value) for value in data], dtype=np.uint8)
+        keys = (columns["date"], columns["npc_id"]) if "date" in columns else (columns["npc_id"],)
+        order = np.lexsort(keys)  # Stable: rows of one NPC and day keep their logged order
+        segments = self.manifest["tables"].setdefault(table, [])
+        for start in range(0, len(rows), SEGMENT_ROWS):
+            part = order[start:start + SEGMENT_ROWS]
+            segments.append(self._write_segment(table, {
+                column: tuple(v[part] for v in value) if isinstance(value, tuple) else value[part]
+                for column, value in columns.items()}))
+        self._save_manifest()
+        return len(rows)
+
+    def _save_manifest(self):
+        path = os.path.join(self.path, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(path + ".tmp", path)  # Readers see the old segment list or the new one, never half of it
+
+    def _read_block(self, f, block, count):
+        data = zlib.decompress(self._read(f, block))
+        dtype = np.dtype(block["dtype"])
+        if block["encoding"] == "delta":
+            return np.cumsum(np.frombuffer(data, dtype=dtype), dtype=np.int64)
+        if block["encoding"] == "xor":
+            return np.bitwise_xor.accumulate(_unshuffle(data, dtype, count)).view(np.float64)
+        if block["encoding"] == "shuffle":
+            return _unshuffle(data, dtype, count)
+        return np.frombuffer(data, dtype=dtype)
+
+    @staticmethod
+    def _read(f, block):
+        f.seek(block["offset"])
+        return f.read(block["length"])
+
+    def _matches(self, segment, ids, start, end, events):
+        low, high = segment["npc_id"]
+        if ids is not None and not np.any((ids >= low) & (ids <= high)):
+            return False
+        dates = segment.get("date")
+        if (start is not None or end is not None) and dates is None:
+            return False
+        if start is not None and dates[1] < start or end is not None and dates[0] > end:
+            return False
+        return events is None or not set(segment["events"]).isdisjoint(events)
+
+    def scan(self, table, npcs=None, start=None, end=None, events=None, columns=None):
+        """Yield the matching rows segment by segment, as {column: array} dicts.
+
+        `npcs` is an NPC id or an iterable of ids; `start` and `end` are
+        inclusive dates ('YYYY-MM-DD' strings or dates); `events` is an
+        event name or a list of names (LifeEvents only). `columns` limits the
+        columns read. Dates come back as numpy datetime64 values and text
+        columns as object arrays of strings.
+        """
+        if table not in TABLES:
+            raise ValueError(f"Unknown archive table: {table}")
+        schema = dict(TABLES[table])
+        columns = list(columns or schema)
+        unknown = [column for column in columns if column not in schema]
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+        if (start is not None or end is not None) and "date" not in schema:
+            raise ValueError(f"{table} has no date column")
+        if events is not None and table != "LifeEvents":
+            raise ValueError("Only LifeEvents can be filtered by event")
+        ids = None if npcs is None else np.unique(np.atleast_1d(np.asarray(npcs, dtype=np.int64)))
+        start = _day(start) if start is not None else None
+        end = _day(end) if end is not None else None
+        if events is not None:
+            codes = self._codes.get("LifeEvents.event", {})
+            events = {codes[event] for event in ([events] if isinstance(events, str) else events) if event in codes}
+        for segment in self.segments(table):
+            if not self._matches(segment, ids, start, end, events):
+                continue
+            count = segment["rows"]
+            blocks = segment["blocks"]
+            with open(os.path.join(self.path, segment["file"]), "rb") as f:
+                cache = {}
+
+                def read(block):
+                    if block not in cache:
+                        cache[block] = self._read_block(f, blocks[block], count)
+                    return cache[block]
+                mask = np.ones(count, dtype=bool)
+                if ids is not None:
+                    mask &= np.isin(read("npc_id"), ids)
+                if start is not None:
+                    mask &= read("date") >= start
+                if end is not None:
+                    mask &= read("date") <= end
+                if events is not None:
+                    mask &= np.isin(read("event"), list(events))
+                rows = np.flatnonzero(mask)
+                if not len(rows):
+                    continue
+                yield {column: self._decode(table, column, schema[column], read, rows) for column in columns}
+
+    def _decode(self, table, column, kind, read, rows):
+        if kind == "date":
+            days = read(column)[rows]
+            return np.where(days >= 0, days, np.iinfo(np.int64).min).astype("datetime64[D]")
+        if kind == "text" or kind == "template":
+            values = np.array(self.manifest["dictionaries"][f"{table}.{column}"], dtype=object)[read(column)[rows]]
+            if kind == "template":
+                numbers = read(f"{column}.value")[rows]
+                values = np.array([None if template is None else template.format(number)
+                                   for template, number in zip(values, numbers)], dtype=object)
+            return values
+        if kind == "flag":
+            return read(column)[rows].astype(bool)
+        return read(column)[rows]
+
+    def query(self, table, npcs=None, start=None, end=None, events=None, columns=None):
+        """All rows matching the filters as one {column: array} dict; see `scan`."""
+        parts = list(self.scan(table, npcs, start, end, events, columns))
+        names = list(columns or dict(TABLES[table]))
+        if not parts:
+            return {column: np.zeros(0) for column in names}
+        return {column: np.concatenate([part[column] for part in parts]) for column in names}
+
+def _world_sources(storage):
+    for path in sorted(glob.glob(os.path.join(storage.directory, "world*.sqlite"))):
+        log_writer.flush(path)
+        conn = sqlite3.connect(path)
+        try:
+            for table in TABLES:
+                schema = dict(TABLES[table])
+                order = "npc_id, date, rowid" if "date" in schema else "npc_id, rowid"  # Through the npc_id indexes
+                yield table, conn.execute(f"SELECT {', '.join(schema)} FROM {table} ORDER BY {order}")
+        finally:
+            conn.close()
+
+def _file_sources(source_dir, planets=None):
+    """Rows of every per-NPC file, numbered in path order as `migrate_per_npc_files` does."""
+    names = location_names(planets)
+    npc_id = 0
+    for path in sorted(glob.glob(os.path.join(source_dir, PLANET_DIR, "*", "*", "*_db.sqlite"))):
+        state_dir = os.path.dirname(path)
+        country = names.get(os.path.basename(os.path.dirname(state_dir)))
+        state = names.get(os.path.basename(state_dir))
+        if country is None or state is None:
+            continue
+        npc_id += 1
+        name = os.path.basename(path)[:-len("_db.sqlite")].replace('_', ' ').title()
+        yield "Npcs", [(npc_id, name, country, state)]
+        log_writer.flush(path)
+        conn = sqlite3.connect(path)
+        try:
+            for table in TABLES:
+                if table != "Npcs":
+                    columns = ", ".join(column for column, _ in TABLES[table][1:])
+                    yield table, ((npc_id, *row) for row in conn.execute(f"SELECT {columns} FROM {table} ORDER BY rowid"))
+        finally:
+            conn.close()
+
+def archive_storage(path, storage=None, source_dir=None, planets=None):
+    """Copy every NPC record of a finished run into the archive at `path` and return it.
+
+    `storage` is the run's backend (a `WorldStorage` or the per-NPC files,
+    the default). Per-NPC files carry no ids, so their NPCs are numbered in
+    path order and listed in the archive's Npcs table with their name,
+    country and state, recognised among those of `planets` (the bundled
+    Earth by default). The SQLite files are left in place.
+    """
+    if isinstance(storage, NullStorage):
+        raise ValueError("A run without stored records has nothing to archive")
+    archive = EventArchive(path)
+    if isinstance(storage, WorldStorage):
+        sources = _world_sources(storage)
+    else:
+        sources = _file_sources(source_dir or paths.base_dir, planets)
+    pending = {table: [] for table in TABLES}
+    for table, rows in sources:
+        buffer = pending[table]
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= SEGMENT_ROWS:
+                archive.append(table, buffer)
+                buffer.clear()
+    for table, buffer in pending.items():
+        archive.append(table, buffer)
+    return archive
@@ -0,0 +1,104 @@
+"""Bulk NPC creation: many NPCs' attributes sampled in one numpy pass.
+
+Creating an NPC takes `CREATE_DRAWS` uniform draws, in the order the
+one-at-a-time helpers would take them: first and last name, age, planet,
+country, state, then health, intelligence, the three skills, personality and
+stress. `build_npcs` turns an array of such draws, one row per NPC, into NPC
+objects. It does the arithmetic of `Dice.choice`, `randint` and `uniform` on
+whole columns and looks locations up per country through the alias tables.
+It fills the NPCs' slots directly, as a checkpoint load does. Ids are
+reserved from the storage backend in one block, and names are made unique
+with them (see `npc.unique_name`). The caller registers the NPCs with
+`register_many`, which creates their storage rows in one transaction per
+shard. Requires numpy.
+"""
+import gc
+
+import numpy as np
+
+from .npc import (FIRST_NAMES, HOME_CODES, LAST_NAMES, LOCATION_CODES, MOOD_CODES, NPC, PERSONALITY_TRAITS,
+                  THOUGHT_CODES, unique_name)
+
+CREATE_DRAWS = 13
+ADULT_AGES = (18, 70)  # Range of starting NPCs' ages, as random_age draws them
+BIRTH_AGES = (0, 30)  # Newborns and immigrants
+BATCH = 65536  # NPCs sampled per numpy pass, to bound the size of the draw arrays
+_BASE_NAMES = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+
+def _pick(column, size):
+    """`Dice.choice` index of each draw in `column` among `size` items."""
+    return (column * size).astype(np.int64)
+
+def _uniform(column, a, b):
+    return a + (b - a) * column
+
+def _locations(draws, planets):
+    """(country code, state code, home code) arrays of the planet/country/state draws in `draws`."""
+    size = len(draws)
+    countries = np.empty(size, dtype=np.int64)
+    states = np.empty(size, dtype=np.int64)
+    homes = np.empty(size, dtype=np.int64)
+    planet_of = _pick(draws[:, 0], len(planets))
+    for p, planet in enumerate(planets):
+        rows = np.flatnonzero(planet_of == p) if len(planets) > 1 else np.arange(size)
+        candidates, picked = planet.destinations(None, draws[rows, 1])
+        order = np.argsort(picked, kind="stable")
+        values, starts = np.unique(picked[order], return_index=True)
+        for c, group in zip(values.tolist(), np.split(rows[order], starts[1:])):
+            country = candidates[c]
+            state_of = country.state_table.index_array(draws[group, 2])
+            countries[group] = LOCATION_CODES.code(country.name)
+            states[group] = np.array([LOCATION_CODES.code(state.name) for state in country.states])[state_of]
+            homes[group] = np.array([HOME_CODES.code((country.name, state.name)) for state in country.states])[state_of]
+    return countries, states, homes
+
+def build_npcs(draws, planets, ids, storage, ages=ADULT_AGES):
+    """NPCs with `ids` from the rows of `draws`, a len(ids) x CREATE_DRAWS array; not yet registered."""
+    low, high = ages
+    base = _pick(draws[:, 0], len(FIRST_NAMES)) * len(LAST_NAMES) + _pick(draws[:, 1], len(LAST_NAMES))
+    names = [unique_name(_BASE_NAMES[k], npc_id) for k, npc_id in zip(base.tolist(), ids)]
+    columns = (
+        low + _pick(draws[:, 2], high - low + 1),
+        _uniform(draws[:, 6], 50, 100), _uniform(draws[:, 7], 80, 120), _uniform(draws[:, 8], 0, 100),
+        _uniform(draws[:, 9], 0, 100), _uniform(draws[:, 10], 0, 100),
+        _pick(draws[:, 11], len(PERSONALITY_TRAITS)),  # PERSONALITY_CODES follows PERSONALITY_TRAITS
+        _uniform(draws[:, 12], 0, 100),
+        *_locations(draws[:, 3:6], planets),
+    )
+    mood, thoughts = MOOD_CODES.code("Neutral"), THOUGHT_CODES.code("")
+    npcs = []
+    new = NPC.__new__
+    gc.disable()  # A million new objects would otherwise trigger a collection every few hundred
+    try:
+        for npc_id, name, row in zip(ids, names, zip(*(column.tolist() for column in columns))):
+            npc = new(NPC)
+            (npc._age, npc._health, npc.intelligence, npc.work_skill, npc.social_skill, npc.survival_skill,
+             npc._personality, npc._stress_level, npc._country, npc._state, npc._home) = row
+            npc.id = npc_id
+            npc.name = name
+            npc._alive = True
+            npc._money = 1000
+            npc._self_awareness = False
+            npc._mood = mood
+            npc._thoughts = thoughts
+            npc._observer = None
+            npc.storage = storage
+            npcs.append(npc)
+    finally:
+        gc.enable()
+    return npcs
+
+def create_npcs(streams, planets, storage, count, subsystem="create"):
+    """`count` NPCs drawn from entities 1 to `count` of `subsystem` on day 0, registered with `storage`."""
+    ids = storage.new_ids(count)
+    npcs = []
+    for start in range(0, count, BATCH):
+        stop = min(start + BATCH, count)
+        draws = streams.block(subsystem, range(start + 1, stop + 1), 0, CREATE_DRAWS)
+        npcs.extend(build_npcs(draws, planets, ids[start:stop], storage))
+    storage.register_many(npcs)
+    return npcs
+
+def draws_of(rngs):
+    """The next CREATE_DRAWS draws of each `Dice` in `rngs`, as an array for `build_npcs`."""
+    return np.array([[rng.random() for _ in range(CREATE_DRAWS)] for rng in rngs]).reshape(-1, CREATE_DRAWS)
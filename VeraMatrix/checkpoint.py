@@ -0,0 +1,504 @@
+"""Binary checkpoints of a Universe: full snapshots and incremental deltas.
+
+A checkpoint file starts with an 8-byte magic and the little-endian length of
+a JSON header, followed by 8-byte aligned sections. NPCs are stored column by
+column as fixed-width arrays sorted by id; names are a NUL-separated string
+table. The social graph is stored as its link list: two id columns and a
+kind column. The header holds the geography (in the format of the
+geography files), technologies, scalar totals, the code tables and the
+section layout. Loading memory-maps the file
+and builds the NPCs straight from the columns.
+
+A delta file names the checkpoint it extends. It stores added and removed
+NPC ids, and for each column either nothing (unchanged), the changed cells,
+or the whole column when most of it changed. The link list is stored again
+only if the social graph changed, and population points are appended. The
+seed of the universe's random streams and the `random` module state are
+stored in every file, so a resumed run draws what the uninterrupted one
+would have. So is the queue of a scheduled run (`Universe.scheduler`): a
+full file stores every entry, a delta the entries pushed since the file it
+extends, whose entries due by then have fired. Requires numpy.
+
+Reading the columns off the NPC objects is what a checkpoint mostly costs.
+Columns no NPC changes are carried over from the previous snapshot, and a
+vector run hands over its own columns instead of syncing the objects first.
+"""
+import gc
+import glob
+import json
+import mmap
+import os
+import random
+import re
+from datetime import datetime
+from operator import attrgetter
+
+import numpy as np
+
+from .npc import HOME_CODES, LOCATION_CODES, MOOD_CODES, NPC, PERSONALITY_CODES, THOUGHT_CODES
+from .scheduler import EventScheduler
+from .social import KIND_CODES, KINDS
+from .storage import NullStorage, WorldStorage, log_writer, make_storage
+from .timeseries import RunRecorder, begin_run
+from .world import Technology, planet_from_dict
+
+MAGIC = b"VMCKPT01"
+FORMAT_VERSION = 2
+
+# NPC slot and on-disk type of every column; the code columns are remapped through the saved tables on load
+NPC_COLUMNS = (
+    ("id", "<i8"), ("age", "<f8"), ("money", "<f8"), ("health", "<f8"), ("intelligence", "<f8"),
+    ("work_skill", "<f8"), ("social_skill", "<f8"), ("survival_skill", "<f8"), ("stress_level", "<f8"),
+    ("alive", "u1"), ("self_awareness", "u1"), ("_personality", "<u2"), ("_mood", "<u2"),
+    ("_thoughts", "<u2"), ("_country", "<u2"), ("_state", "<u2"), ("_home", "<u2"),
+)
+CODE_TABLES = {
+    "personality": PERSONALITY_CODES, "mood": MOOD_CODES, "thoughts": THOUGHT_CODES,
+    "location": LOCATION_CODES, "home": HOME_CODES,
+}
+CODE_COLUMNS = {"_personality": "personality", "_mood": "mood", "_thoughts": "thoughts",
+                "_country": "location", "_state": "location", "_home": "home"}
+# Columns read straight from the slot behind their NPC property
+SLOTS = {"age": "_age", "money": "_money", "health": "_health", "stress_level": "_stress_level", "alive": "_alive",
+         "self_awareness": "_self_awareness"}
+FIXED_COLUMNS = frozenset(("_personality", "_home"))  # Columns no NPC changes once created
+# Column -> the VectorizedPopulation column it is taken from
+VECTOR_COLUMNS = {"age": "age", "money": "money", "health": "health", "stress_level": "stress_level",
+                  "intelligence": "intelligence", "work_skill": "work", "social_skill": "social",
+                  "survival_skill": "survival", "alive": "alive", "self_awareness": "self_aware", "_mood": "mood"}
+CHECKPOINT_PATTERN = "checkpoint-*.vmc"
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+def _strings(values):
+    return "\0".join(values).encode()
+
+def _unstrings(data, count):
+    return bytes(data).decode().split("\0") if count else []
+
+def _storage_mode(storage):
+    if isinstance(storage, WorldStorage):
+        return {None: "world", "country": "world-country", "state": "world-state"}[storage.shard_by]
+    if isinstance(storage, NullStorage):
+        return "none"
+    return "files"
+
+def _vector_columns(population):
+    """The living rows of a `VectorizedPopulation` and their checkpoint columns."""
+    live = np.flatnonzero(population.alive[:population.size])
+    columns = {field: population.columns[name][live] for field, name in VECTOR_COLUMNS.items()}
+    columns["id"] = population.id[live]
+    columns["_country"], columns["_state"], columns["_thoughts"] = population.shared_codes(live)
+    return live, columns
+
+class Snapshot:
+    """The columnar state of a universe at one moment, as written to a checkpoint.
+
+    Columns are read from the NPC objects, except that `FIXED_COLUMNS` are
+    copied from a `previous` snapshot for the NPCs it holds. A
+    `population`, the `VectorizedPopulation` stepping the universe,
+    supplies the columns it holds in place of the NPC objects, which lag
+    behind it.
+
+    `schedule` is the part of the universe's scheduler queue to store:
+    every entry, or with `pushed` (see `EventScheduler.take_pushed`) only
+    those, to extend the previous checkpoint's queue.
+    """
+    def __init__(self, universe, previous=None, population=None, pushed=None):
+        if population is None:
+            self._objects = list(universe.npcs)
+            given = {"id": np.fromiter(map(attrgetter("id"), self._objects), "<i8", len(self._objects))}
+            positions = None
+        else:
+            self._objects = population.npcs
+            positions, given = _vector_columns(population)
+        order = np.argsort(given["id"], kind="stable")
+        self._positions = order if positions is None else positions[order]  # Of the NPCs in `_objects`, by id
+        ids = given["id"][order].astype("<i8")
+        if len(ids) > 1 and not (np.diff(ids) > 0).all():
+            raise ValueError("Cannot checkpoint a population with duplicate NPC ids")
+        self.columns = {"id": ids}
+        self._kept = None
+        if previous is not None:
+            kept, old_rows = self.kept(previous)
+            added = np.flatnonzero(~kept)
+            added_npcs = self.npcs(added)
+        npcs = None
+        for field, dtype in NPC_COLUMNS[1:]:
+            getter = attrgetter(SLOTS.get(field, field))
+            if field in given:
+                self.columns[field] = given[field][order].astype(dtype)
+            elif previous is not None and field in FIXED_COLUMNS:
+                column = np.empty(len(ids), dtype=dtype)
+                column[kept] = previous.columns[field][old_rows]
+                column[added] = np.fromiter(map(getter, added_npcs), dtype, len(added_npcs))
+                self.columns[field] = column
+            else:
+                npcs = npcs or self.npcs()
+                self.columns[field] = np.fromiter(map(getter, npcs), dtype, len(ids))
+        self.social = universe.npcs._social
+        self.social_version = (id(self.social), self.social.version if self.social is not None else 0)
+        self.timeline = len(universe.population_over_time)
+        self.scheduler = universe.scheduler
+        self.pushed = pushed is not None
+        if self.scheduler is None:
+            self.schedule = None
+        else:
+            self.schedule = [entry for entry in (self.scheduler.entries() if pushed is None else pushed)
+                             if entry[3].alive]
+
+    def npcs(self, rows=None):
+        """The NPC objects of `rows` (all by default), in id order."""
+        positions = self._positions if rows is None else self._positions[rows]
+        objects = self._objects
+        return [objects[i] for i in positions.tolist()]
+
+    def kept(self, previous):
+        """Which rows hold NPCs that `previous` holds too, and their rows there."""
+        if self._kept is None or self._kept[0] is not previous:
+            ids, old_ids = self.columns["id"], previous.columns["id"]
+            kept = np.isin(ids, old_ids, assume_unique=True)
+            self._kept = previous, kept, np.searchsorted(old_ids, ids[kept])
+        return self._kept[1:]
+
+    def names(self, rows=None):
+        return [npc.name for npc in self.npcs(rows)]
+
+    def links(self):
+        """The social graph's links as sections."""
+        if self.social is None:
+            a = b = np.zeros(0, dtype="<i4")
+            kinds = np.zeros(0, dtype="u1")
+        else:
+            a, b, kinds = self.social.edges()
+        return {"social.a": a.astype("<i4"), "social.b": b.astype("<i4"), "social.kind": kinds}
+
+    def schedule_sections(self, header):
+        """The stored scheduler entries as sections, noting in `header` whether they extend the base file's."""
+        header["schedule"] = None if self.schedule is None else "pushed" if self.pushed else "full"
+        if self.schedule is None:
+            return {}
+        count = len(self.schedule)
+        return {"schedule.day": np.fromiter((entry[0] for entry in self.schedule), "<i8", count),
+                "schedule.kind": np.fromiter((entry[1] for entry in self.schedule), "u1", count),
+                "schedule.id": np.fromiter((entry[3].id for entry in self.schedule), "<i8", count)}
+
+def _universe_header(universe, kind, base=None):
+    version, state, gauss = random.getstate()
+    return {
+        "format": FORMAT_VERSION,
+        "kind": kind,
+        "base": base,
+        "written": datetime.now().isoformat(),
+        "storage": _storage_mode(universe.storage),
+        "next_id": universe.storage.next_id,  # Ids of NPCs that have died since are not handed out again
+        "current_time": universe.current_time.isoformat(),
+        "start_date": universe.start_date.isoformat(),
+        "population": universe.population,
+        "total_money": universe.total_money,
+        "births_today": universe.births_today,
+        "deaths_today": universe.deaths_today,
+        "economic_events": universe.economic_events,
+        "run_id": universe.run_id,
+        "technologies": [[tech.name, tech.discovery_date] for tech in universe.technologies],
+        "planets": [planet.to_dict() for planet in universe.planets],
+        "codes": {name: [list(value) if isinstance(value, tuple) else value for value in table.values]
+                  for name, table in CODE_TABLES.items()},
+        "kinds": list(KINDS),
+        "rng": {"version": version, "gauss_next": gauss},
+        "seed": universe.random.seed,
+    }, np.array(state, dtype="<u4")
+
+def _common_sections(universe, rng, timeline_start):
+    times, populations = universe.population_over_time.columns(timeline_start)
+    return {
+        "rng": rng,
+        "timeline.time": np.frombuffer(times, dtype="<i8"),
+        "timeline.population": np.frombuffer(populations, dtype="<i8"),
+    }
+
+def _write_file(path, header, sections):
+    layout = {}
+    arrays = []
+    offset = 0
+    for name, data in sections.items():
+        array = np.frombuffer(data, dtype="u1") if isinstance(data, bytes) else np.ascontiguousarray(data)
+        layout[name] = {"dtype": array.dtype.str, "count": len(array), "offset": offset}
+        arrays.append(array)
+        offset += _aligned(array.nbytes)
+    header["sections"] = layout
+    encoded = json.dumps(header).encode()
+    start = _aligned(16 + len(encoded))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, "little"))
+        f.write(encoded)
+        f.write(b"\0" * (start - 16 - len(encoded)))
+        for array in arrays:
+            f.write(array.data)
+            f.write(b"\0" * (_aligned(array.nbytes) - array.nbytes))
+    os.replace(temporary, path)  # A crash mid-write never leaves a truncated checkpoint behind
+    return path
+
+def write_full(universe, path, snapshot=None):
+    """Write a full snapshot of `universe` to `path`."""
+    snapshot = snapshot or Snapshot(universe)
+    header, rng = _universe_header(universe, "full")
+    sections = _common_sections(universe, rng, 0)
+    sections.update(snapshot.links())
+    sections.update(snapshot.columns)
+    sections["name"] = _strings(snapshot.names())
+    if snapshot.pushed:
+        raise ValueError("A full checkpoint stores the whole scheduler queue, not the entries pushed since another")
+    sections.update(snapshot.schedule_sections(header))
+    return _write_file(path, header, sections)
+
+def write_delta(universe, path, base_path, previous, snapshot=None):
+    """Write the changes since `previous` (the Snapshot stored in `base_path`) to `path`."""
+    snapshot = snapshot or Snapshot(universe)
+    old_ids, ids = previous.columns["id"], snapshot.columns["id"]
+    header, rng = _universe_header(universe, "delta", os.path.basename(base_path))
+    sections = _common_sections(universe, rng, previous.timeline)
+    if snapshot.social_version != previous.social_version:
+        sections.update(snapshot.links())
+    kept, old_rows = snapshot.kept(previous)
+    added = np.flatnonzero(~kept)
+    sections["removed"] = np.setdiff1d(old_ids, ids, assume_unique=True)
+    sections["added"] = ids[added]
+    sections["added.name"] = _strings(snapshot.names(added))
+    header["columns"] = {}
+    for field, _ in NPC_COLUMNS[1:]:
+        column = snapshot.columns[field]
+        changed = np.zeros(len(ids), dtype=bool)
+        changed[kept] = column[kept] != previous.columns[field][old_rows]
+        changed[added] = True
+        rows = np.flatnonzero(changed)
+        if len(rows) * 2 > len(ids):  # Mostly changed: the dense column is smaller than (id, value) pairs
+            header["columns"][field] = "dense"
+            sections[field] = column
+        elif len(rows):
+            header["columns"][field] = "sparse"
+            sections[f"{field}.id"] = ids[rows]
+            sections[field] = column[rows]
+    sections.update(snapshot.schedule_sections(header))
+    return _write_file(path, header, sections)
+
+def save_checkpoint(universe, path):
+    """Write a full snapshot of `universe` to `path` (pending log rows are flushed first)."""
+    log_writer.flush()
+    return write_full(universe, path)
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:8] != MAGIC:
+        raise ValueError(f"{path} is not a VeraMatrix checkpoint")
+    length = int.from_bytes(data[8:16], "little")
+    header = json.loads(data[16:16 + length])
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format {header['format']} in {path}")
+    start = _aligned(16 + length)
+    sections = {}
+    for name, section in header["sections"].items():
+        if section["count"]:
+            sections[name] = np.frombuffer(data, dtype=section["dtype"], count=section["count"],
+                                           offset=start + section["offset"])
+        else:
+            sections[name] = np.empty(0, dtype=section["dtype"])
+    return header, sections
+
+def _links(header, sections):
+    """(a, b, kind codes) of the file's link list, or None if it does not store one."""
+    if "social.a" not in sections:
+        return None
+    lookup = np.array([KIND_CODES[kind] for kind in header["kinds"]], dtype=np.uint8)
+    return sections["social.a"], sections["social.b"], lookup[sections["social.kind"]]
+
+def _schedule(header, sections, base=None):
+    """(day, kind, NPC id) columns of the scheduler queue saved with the file, or None without one.
+
+    Entries pushed since the `base` queue extend it, less the entries that
+    were due by the time of the file.
+    """
+    mode = header.get("schedule")
+    if mode is None:
+        return None
+    schedule = tuple(sections[f"schedule.{name}"] for name in ("day", "kind", "id"))
+    if mode == "full":
+        return schedule
+    if base is None:
+        raise ValueError(f"Checkpoint {header['base']} does not hold the scheduler queue its delta extends")
+    schedule = tuple(np.concatenate([old, new]) for old, new in zip(base, schedule))
+    pending = schedule[0] > datetime.fromisoformat(header["current_time"]).toordinal()
+    return tuple(column[pending] for column in schedule)
+
+def _read_state(path):
+    """Resolve `path` and the chain of checkpoints it extends into one full state."""
+    header, sections = _read_file(path)
+    if header["kind"] == "full":
+        columns = {field: sections[field] for field, _ in NPC_COLUMNS}
+        names = _unstrings(sections["name"], len(columns["id"]))
+        timeline = [(sections["timeline.time"], sections["timeline.population"])]
+        return (header, columns, names, _links(header, sections), timeline, sections["rng"],
+                _schedule(header, sections))
+    _, base, names, links, timeline, _, schedule = _read_state(os.path.join(os.path.dirname(path), header["base"]))
+    added = sections["added"]
+    kept = ~np.isin(base["id"], sections["removed"], assume_unique=True)
+    ids = np.concatenate([base["id"][kept], added])
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    columns = {"id": ids}
+    for field, dtype in NPC_COLUMNS[1:]:
+        mode = header["columns"].get(field)
+        if mode == "dense":
+            columns[field] = sections[field]
+            continue
+        column = np.concatenate([base[field][kept], np.zeros(len(added), dtype=dtype)])[order]
+        if mode == "sparse":
+            column[np.searchsorted(ids, sections[f"{field}.id"])] = sections[field]
+        columns[field] = column
+    names = np.array(names + _unstrings(sections["added.name"], len(added)), dtype=object)
+    names = names[np.concatenate([np.flatnonzero(kept), len(kept) + np.arange(len(added))])[order]].tolist()
+    links = _links(header, sections) or links  # A delta stores the links only when they changed
+    timeline.append((sections["timeline.time"], sections["timeline.population"]))
+    return header, columns, names, links, timeline, sections["rng"], _schedule(header, sections, schedule)
+
+def _remap(column, saved, table):
+    """Translate codes written by another process into this process's code table."""
+    if not len(column):
+        return []
+    lookup = [table.code(tuple(value) if isinstance(value, list) else value) for value in saved]
+    return np.array(lookup, dtype=np.int64)[column].tolist()
+
+def _build_npcs(header, columns, names, storage):
+    values = {}
+    for field, _ in NPC_COLUMNS:
+        if field in CODE_COLUMNS:
+            name = CODE_COLUMNS[field]
+            values[field] = _remap(columns[field], header["codes"][name], CODE_TABLES[name])
+        elif field in ("alive", "self_awareness"):
+            values[field] = columns[field].astype(bool).tolist()
+        else:
+            values[field] = columns[field].tolist()
+    npcs = []
+    new = NPC.__new__
+    gc.disable()  # A million new objects would otherwise trigger a collection every few hundred
+    try:
+        for name, row in zip(names, zip(*(values[field] for field, _ in NPC_COLUMNS))):
+            npc = new(NPC)
+            (npc.id, npc._age, npc._money, npc._health, npc.intelligence, npc.work_skill, npc.social_skill,
+             npc.survival_skill, npc._stress_level, npc._alive, npc._self_awareness, npc._personality, npc._mood,
+             npc._thoughts, npc._country, npc._state, npc._home) = row
+            npc.name = name
+            npc._observer = None
+            npc.storage = storage
+            npcs.append(npc)
+    finally:
+        gc.enable()
+    return npcs
+
+def load_checkpoint(path, storage=None):
+    """Rebuild the Universe saved at `path` (a checkpoint file, or a directory to resume its latest).
+
+    NPC records keep going to `storage`, by default a backend of the kind the
+    checkpointed universe used, under the current base directory.
+    """
+    from .universe import Universe  # universe imports this module lazily
+    if os.path.isdir(path):
+        latest = latest_checkpoint(path)
+        if latest is None:
+            raise FileNotFoundError(f"No checkpoints in {path}")
+        path = latest
+    header, columns, names, links, timeline, rng, schedule = _read_state(path)
+    storage = storage or make_storage(header["storage"])
+    universe = Universe(storage, header.get("seed"))
+    for planet_data in header["planets"]:
+        universe.add_planet(planet_from_dict(planet_data))
+    for name, discovery_date in header["technologies"]:
+        tech = Technology(name)
+        tech.discovery_date = discovery_date
+        universe.add_technology(tech)
+    universe.npcs = _build_npcs(header, columns, names, storage)
+    if links is not None and len(links[0]):
+        universe.npcs.social.link_many(*links)
+        universe.npcs.social.merge()
+    for times, populations in timeline:
+        universe.population_over_time.extend_columns((times.tolist(), populations.tolist()))
+    universe.current_time = datetime.fromisoformat(header["current_time"])
+    universe.start_date = datetime.fromisoformat(header["start_date"])
+    universe.population = header["population"]
+    universe.births_today = header["births_today"]
+    universe.deaths_today = header["deaths_today"]
+    universe.economic_events = header["economic_events"]
+    if header.get("run_id") is not None:  # The resumed run keeps logging under its own id
+        universe.recorder = RunRecorder(begin_run(universe.start_date, header["run_id"]))
+    if header.get("next_id") is not None:
+        storage.reserve_ids(header["next_id"] - 1)
+    else:  # Written before the next id was recorded
+        storage.reserve_ids(int(columns["id"][-1]) if len(columns["id"]) else 0)
+    if schedule is not None:  # The resumed scheduled run fires the events already drawn
+        universe.scheduler = EventScheduler(universe.random, universe.start_date.toordinal())
+        days, kinds, ids = (column.tolist() for column in schedule)
+        entries = ((day, kind, universe.npcs.get(npc_id)) for day, kind, npc_id in zip(days, kinds, ids))
+        universe.scheduler.restore(entry for entry in entries if entry[2] is not None)
+    random.setstate((header["rng"]["version"], tuple(rng.tolist()), header["rng"]["gauss_next"]))
+    return universe
+
+def latest_checkpoint(directory):
+    """Path of the newest checkpoint written by a CheckpointManager in `directory`, or None."""
+    found = sorted(glob.glob(os.path.join(directory, CHECKPOINT_PATTERN)))
+    return found[-1] if found else None
+
+class CheckpointManager:
+    """Writes numbered checkpoints into `directory` every `every_days` simulated days.
+
+    The first checkpoint of a manager, and every `full_every`-th after it, is
+    a full snapshot; the others are deltas against the previous checkpoint.
+    Pass one to `Universe.run_simulation` or `Universe.fast_forward`, or call
+    `checkpoint` directly for an on-demand snapshot.
+    """
+    def __init__(self, directory, every_days=30, full_every=12):
+        self.directory = directory
+        self.every_days = every_days
+        self.full_every = full_every
+        os.makedirs(directory, exist_ok=True)
+        latest = latest_checkpoint(directory)
+        self.sequence = int(re.search(r"(\d+)\.vmc$", latest).group(1)) if latest else 0
+        self.days = 0
+        self.written = []
+        self._previous = None
+        self._deltas = 0
+
+    def record_day(self, universe, days=1):
+        self.days += days
+
+    def due(self):
+        return bool(self.every_days) and self.days >= self.every_days
+
+    def checkpoint(self, universe, population=None):
+        """Write a checkpoint now and return its path.
+
+        During a vector run pass its `VectorizedPopulation` as `population`;
+        its columns are checkpointed without syncing the NPC objects.
+        """
+        log_writer.flush()  # Stored records must not lag behind the snapshot
+        self.sequence += 1
+        path = os.path.join(self.directory, f"checkpoint-{self.sequence:06d}.vmc")
+        scheduler = universe.scheduler
+        pushed = scheduler.take_pushed() if scheduler is not None else None
+        if self._previous is None or self._deltas + 1 >= self.full_every:
+            snapshot = Snapshot(universe, population=population)
+            write_full(universe, path, snapshot)
+            self._deltas = 0
+        else:
+            if self._previous.scheduler is not scheduler:
+                pushed = None
+            snapshot = Snapshot(universe, self._previous, population, pushed)
+            write_delta(universe, path, self.written[-1], self._previous, snapshot)
+            self._deltas += 1
+        self._previous = snapshot
+        self.written.append(path)
+        self.days = 0
+        return path
@@ -0,0 +1,218 @@
+"""Command line entry point: ``python -m VeraMatrix --help``."""
+import argparse
+import os
+import random
+
+from . import paths
+from .reporting import Pacing
+from .storage import STORAGE_MODES, make_storage
+from .universe import create_universe
+
+PLOTS = ("population", "death", "economy", "wealth")
+
+def simulate(population=None, days=None, seed=None, output_dir=None, storage=None, engine="object",
+             events="daily", fast_forward=False, resolution="day", report_every_days=30,
+             report_every_seconds=None, verbosity="summary", status_file=None, pacing=None, workers=1,
+             checkpoint_dir=None, checkpoint_every=30, resume=None, dashboard=None, metrics=None,
+             geography=None):
+    """Build and run one universe headlessly and return it.
+
+    `population` defaults to 10-100 NPCs and `days` to 1-10 years, both drawn
+    after seeding with `seed`, which is also the master seed of the
+    universe's random streams. Output goes under `output_dir` (MatrixSim by
+    default). With `workers` > 1 the population is stepped across that many
+    processes (see `Universe.run_sharded`). `geography` is a geography file
+    to build the planet from instead of the bundled Earth.
+
+    `resume` continues from a checkpoint file or directory instead of
+    building a new universe; `storage` then defaults to the checkpointed
+    backend rather than "files". With `checkpoint_dir`, a checkpoint is
+    written there every `checkpoint_every` simulated days. An optional
+    `dashboard` (a `VeraMatrix.dashboard.Dashboard`) follows the run live,
+    and optional `metrics` (a `VeraMatrix.metrics.Metrics`) time and count it.
+    """
+    if (engine != "object" or events != "daily") and (fast_forward or workers > 1):
+        raise ValueError("Engines and event modes only apply to the day-by-day loop of a single process")
+    if seed is not None:
+        random.seed(seed)
+    if output_dir is not None:
+        paths.set_base_dir(output_dir)
+    checkpoints = None
+    if resume is not None or checkpoint_dir is not None:
+        from . import checkpoint  # Imported lazily: it needs numpy
+        if checkpoint_dir is not None:
+            checkpoints = checkpoint.CheckpointManager(checkpoint_dir, checkpoint_every)
+    if resume is not None:
+        universe = checkpoint.load_checkpoint(resume, storage and make_storage(storage))
+    else:
+        universe = create_universe(population, make_storage(storage or "files"), seed, geography)
+    days = days if days is not None else random.randint(1, 10) * 365
+    if metrics is not None and (fast_forward or workers > 1):
+        raise ValueError("Metrics are only collected by the day-by-day loop of a single process")
+    if fast_forward:
+        universe.fast_forward(days, resolution, checkpoints=checkpoints, dashboard=dashboard)
+    elif workers > 1:
+        if checkpoints is not None or dashboard is not None:
+            raise ValueError("Checkpoints and dashboards are not supported with several workers")
+        universe.run_sharded(days, workers, report_every_days, report_every_seconds, verbosity, status_file, pacing)
+    else:
+        universe.run_headless(days, report_every_days, report_every_seconds, verbosity, status_file,
+                              pacing=pacing, engine=engine, events=events, checkpoints=checkpoints,
+                              dashboard=dashboard, metrics=metrics)
+    return universe
+
+def parse_days(window):
+    """"FIRST-LAST" (or a single day) as a (first, last) pair of simulated days, for argparse."""
+    first, _, last = window.partition("-")
+    try:
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected FIRST-LAST, got {window!r}") from None
+    if not 1 <= first <= last:
+        raise argparse.ArgumentTypeError(f"expected 1 <= FIRST <= LAST, got {window!r}")
+    return first, last
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m VeraMatrix", description="Run a VeraMatrix simulation.")
+    parser.add_argument("--population", type=int, help="number of starting NPCs (default: 10-100 at random)")
+    parser.add_argument("--days", type=int, help="days to simulate (default: 1-10 years at random)")
+    parser.add_argument("--seed", type=int, help="seed for the random number generator")
+    parser.add_argument("--geography", metavar="FILE",
+                        help="JSON file of countries, states, population weights and migration (default: the bundled Earth)")
+    parser.add_argument("--output-dir", default=paths.base_dir, help="directory for all databases (default: %(default)s)")
+    parser.add_argument("--storage", choices=STORAGE_MODES,
+                        help="where NPC records go (default: files, or the checkpointed backend with --resume); "
+                             "a world directory holds a single run")
+    parser.add_argument("--engine", choices=("object", "vector"), default="object")
+    parser.add_argument("--events", choices=("daily", "scheduled"), default="daily")
+    parser.add_argument("--workers", type=int,
+                        help="step the population across this many processes (default: 1; every CPU for --ensemble)")
+    parser.add_argument("--fast-forward", action="store_true", help="jump across event-free intervals (see Universe.fast_forward)")
+    parser.add_argument("--resolution", choices=("day", "month", "year"), default="day",
+                        help="summary resolution of the global logs when fast-forwarding")
+    parser.add_argument("--report-every", type=int, default=30, metavar="DAYS", help="status report cadence in days (0 disables)")
+    parser.add_argument("--report-seconds", type=float, metavar="SECONDS", help="also report every SECONDS of wall time")
+    parser.add_argument("--verbosity", choices=("full", "summary", "delta"), default="summary")
+    parser.add_argument("--status-file", help="write status reports to this file instead of stdout")
+    parser.add_argument("--checkpoint-dir", help="write periodic checkpoints into this directory")
+    parser.add_argument("--checkpoint-every", type=int, default=30, metavar="DAYS",
+                        help="simulated days between checkpoints (default: %(default)s)")
+    parser.add_argument("--resume", metavar="PATH", help="continue from a checkpoint file, or the latest one in a directory")
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument("--sleep", type=float, help="sleep this many seconds per simulated day")
+    pacing.add_argument("--speed", type=float, help="run at this multiple of real time")
+    parser.add_argument("--plots", nargs="*", choices=PLOTS, default=[], help="plots to produce after the run")
+    parser.add_argument("--plot-dir", help="save plots as PNG files here instead of opening windows")
+    parser.add_argument("--plot-resolution", choices=("day", "month", "year"),
+                        help="resolution of the time plots (default: chosen from the run's length)")
+    parser.add_argument("--dashboard", nargs="?", const="", metavar="FILE",
+                        help="chart the run live in a window, or into this PNG/SVG file (redrawn headlessly)")
+    parser.add_argument("--dashboard-every", type=int, default=30, metavar="DAYS",
+                        help="simulated days between dashboard updates (default: %(default)s)")
+    parser.add_argument("--archive", metavar="DIR",
+                        help="copy the run's NPC records into a compressed columnar archive in DIR (needs numpy)")
+    parser.add_argument("--metrics", metavar="DIR",
+                        help="write phase timings and counters to DIR/metrics.json and DIR/metrics.prom")
+    parser.add_argument("--metrics-every", type=int, default=30, metavar="DAYS",
+                        help="simulated days between metrics updates (default: %(default)s)")
+    parser.add_argument("--profile-days", type=parse_days, metavar="FIRST-LAST",
+                        help="cProfile these simulated days into DIR/profile.prof (needs --metrics)")
+    parser.add_argument("--gui", action="store_true", help="open the NPC browser after the run")
+    parser.add_argument("--ensemble", type=int, metavar="RUNS",
+                        help="run RUNS independent universes seeded from --seed and print daily mean/percentile "
+                             "bands instead of a single run (needs numpy and --days)")
+    parser.add_argument("--ensemble-csv", metavar="FILE", help="write the ensemble's daily bands to this CSV file")
+    return parser
+
+def run_ensemble(args):
+    """Run the `--ensemble` mode of `main` and print the final-day bands of every field."""
+    from .ensemble import FIELDS, Ensemble
+    if args.output_dir is not None:
+        paths.set_base_dir(args.output_dir)
+    ensemble = Ensemble(args.days, args.population, args.ensemble, seed=args.seed, engine=args.engine,
+                        workers=args.workers)
+    print(f"Running {len(ensemble)} universes on {ensemble.workers} processes...")
+    result = ensemble.run()
+    for field in FIELDS:
+        bands = result.bands(field)
+        print(f"{field} on day {args.days}: " + ", ".join(
+            f"{name if name == 'mean' else f'p{name}'} {values[-1]:.2f}" for name, values in bands.items()))
+    if args.ensemble_csv:
+        result.write_csv(args.ensemble_csv)
+    return result
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.ensemble:
+        single_run = [flag for flag, value in (("--resume", args.resume), ("--checkpoint-dir", args.checkpoint_dir),
+                                               ("--dashboard", args.dashboard is not None), ("--archive", args.archive),
+                                               ("--fast-forward", args.fast_forward), ("--plots", args.plots),
+                                               ("--metrics", args.metrics), ("--geography", args.geography),
+                                               ("--gui", args.gui)) if value]
+        if single_run:
+            parser.error(f"--ensemble cannot be combined with {', '.join(single_run)}")
+        if args.days is None:
+            parser.error("--ensemble needs --days")
+        run_ensemble(args)
+        return 0
+    args.workers = args.workers or 1
+    if args.geography and args.resume:
+        parser.error("--geography cannot be combined with --resume; a checkpoint keeps its own")
+    if args.archive and args.storage == "none":
+        parser.error("--archive needs stored records; pick a --storage other than none")
+    if args.checkpoint_dir and args.workers > 1:
+        parser.error("--checkpoint-dir cannot be combined with --workers")
+    if args.dashboard is not None and args.workers > 1:
+        parser.error("--dashboard cannot be combined with --workers")
+    if args.storage == "world" and args.workers > 1:
+        parser.error("--storage world keeps one file that workers would share; use world-state or world-country")
+    if (args.engine != "object" or args.events != "daily") and (args.workers > 1 or args.fast_forward):
+        parser.error("--engine and --events cannot be combined with --workers or --fast-forward")
+    if args.metrics and (args.workers > 1 or args.fast_forward):
+        parser.error("--metrics cannot be combined with --workers or --fast-forward")
+    if args.profile_days and not args.metrics:
+        parser.error("--profile-days needs --metrics")
+    pacing = Pacing(sleep=args.sleep, speed=args.speed)
+    dashboard = None
+    if args.dashboard is not None:
+        from .dashboard import Dashboard
+        dashboard = Dashboard(args.dashboard or None, args.dashboard_every)
+    metrics = None
+    if args.metrics:
+        from .metrics import Metrics
+        os.makedirs(args.metrics, exist_ok=True)
+        metrics = Metrics(os.path.join(args.metrics, "metrics.json"), os.path.join(args.metrics, "metrics.prom"),
+                          args.metrics_every, args.profile_days, os.path.join(args.metrics, "profile.prof"))
+    print("Starting simulation...")
+    universe = simulate(args.population, args.days, args.seed, args.output_dir, args.storage, args.engine,
+                        args.events, args.fast_forward, args.resolution, args.report_every,
+                        args.report_seconds, args.verbosity, args.status_file, pacing, args.workers,
+                        args.checkpoint_dir, args.checkpoint_every, args.resume, dashboard, metrics,
+                        args.geography)
+    print("Simulation finished.")
+
+    if args.archive:
+        from .archive import archive_storage
+        archive = archive_storage(args.archive, universe.storage, planets=universe.planets)
+        print(f"Archived the NPC records to {args.archive} ({archive.nbytes / 1e6:.1f} MB)")
+
+    if args.plots:
+        from . import plots
+        if args.plot_dir:
+            plots.use_backend("Agg")
+            os.makedirs(args.plot_dir, exist_ok=True)
+        for name in args.plots:
+            path = os.path.join(args.plot_dir, f"{name}.png") if args.plot_dir else None
+            if name == "population":
+                universe.plot_population(path, args.plot_resolution)
+            elif name == "death":
+                universe.plot_death_rate(path, args.plot_resolution)
+            elif name == "wealth":
+                universe.plot_wealth(path)
+            else:
+                universe.plot_economy(path, args.plot_resolution)
+    if args.gui:
+        from .gui import run_app
+        run_app(universe)
+    return 0
@@ -0,0 +1,157 @@
+"""Live population, death and economy charts, updated while a run is going.
+
+Pass a `Dashboard` to `Universe.run_simulation` or `Universe.fast_forward`.
+Every series goes through a `MinMaxDecimator`, so an update draws the same
+number of points on day 10 as on day 100000. In a window, only the lines
+are redrawn (blitting) while the data fits the axes. When the data outgrows
+them, the axes grow by half at once, so full redraws happen a logarithmic
+number of times. With a `path` the dashboard draws on an off-screen Agg
+canvas and saves a PNG or SVG file (by extension) at every update, for batch
+jobs without a display. Requires matplotlib.
+"""
+import os
+import time
+
+from .downsample import MinMaxDecimator
+
+POINTS = 500  # Buckets per series: the pixel budget of a chart
+GROWTH = 1.5  # How far an outgrown axis is extended, relative to the data span
+
+# (chart title, y label, [(figure index in RunRecorder.last, label, colour), ...])
+CHARTS = (
+    ("Population Over Time", "Population", [(2, "Population", "tab:blue")]),
+    ("Death Rate Over Time", "Deaths", [(4, "Deaths", "r")]),
+    ("Economy Over Time", "Money", [(5, "Total Money", "b"), (6, "Average Money per NPC", "g"),
+                                    (7, "Median Money per NPC", "orange")]),
+)
+
+class Dashboard:
+    """The three time charts of a run, redrawn every `every_days` simulated days and/or `every_seconds` seconds.
+
+    It is offered each logged day (or fast-forward period) like a
+    `StatusReporter`, and reads the figures the universe has just logged.
+    """
+    def __init__(self, path=None, every_days=30, every_seconds=None, points=POINTS):
+        self.path = path
+        self.every_days = every_days
+        self.every_seconds = every_seconds
+        self.series = [[MinMaxDecimator(points) for _ in lines] for _, _, lines in CHARTS]
+        self.figure = None
+        self.axes = None
+        self.lines = None
+        self.updates = 0
+        self.full_draws = 0
+        self._days = 0
+        self._last_time = time.perf_counter()
+        self._backgrounds = None
+
+    def _build(self):
+        if self.path:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+            self.figure = Figure(figsize=(10, 12))
+            FigureCanvasAgg(self.figure)  # Off-screen, whatever the pyplot backend is
+        else:
+            import matplotlib.pyplot as plt
+            plt.ion()
+            self.figure = plt.figure(figsize=(10, 12))
+            plt.show(block=False)
+            self.figure.canvas.mpl_connect("resize_event", self._forget_backgrounds)
+        self.axes = self.figure.subplots(len(CHARTS), 1)
+        self.lines = []
+        for ax, (title, ylabel, lines) in zip(self.axes, CHARTS):
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.xaxis_date()
+            ax.grid(True)
+            # Animated lines are left out of full draws and blitted onto the saved background instead
+            self.lines.append([ax.plot([], [], color=colour, label=label, animated=not self.path)[0]
+                               for _, label, colour in lines])
+            if len(lines) > 1:
+                ax.legend(loc="upper left")
+        self.axes[-1].set_xlabel("Date")
+        self.figure.tight_layout()
+
+    def record_day(self, universe, days=1):
+        from matplotlib.dates import date2num
+        figures = universe.recorder.last
+        x = date2num(figures[0])
+        for decimators, (_, _, lines) in zip(self.series, CHARTS):
+            for decimator, (index, _, _) in zip(decimators, lines):
+                if figures[index] is not None:
+                    decimator.append(x, figures[index])
+        self._days += days
+
+    def due(self):
+        if self.every_days and self._days >= self.every_days:
+            return True
+        return bool(self.every_seconds) and time.perf_counter() - self._last_time >= self.every_seconds
+
+    def pending(self):
+        """True if some recorded days have not been drawn yet."""
+        return self._days > 0
+
+    def _fit(self, ax, decimators, points):
+        """Grow the limits of `ax` if the data left them; True if they changed."""
+        drawn = [xs for xs, _ in points if xs]
+        if not drawn:
+            return False
+        first, last = min(xs[0] for xs in drawn), max(xs[-1] for xs in drawn)
+        low = min(d.y_min for d in decimators if d.count)
+        high = max(d.y_max for d in decimators if d.count)
+        (x_low, x_high), (y_low, y_high) = ax.get_xlim(), ax.get_ylim()
+        changed = False
+        if self.updates == 0 or first < x_low or last > x_high:
+            ax.set_xlim(first, first + GROWTH * (last - first) + 30)
+            changed = True
+        if self.updates == 0 or low < y_low or high > y_high:
+            margin = (GROWTH - 1) * (high - low) or abs(high) * 0.1 or 1
+            ax.set_ylim(low - margin if low < 0 else max(0, low - margin), high + margin)
+            changed = True
+        return changed
+
+    def update(self):
+        """Redraw the charts with everything recorded so far."""
+        if self.figure is None:
+            self._build()
+        rescaled = False
+        for ax, decimators, lines in zip(self.axes, self.series, self.lines):
+            points = [decimator.points() for decimator in decimators]
+            for line, (xs, ys) in zip(lines, points):
+                line.set_data(xs, ys)
+            rescaled = self._fit(ax, decimators, points) or rescaled
+        if self.path:
+            self._save()
+        else:
+            self._blit(rescaled)
+        self.updates += 1
+        self._days = 0
+        self._last_time = time.perf_counter()
+
+    def _save(self):
+        self.full_draws += 1
+        root, extension = os.path.splitext(self.path)
+        temporary = f"{root}.tmp{extension}"  # savefig picks the format from the extension
+        self.figure.savefig(temporary)
+        os.replace(temporary, self.path)  # Viewers never see a half-written image
+
+    def _forget_backgrounds(self, event):
+        self._backgrounds = None
+
+    def _blit(self, rescaled):
+        canvas = self.figure.canvas
+        if rescaled or self._backgrounds is None:
+            canvas.draw()
+            self._backgrounds = [canvas.copy_from_bbox(ax.bbox) for ax in self.axes]
+            self.full_draws += 1
+        for ax, background, lines in zip(self.axes, self._backgrounds, self.lines):
+            canvas.restore_region(background)
+            for line in lines:
+                ax.draw_artist(line)
+            canvas.blit(ax.bbox)
+        canvas.flush_events()
+
+    def close(self):
+        """Draw any remaining days; a dashboard window stays open until the user closes it."""
+        if self.pending():
+            self.update()
@@ -0,0 +1,97 @@
+"""Downsampling of long series to a fixed number of points for drawing.
+
+`lttb_indices` picks the points of a finished series that best keep its
+shape (Largest-Triangle-Three-Buckets). `MinMaxDecimator` follows a growing
+series in bounded memory, keeping the lowest and highest point of every
+bucket, so spikes survive however long the series gets. Requires numpy
+(which matplotlib brings along).
+"""
+import numpy as np
+
+def lttb_indices(x, y, threshold):
+    """Indices of `threshold` points of (x, y) chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Every index is returned when
+    the series has no more than `threshold` points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # threshold - 2 buckets over the inner points; bucket i is edges[i]:edges[i + 1]
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_x = x[stop:edges[i + 2]].mean()
+        next_y = y[stop:edges[i + 2]].mean()
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+class MinMaxDecimator:
+    """Streaming min/max decimation of an (x, y) series into at most `buckets` buckets.
+
+    Points are appended in x order. Every bucket keeps the points with the
+    lowest and highest y it has seen. When the buckets run out, neighbouring
+    pairs are merged and twice as many points go into each bucket from then
+    on, so appending is amortized O(1) and `points` returns at most
+    2 * `buckets` points however many were appended.
+    """
+    def __init__(self, buckets=500):
+        self.buckets = max(2, buckets - buckets % 2)  # Even, so full buckets merge in pairs
+        self.width = 1  # Appended points per bucket
+        self.count = 0
+        self.y_min = self.y_max = None
+        self._closed = []  # [x of min, min, x of max, max] per full bucket
+        self._open = None
+        self._filled = 0
+
+    def append(self, x, y):
+        self.count += 1
+        if self.y_min is None or y < self.y_min:
+            self.y_min = y
+        if self.y_max is None or y > self.y_max:
+            self.y_max = y
+        bucket = self._open
+        if bucket is None:
+            bucket = self._open = [x, y, x, y]
+        else:
+            if y < bucket[1]:
+                bucket[0], bucket[1] = x, y
+            if y > bucket[3]:
+                bucket[2], bucket[3] = x, y
+        self._filled += 1
+        if self._filled >= self.width:
+            self._closed.append(bucket)
+            self._open = None
+            self._filled = 0
+            if len(self._closed) >= self.buckets:
+                self._merge()
+
+    def _merge(self):
+        closed = self._closed
+        self._closed = [(left[:2] if left[1] <= right[1] else right[:2]) + (left[2:] if left[3] >= right[3] else right[2:])
+                        for left, right in zip(closed[0::2], closed[1::2])]
+        self.width *= 2
+
+    def points(self):
+        """The decimated series as (xs, ys) lists in x order."""
+        xs, ys = [], []
+        for bucket in self._closed + ([self._open] if self._open is not None else []):
+            low_x, low, high_x, high = bucket
+            if low_x == high_x:
+                xs.append(low_x)
+                ys.append(low)
+            elif low_x < high_x:
+                xs.extend((low_x, high_x))
+                ys.extend((low, high))
+            else:
+                xs.extend((high_x, low_x))
+                ys.extend((high, low))
+        return xs, ys
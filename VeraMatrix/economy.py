@@ -0,0 +1,309 @@
+"""Incremental economy aggregates, fed by NPC updates.
+
+`EconomyAggregates` keeps exact running sums of money, health and stress, and
+NPC counts, for every (country, state) group. Country and world figures are
+summed from the groups. The money distribution is tracked by a
+`QuantileSketch`. Every NPC update costs O(1). Reading a figure costs at most
+O(groups + sketch buckets), both bounded by the world and the accuracy, not
+by the population.
+"""
+import math
+from collections import Counter
+
+from .npc import LOCATION_CODES
+
+FIELDS = ("money", "health", "stress_level")
+_OFFSETS = {field: 2 * i + 1 for i, field in enumerate(FIELDS)}  # Position of each field's sum in a group row
+
+def _accumulate(sums, i, x):
+    """Add `x` to the compensated sum held in sums[i] (value) and sums[i + 1] (lost low-order bits)."""
+    s = sums[i]
+    t = s + x
+    if abs(s) >= abs(x):
+        sums[i + 1] += (s - t) + x
+    else:
+        sums[i + 1] += (x - t) + s
+    sums[i] = t
+
+class QuantileSketch:
+    """Relative-error quantile sketch over logarithmic buckets (as in DDSketch).
+
+    Quantiles are within `relative_accuracy` of a true value of the data.
+    Values can be removed again, so the sketch can follow a changing
+    population. Memory grows with the logarithm of the value range, not with
+    the number of values.
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = {}  # bucket key -> count, for values > 0
+        self.negative = {}  # bucket key of -value -> count, for values < 0
+        self.zeros = 0
+        self.count = 0
+
+    def key(self, value):
+        """(sign, bucket) of `value`."""
+        if value > 0:
+            return 1, math.ceil(math.log(value) / self._log_gamma)
+        if value < 0:
+            return -1, math.ceil(math.log(-value) / self._log_gamma)
+        return 0, 0
+
+    def add_key(self, key, count=1):
+        sign, bucket = key
+        self.count += count
+        if sign == 0:
+            self.zeros += count
+            return
+        buckets = self.positive if sign > 0 else self.negative
+        total = buckets.get(bucket, 0) + count
+        if total:
+            buckets[bucket] = total
+        else:
+            del buckets[bucket]
+
+    def add(self, value, count=1):
+        self.add_key(self.key(value), count)
+
+    def remove(self, value):
+        self.add_key(self.key(value), -1)
+
+    def move(self, old, new):
+        """Replace one occurrence of `old` by `new`; nearly free when both land in the same bucket."""
+        if old > 0 and new > 0:
+            log_gamma = self._log_gamma
+            old_bucket = math.ceil(math.log(old) / log_gamma)
+            new_bucket = math.ceil(math.log(new) / log_gamma)
+            if old_bucket == new_bucket:
+                return
+            old_key, new_key = (1, old_bucket), (1, new_bucket)
+        else:
+            old_key, new_key = self.key(old), self.key(new)
+            if old_key == new_key:
+                return
+        self.add_key(old_key, -1)
+        self.add_key(new_key)
+
+    def merge(self, other):
+        for bucket, count in other.positive.items():
+            self.add_key((1, bucket), count)
+        for bucket, count in other.negative.items():
+            self.add_key((-1, bucket), count)
+        self.add_key((0, 0), other.zeros)
+
+    def _value(self, bucket):
+        return 2 * self._gamma ** bucket / (self._gamma + 1)
+
+    def buckets(self):
+        """(representative value, count) pairs in ascending order of value."""
+        ordered = [(-self._value(bucket), self.negative[bucket]) for bucket in sorted(self.negative, reverse=True)]
+        if self.zeros:
+            ordered.append((0.0, self.zeros))
+        ordered.extend((self._value(bucket), self.positive[bucket]) for bucket in sorted(self.positive))
+        return ordered
+
+    def quantile(self, q):
+        """Approximate value at quantile `q` (0-1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, count in self.buckets():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def histogram(self, bins=20):
+        """(edges, counts) of an equal-width histogram with `bins` bins."""
+        ordered = self.buckets()
+        if not ordered:
+            return [], []
+        low, high = ordered[0][0], ordered[-1][0]
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for value, count in ordered:
+            counts[min(int((value - low) / width), bins - 1)] += count
+        return [low + width * i for i in range(bins + 1)], counts
+
+    def gini(self):
+        """Approximate Gini coefficient of the values, or None when undefined."""
+        total = weighted = 0.0
+        rank = 0
+        for value, count in self.buckets():
+            # Sum of i * value over the ranks rank+1 .. rank+count taken by this bucket
+            weighted += value * count * (2 * rank + count + 1) / 2
+            total += value * count
+            rank += count
+        if not rank or total <= 0:
+            return None
+        return 2 * weighted / (rank * total) - (rank + 1) / rank
+
+class EconomyAggregates:
+    """Exact group sums and an approximate money distribution of a set of NPCs.
+
+    A `Population` keeps one up to date: it calls `add`/`remove` for members
+    and forwards `changed` and `moved` from the NPC setters.
+    """
+    def __init__(self, relative_accuracy=0.01):
+        # (country code, state code) -> [count, money, money error, health, health error, stress, stress error]
+        self.groups = {}
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def __getstate__(self):
+        # Location codes are only meaningful inside one process
+        groups = {(LOCATION_CODES[country], LOCATION_CODES[state]): sums
+                  for (country, state), sums in self.groups.items()}
+        return {"groups": groups, "sketch": self.sketch}
+
+    def __setstate__(self, state):
+        self.groups = {(LOCATION_CODES.code(country), LOCATION_CODES.code(state)): sums
+                       for (country, state), sums in state["groups"].items()}
+        self.sketch = state["sketch"]
+
+    def _group(self, key):
+        sums = self.groups.get(key)
+        if sums is None:
+            sums = self.groups[key] = [0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        return sums
+
+    def _count(self, key, sums, sign):
+        sums[0] += sign
+        if not sums[0]:
+            del self.groups[key]  # An empty group sums to exactly zero; drop any rounding residue
+
+    def add(self, npc, sign=1):
+        key = (npc._country, npc._state)
+        sums = self._group(key)
+        _accumulate(sums, 1, sign * npc.money)
+        _accumulate(sums, 3, sign * npc.health)
+        _accumulate(sums, 5, sign * npc.stress_level)
+        self._count(key, sums, sign)
+        self.sketch.add(npc.money, sign)
+
+    def remove(self, npc):
+        self.add(npc, -1)
+
+    def add_many(self, npcs):
+        """`add` for many NPCs, with one compensated addition per group and field."""
+        members = {}
+        for npc in npcs:
+            members.setdefault((npc._country, npc._state), []).append(npc)
+        money = Counter()
+        for key, group in members.items():
+            sums = self._group(key)
+            _accumulate(sums, 1, math.fsum(npc.money for npc in group))
+            _accumulate(sums, 3, math.fsum(npc.health for npc in group))
+            _accumulate(sums, 5, math.fsum(npc.stress_level for npc in group))
+            sums[0] += len(group)
+            money.update(npc.money for npc in group)
+        for value, count in money.items():
+            self.sketch.add(value, count)
+
+    def changed(self, npc, field, old, new):
+        # The hottest path of a run: called for every money, health and stress update
+        sums = self.groups[npc._country, npc._state]
+        i = _OFFSETS[field]
+        x = new - old
+        s = sums[i]
+        t = s + x
+        if abs(s) >= abs(x):
+            sums[i + 1] += (s - t) + x
+        else:
+            sums[i + 1] += (x - t) + s
+        sums[i] = t
+        if i == 1:
+            self.sketch.move(old, new)
+
+    def moved(self, npc, field, old, new):
+        """`npc` is about to change its `field` ("country" or "state") code from `old` to `new`."""
+        if field == "country":
+            source, target = (old, npc._state), (new, npc._state)
+        else:
+            source, target = (npc._country, old), (npc._country, new)
+        values = (npc.money, npc.health, npc.stress_level)
+        for key, sign in ((source, -1), (target, 1)):
+            sums = self._group(key)
+            for i, value in enumerate(values):
+                _accumulate(sums, 2 * i + 1, sign * value)
+            self._count(key, sums, sign)
+
+    def rebuild(self, npcs):
+        """Start over from the current values of `npcs`."""
+        self.groups = {}
+        self.sketch = QuantileSketch(self.sketch.relative_accuracy)
+        for npc in npcs:
+            self.add(npc)
+
+    @classmethod
+    def combine(cls, parts):
+        """A new aggregate over the union of several disjoint ones (e.g. one per worker process)."""
+        combined = cls(parts[0].sketch.relative_accuracy if parts else 0.01)
+        for part in parts:
+            for key, sums in part.groups.items():
+                target = combined._group(key)
+                target[0] += sums[0]
+                for i in (1, 3, 5):
+                    _accumulate(target, i, sums[i])
+                    _accumulate(target, i, sums[i + 1])
+            combined.sketch.merge(part.sketch)
+        return combined
+
+    @classmethod
+    def from_columns(cls, money, health, stress_level, country, state, countries, states, relative_accuracy=0.01):
+        """Aggregate numpy columns directly; `country` and `state` index into the name lists `countries` and `states`."""
+        import numpy as np  # Only the vectorized engine calls this
+        aggregates = cls(relative_accuracy)
+        size = len(states)
+        group = country.astype(np.int64) * size + state
+        counts = np.bincount(group, minlength=len(countries) * size)
+        columns = [np.bincount(group, weights=column, minlength=len(countries) * size)
+                   for column in (money, health, stress_level)]
+        for code in np.flatnonzero(counts).tolist():
+            key = (LOCATION_CODES.code(countries[code // size]), LOCATION_CODES.code(states[code % size]))
+            aggregates.groups[key] = [int(counts[code]), columns[0][code], 0.0,
+                                      columns[1][code], 0.0, columns[2][code], 0.0]
+        sketch = aggregates.sketch
+        for buckets, values in ((sketch.positive, money[money > 0]), (sketch.negative, -money[money < 0])):
+            if len(values):
+                keys = np.ceil(np.log(values) / sketch._log_gamma).astype(np.int64)
+                low = keys.min()
+                counts = np.bincount(keys - low)
+                used = np.flatnonzero(counts)
+                buckets.update(zip((used + low).tolist(), counts[used].tolist()))
+        sketch.zeros = int((money == 0).sum())
+        sketch.count = len(money)
+        return aggregates
+
+    def _selected(self, country=None, state=None):
+        country = LOCATION_CODES.codes.get(country, -1) if country is not None else None
+        state = LOCATION_CODES.codes.get(state, -1) if state is not None else None
+        for (group_country, group_state), sums in self.groups.items():
+            if (country is None or group_country == country) and (state is None or group_state == state):
+                yield sums
+
+    def count(self, country=None, state=None):
+        """Number of NPCs in the world, a country, a state, or a state of a country."""
+        return sum(sums[0] for sums in self._selected(country, state))
+
+    def total(self, field="money", country=None, state=None):
+        i = _OFFSETS[field]
+        return math.fsum(value for sums in self._selected(country, state) for value in sums[i:i + 2])
+
+    def mean(self, field="money", country=None, state=None):
+        count = self.count(country, state)
+        return self.total(field, country, state) / count if count else 0
+
+    def median(self):
+        return self.sketch.quantile(0.5)
+
+    def percentile(self, p):
+        """Approximate money percentile `p` (0-100)."""
+        return self.sketch.quantile(p / 100)
+
+    def histogram(self, bins=20):
+        return self.sketch.histogram(bins)
+
+    def gini(self):
+        return self.sketch.gini()
@@ -0,0 +1,192 @@
+"""Monte Carlo ensembles: many independent universes run across a process pool.
+
+`Ensemble` expands a parameter sweep into runs, each with its own seed. Every
+grid point gets `repeats` runs. A pool of spawned worker processes runs them
+headlessly. Each worker writes its run's daily population, births, deaths and
+total money straight into one shared-memory array, so results are never
+pickled back. The parent only hands out run numbers and gets back a small
+summary per run. Each worker logs its universes' global tables into a scratch
+directory of its own, so runs never contend for a database. The scratch
+directories are deleted with the ensemble. Requires numpy.
+
+Scripts that run an ensemble need an ``if __name__ == "__main__":`` guard,
+like sharded runs.
+"""
+import itertools
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import paths
+from .reporting import Pacing, StatusReporter
+
+FIELDS = ("population", "births", "deaths", "total_money")
+PERCENTILES = (5, 25, 50, 75, 95)
+# Sweepable daily probabilities: name -> module constant
+PROBABILITIES = {
+    "death": "DEATH_CHANCE",
+    "self_awareness": "SELF_AWARENESS_CHANCE",
+    "daily_event": "DAILY_EVENT_CHANCE",
+    "growth": "GROWTH_CHANCE",
+    "tech_discovery": "TECH_DISCOVERY_CHANCE",
+}
+
+def _sweep(value):
+    return list(value) if isinstance(value, (list, tuple, range)) else [value]
+
+class _SeriesReporter(StatusReporter):
+    """Writes each day's figures into a run's row of the shared array; never reports."""
+    def __init__(self, series, run):
+        super().__init__(every_days=0, verbosity="summary")
+        self.series = series
+        self.run = run
+        self.day = 0
+
+    def start(self, universe):
+        super().start(universe)
+        self._write(universe)
+
+    def record_day(self, universe, days=1):
+        super().record_day(universe, days)
+        self.day += days
+        self._write(universe)
+
+    def _write(self, universe):
+        self.series[:, self.run, self.day] = (universe.population, universe.births_today, universe.deaths_today,
+                                              universe.total_money)
+
+# Per-worker state, set by _initialize_worker
+_shared = None
+_series = None
+_defaults = None
+
+def _initialize_worker(name, shape, scratch):
+    global _shared, _series, _defaults
+    _shared = shared_memory.SharedMemory(name=name)
+    _series = np.ndarray(shape, dtype=np.float64, buffer=_shared.buf)
+    paths.set_base_dir(tempfile.mkdtemp(dir=scratch))
+    sys.stdout = open(os.devnull, "w")  # Births and deaths are printed as they happen
+    from . import npc, scheduler, universe, vectorized
+    modules = (npc, scheduler, universe, vectorized)
+    _defaults = [(module, constant, getattr(module, constant))
+                 for module in modules for constant in PROBABILITIES.values() if hasattr(module, constant)]
+
+def _set_probabilities(probabilities):
+    """Override the daily probabilities in every module that imported them; the rest go back to their defaults."""
+    for module, constant, default in _defaults:
+        setattr(module, constant, default)
+    for name, value in probabilities.items():
+        constant = PROBABILITIES[name]
+        for module, other, _ in _defaults:
+            if other == constant:
+                setattr(module, constant, value)
+
+def _run(task):
+    from .storage import NullStorage, log_writer
+    from .universe import create_universe
+    run, seed, population, days, probabilities, engine = task
+    _set_probabilities(probabilities)
+    random.seed(seed)
+    started = time.perf_counter()
+    universe = create_universe(population, NullStorage(), seed)
+    population = universe.population  # The drawn size when the sweep leaves it random
+    reporter = _SeriesReporter(_series, run)
+    universe.run_simulation(days, engine=engine, pacing=Pacing(), reporter=reporter)
+    log_writer.flush()
+    row = _series[:, run, :days + 1]
+    return {"run": run, "seed": seed, "population": population, "days": days, **probabilities,
+            "final_population": int(row[0, -1]), "births": int(row[1, 1:].sum()), "deaths": int(row[2, 1:].sum()),
+            "final_money": float(row[3, -1]), "seconds": time.perf_counter() - started}
+
+class Ensemble:
+    """A parameter sweep of independent runs.
+
+    `population` and `days` take a value or a list of values; `probabilities`
+    maps names from `PROBABILITIES` to a value or a list of values. Every
+    combination of the listed values is run `repeats` times. Run seeds are
+    drawn from `seed`, so the same ensemble reproduces the same runs
+    whatever the number of workers.
+    """
+    def __init__(self, days, population=100, repeats=1, probabilities=None, seed=None, engine="object",
+                 workers=None):
+        probabilities = probabilities or {}
+        unknown = [name for name in probabilities if name not in PROBABILITIES]
+        if unknown:
+            raise ValueError(f"Unknown probabilities: {', '.join(unknown)}")
+        if engine not in ("object", "vector"):
+            raise ValueError(f"Unknown engine: {engine}")
+        names = list(probabilities)
+        grid = itertools.product(_sweep(population), _sweep(days), *(_sweep(probabilities[name]) for name in names))
+        self.parameters = [{"population": point[0], "days": point[1], "probabilities": dict(zip(names, point[2:]))}
+                           for point in grid for _ in range(repeats)]
+        seeds = random.Random(seed)
+        self.seeds = [seeds.getrandbits(64) for _ in self.parameters]
+        self.engine = engine
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(self.parameters)))
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def run(self, progress=None):
+        """Run every member and return an `EnsembleResult`; `progress(done, total)` is called as runs finish."""
+        days = max(parameters["days"] for parameters in self.parameters)
+        shape = (len(FIELDS), len(self), days + 1)
+        shared = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        series = np.ndarray(shape, dtype=np.float64, buffer=shared.buf)
+        scratch = tempfile.mkdtemp(prefix="ensemble-")
+        try:
+            series.fill(np.nan)  # Shorter runs leave their tail empty
+            tasks = [(run, seed, parameters["population"], parameters["days"], parameters["probabilities"], self.engine)
+                     for run, (seed, parameters) in enumerate(zip(self.seeds, self.parameters))]
+            summaries = [None] * len(tasks)
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(self.workers, _initialize_worker, (shared.name, shape, scratch)) as pool:
+                for done, summary in enumerate(pool.imap_unordered(_run, tasks), 1):
+                    summaries[summary["run"]] = summary
+                    if progress is not None:
+                        progress(done, len(tasks))
+            return EnsembleResult(series.copy(), summaries)
+        finally:
+            del series  # The buffer cannot be released while an array still points into it
+            shared.close()
+            shared.unlink()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+class EnsembleResult:
+    """Daily series of every run (`series[field]` is runs x days + 1, day 0 first) and per-run summaries."""
+    def __init__(self, series, summaries):
+        self.series = dict(zip(FIELDS, series))
+        self.summaries = summaries
+
+    def runs(self, **parameters):
+        """Indices of the runs whose parameters (population, days or a probability name) equal the given values."""
+        return [summary["run"] for summary in self.summaries
+                if all(summary.get(name) == value for name, value in parameters.items())]
+
+    def bands(self, field, percentiles=PERCENTILES, runs=None):
+        """{"mean": ..., percentile: ...} arrays per day over `runs` (all by default); days no run reached are NaN."""
+        values = self.series[field] if runs is None else self.series[field][runs]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN days past the longest run of a subset
+            bands = {"mean": np.nanmean(values, axis=0)}
+            bands.update(zip(percentiles, np.nanpercentile(values, percentiles, axis=0)))
+        return bands
+
+    def write_csv(self, path, percentiles=PERCENTILES, runs=None):
+        """Write one row per day with the mean and percentiles of every field."""
+        columns = {}
+        for field in FIELDS:
+            for name, values in self.bands(field, percentiles, runs).items():
+                columns[f"{field}_{name if name == 'mean' else f'p{name}'}"] = values
+        with open(path, "w") as f:
+            f.write(",".join(["day", *columns]) + "\n")
+            for day, row in enumerate(zip(*columns.values())):
+                f.write(",".join([str(day), *(f"{value:.6g}" for value in row)]) + "\n")
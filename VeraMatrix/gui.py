@@ -0,0 +1,302 @@
+"""Tk window to browse the NPCs of a universe. Importing this module loads tkinter.
+
+The NPC list is virtualized: the Listbox only ever holds the rows on screen,
+so opening the window costs the same for a hundred NPCs as for a million.
+Names are searched through a `NameIndex` built on a background thread. The
+selected NPC's LifeEvents, Finances, Family and Status history is read in
+keyset pages on another background thread, with its own read-only
+connections.
+"""
+import sqlite3
+import tkinter as tk
+import tkinter.font as tkfont
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from tkinter import ttk
+
+from .search import NameIndex
+from .storage import HISTORY_TABLES, split_history_row
+
+ALL = "All"
+PAGE_SIZE = 200  # History rows fetched per page
+SEARCH_DELAY_MS = 150  # Typing pause before the list is filtered again
+POLL_MS = 50  # How often finished background work is picked up
+
+class VirtualList(tk.Frame):
+    """A scrolling list of `count` rows that only creates the rows on screen.
+
+    `row_text(i)` supplies the text of row i when it scrolls into view, and
+    `on_select(i)` is called with the row the user picks.
+    """
+    def __init__(self, master, row_text, on_select):
+        super().__init__(master)
+        self.row_text = row_text
+        self.on_select = on_select
+        self.count = 0
+        self.top = 0
+        self.selected = None
+        self.listbox = tk.Listbox(self, activestyle="none", exportselection=False)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._row_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        self.listbox.bind("<Configure>", lambda event: self.render())
+        self.listbox.bind("<<ListboxSelect>>", self._selected)
+        self.listbox.bind("<MouseWheel>", lambda event: self._scroll("scroll", -event.delta // 120 * 3, "units"))
+        self.listbox.bind("<Button-4>", lambda event: self._scroll("scroll", -3, "units"))
+        self.listbox.bind("<Button-5>", lambda event: self._scroll("scroll", 3, "units"))
+        self.listbox.bind("<Up>", lambda event: self._step(-1))
+        self.listbox.bind("<Down>", lambda event: self._step(1))
+        self.listbox.bind("<Prior>", lambda event: self._step(-self.rows()))
+        self.listbox.bind("<Next>", lambda event: self._step(self.rows()))
+
+    def rows(self):
+        """Number of rows that fit on screen."""
+        return max(1, self.listbox.winfo_height() // self._row_height)
+
+    def set_count(self, count):
+        self.count = count
+        self.top = 0
+        self.selected = None
+        self.render()
+
+    def render(self):
+        rows = self.rows()
+        self.top = max(0, min(self.top, self.count - rows))
+        bottom = min(self.top + rows, self.count)
+        self.listbox.delete(0, tk.END)
+        if bottom > self.top:
+            self.listbox.insert(tk.END, *(self.row_text(i) for i in range(self.top, bottom)))
+        if self.selected is not None and self.top <= self.selected < bottom:
+            self.listbox.selection_set(self.selected - self.top)
+        if self.count:
+            self.scrollbar.set(self.top / self.count, bottom / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * self.count)
+        else:
+            self.top += int(amount) * (self.rows() if unit == "pages" else 1)
+        self.render()
+        return "break"
+
+    def _step(self, step):
+        if not self.count:
+            return "break"
+        current = self.selected if self.selected is not None else self.top - 1
+        self.select(max(0, min(current + step, self.count - 1)))
+        return "break"
+
+    def select(self, index):
+        """Select row `index`, scrolling it into view."""
+        self.selected = index
+        rows = self.rows()
+        if not self.top <= index < self.top + rows:
+            self.top = index if index < self.top else index - rows + 1
+        self.render()
+        self.on_select(index)
+
+    def _selected(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+            self.on_select(self.selected)
+
+class HistoryLoader:
+    """Reads pages of NPC history on a background thread, so the window never waits on SQLite.
+
+    Buffered rows are flushed on the calling thread first (the log writer is
+    not thread-safe). The loader thread then reads through its own read-only
+    connections, the most recent `max_connections` of which stay open.
+    """
+    def __init__(self, max_connections=16):
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="npc-history")
+        self._connections = OrderedDict()  # db_path -> connection; only touched on the loader thread
+
+    def load(self, storage, npc, table, after=None, limit=PAGE_SIZE):
+        """Future of (records, key of the next page or None if this was the last one)."""
+        query = storage.history_query(npc, table, limit, after)
+        if query is None:
+            future = Future()
+            future.set_result(([], None))
+            return future
+        db_path, sql, params = query
+        storage.writer.flush(db_path)
+        return self._executor.submit(self._fetch, table, db_path, sql, params, limit)
+
+    def _connection(self, db_path):
+        conn = self._connections.get(db_path)
+        if conn is not None:
+            self._connections.move_to_end(db_path)
+            return conn
+        conn = self._connections[db_path] = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        if len(self._connections) > self.max_connections:
+            self._connections.popitem(last=False)[1].close()
+        return conn
+
+    def _fetch(self, table, db_path, sql, params, limit):
+        try:
+            rows = self._connection(db_path).execute(sql, params).fetchall()
+        except sqlite3.OperationalError:  # Nothing has been written for this NPC yet
+            return [], None
+        split = [split_history_row(table, row) for row in rows]
+        records = [record for _, record in split]
+        return records, (split[-1][0] if len(rows) == limit else None)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# GUI to interact with NPCs
+class NPCApp:
+    def __init__(self, root, universe):
+        self.root = root
+        self.root.title("NPC Interaction")
+        self.universe = universe
+        self.npc_ids = []  # NPC id of each list row; rows stay valid when the population changes
+        self.selected_id = None
+        self.history = HistoryLoader()
+        self._pending = []  # (future, npc id, table) of history pages being read
+        self._next_page = {}  # table -> key of the next history page of the selected NPC
+        self._search_job = None
+
+        controls = tk.Frame(root)
+        controls.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.search_var = tk.StringVar()
+        search = tk.Entry(controls, textvariable=self.search_var)
+        search.pack(side=tk.TOP, fill=tk.X)
+        self.search_var.trace_add("write", lambda *args: self._schedule_refresh())
+        filters = tk.Frame(controls)
+        filters.pack(side=tk.TOP, fill=tk.X)
+        states = [state.name for planet in universe.planets for country in planet.countries for state in country.states]
+        self.state_var = tk.StringVar(value=ALL)
+        self.aware_var = tk.BooleanVar(value=False)
+        # No alive filter: NPCs leave the population on the day they die
+        box = ttk.Combobox(filters, textvariable=self.state_var, values=[ALL] + states, state="readonly", width=16)
+        box.pack(side=tk.LEFT)
+        box.bind("<<ComboboxSelected>>", lambda event: self.populate_npc_list())
+        tk.Checkbutton(filters, text="Self-aware", variable=self.aware_var,
+                       command=self.populate_npc_list).pack(side=tk.LEFT)
+        self.count_label = tk.Label(controls, anchor=tk.W)
+        self.count_label.pack(side=tk.TOP, fill=tk.X)
+        self.npc_list = VirtualList(controls, self._row_text, self._select_row)
+        self.npc_list.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        details = tk.Frame(root)
+        details.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        self.detail_text = tk.Text(details, height=16)
+        self.detail_text.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        notebook = ttk.Notebook(details)
+        notebook.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.history_text = {}
+        self.more_buttons = {}
+        for table in HISTORY_TABLES:
+            tab = tk.Frame(notebook)
+            notebook.add(tab, text=table)
+            button = tk.Button(tab, text="Load more", state=tk.DISABLED,
+                               command=lambda table=table: self._load_page(table))
+            button.pack(side=tk.BOTTOM, fill=tk.X)
+            text = tk.Text(tab, wrap=tk.NONE)
+            text.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            self.history_text[table] = text
+            self.more_buttons[table] = button
+
+        # The name index is built off the Tk thread from a snapshot of the population
+        self._indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="npc-index")
+        self._name_index = self._indexer.submit(NameIndex, list(universe.npcs))
+        self.populate_npc_list()
+        self.root.after(POLL_MS, self._poll)
+
+    def _schedule_refresh(self):
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DELAY_MS, self.populate_npc_list)
+
+    def _matching_ids(self, text):
+        """Ids of the NPCs passing the search text and the filters, or None while the name index is being built."""
+        population = self.universe.npcs
+        state, aware = self.state_var.get(), self.aware_var.get()
+        if text:
+            if not self._name_index.done():
+                return None
+            found = self._name_index.result().search(text, population.get)
+            if state == ALL and not aware:
+                return found  # Rows of NPCs that left since the index was built show as gone
+            candidates = (population.get(npc_id) for npc_id in found)
+        elif state != ALL:
+            candidates = population.by_state(state)
+        elif not aware:
+            return [npc.id for npc in population]
+        else:
+            candidates = population
+        return [npc.id for npc in candidates
+                if npc is not None and (state == ALL or npc.state == state) and (not aware or npc.self_awareness)]
+
+    def populate_npc_list(self):
+        self._search_job = None
+        text = self.search_var.get().strip()
+        ids = self._matching_ids(text)
+        if ids is None:
+            self.count_label.config(text="Indexing names...")
+            self._search_job = self.root.after(POLL_MS, self.populate_npc_list)
+            return
+        self.npc_ids = ids
+        self.count_label.config(text=f"{len(ids)} of {len(self.universe.npcs)} NPCs")
+        self.npc_list.set_count(len(ids))
+
+    def _row_text(self, row):
+        npc = self.universe.npcs.get(self.npc_ids[row])
+        return npc.name if npc is not None else "(gone)"
+
+    def _select_row(self, row):
+        npc_id = self.npc_ids[row]
+        npc = self.universe.npcs.get(npc_id)
+        self.selected_id = npc_id
+        self.detail_text.delete('1.0', tk.END)
+        self.detail_text.insert(tk.END, str(npc) if npc is not None else "This NPC is no longer in the population.")
+        self._next_page = {}
+        for table in HISTORY_TABLES:
+            self.history_text[table].delete('1.0', tk.END)
+            self.more_buttons[table].config(state=tk.DISABLED)
+            if npc is not None:
+                self._load_page(table, first=True)
+
+    def show_npc_details(self, event):
+        """Show the NPC of the list row picked in `event` (kept for callers of the old Listbox viewer)."""
+        selection = event.widget.curselection()
+        if selection:
+            self._select_row(self.npc_list.top + selection[0])
+
+    def _load_page(self, table, first=False):
+        npc = self.universe.npcs.get(self.selected_id)
+        if npc is None:
+            return
+        after = None if first else self._next_page.get(table)
+        self.more_buttons[table].config(state=tk.DISABLED)
+        self._pending.append((self.history.load(self.universe.storage, npc, table, after), npc.id, table))
+
+    def _poll(self):
+        still_pending = []
+        for future, npc_id, table in self._pending:
+            if not future.done():
+                still_pending.append((future, npc_id, table))
+            elif npc_id == self.selected_id and not future.cancelled():  # Pages of an earlier selection are dropped
+                records, next_page = future.result()
+                self.history_text[table].insert(tk.END, "".join("\t".join(map(str, record)) + "\n" for record in records))
+                self._next_page[table] = next_page
+                self.more_buttons[table].config(state=tk.NORMAL if next_page is not None else tk.DISABLED)
+        self._pending = still_pending
+        self.root.after(POLL_MS, self._poll)
+
+    def close(self):
+        self.history.close()
+        self._indexer.shutdown(wait=False, cancel_futures=True)
+
+def run_app(universe):
+    root = tk.Tk()
+    app = NPCApp(root, universe)
+    root.mainloop()
+    app.close()
+    return app
@@ -0,0 +1,250 @@
+"""Run metrics: phase timers, counters, commit latencies and peak memory, exported while a run goes.
+
+Pass a `Metrics` to `Universe.run_simulation`. The loop marks the start of
+each phase of a simulated day, so every phase costs one `perf_counter` call
+per day, not per NPC. The log writer reports each commit's latency, and
+NPCs report the events they fire. Peak RSS is sampled once a day. Every
+`every_days` simulated days, and when the run ends, the figures are written
+as a JSON summary and a Prometheus text-format file. Both files are replaced
+atomically, so a node_exporter textfile collector never reads a half-written
+one. Without a `Metrics` the loop calls the no-op methods of `NO_METRICS`
+a few times a day, and the per-event hooks only test a module global.
+
+`profile_days=(first, last)` also runs cProfile over that window of the
+run's simulated days (1 is the first) and dumps the stats to
+`profile_path`, for `pstats` or snakeviz.
+"""
+import cProfile
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from .storage import log_writer
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+# Upper bounds (seconds) of the commit latency histogram buckets, Prometheus style
+COMMIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = "veramatrix"
+COUNTERS = {  # Exported as Prometheus counters; commits are the count of the latency histogram
+    "npcs_stepped": "NPC-days stepped.",
+    "births": "NPCs born or immigrated.",
+    "deaths": "NPCs died.",
+    "rows_written": "Rows committed by the log writer.",
+}
+
+active = None  # The Metrics collecting the current run, if any; NPCs report fired events to it
+
+def fired(event, count=1):
+    """Count `count` occurrences of `event`; NPCs call this only while `active` is set."""
+    active.events[event] += count
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+class Histogram:
+    """Cumulative-bucket latency histogram."""
+    def __init__(self, buckets=COMMIT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(upper bound label, observations at or below it), ...] ending with "+Inf"."""
+        total = 0
+        found = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            found.append((bound, total))
+        return found
+
+class NullMetrics:
+    """Collects nothing; the default of `Universe.run_simulation`."""
+    def start(self, universe):
+        pass
+
+    def phase(self, name):
+        pass
+
+    def end_day(self, universe, stepped):
+        pass
+
+    def finish(self, universe):
+        pass
+
+NO_METRICS = NullMetrics()
+
+class Metrics(NullMetrics):
+    """Timers and counters of one run, written to `json_path` and/or `prometheus_path`."""
+    def __init__(self, json_path=None, prometheus_path=None, every_days=30, profile_days=None,
+                 profile_path=None):
+        if profile_days is not None and profile_path is None:
+            raise ValueError("A profiling window needs a profile_path")
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.every_days = every_days
+        self.profile_days = profile_days
+        self.profile_path = profile_path
+        self.seconds = Counter()  # Wall time per phase
+        self.events = Counter()  # Fired events by name
+        self.commits = Histogram()
+        self.days = 0
+        self.npcs_stepped = 0
+        self.births = 0
+        self.deaths = 0
+        self.rows_written = 0
+        self.peak_rss = None
+        self.population = 0
+        self._phase = None
+        self._mark = None
+        self._started = None
+        self._rows = 0
+        self._since_write = 0
+        self._profiler = None
+
+    def start(self, universe):
+        global active
+        active = self
+        log_writer.on_commit = self.commits.observe
+        self._rows = log_writer.rows_written
+        self._started = time.perf_counter()
+        self.population = universe.population
+        self._profile(1)
+
+    def phase(self, name):
+        """End the current phase of the day and start `name`."""
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.seconds[self._phase] += now - self._mark
+        self._phase = name
+        self._mark = now
+
+    def end_day(self, universe, stepped):
+        """Close the day's last phase; `stepped` is the number of NPCs stepped."""
+        self.phase(None)
+        self.days += 1
+        self.npcs_stepped += stepped
+        self.births += universe.births_today
+        self.deaths += universe.deaths_today
+        self.population = universe.population
+        self.peak_rss = peak_rss()
+        self._profile(self.days + 1)
+        self._since_write += 1
+        if self.every_days and self._since_write >= self.every_days:
+            self.write()
+
+    def finish(self, universe):
+        global active
+        self.phase(None)
+        if self._profiler is not None:
+            self._stop_profile()
+        if log_writer.on_commit == self.commits.observe:
+            log_writer.on_commit = None
+        if active is self:
+            active = None
+        self.population = universe.population
+        self.write()
+
+    def _profile(self, day):
+        """Start or stop cProfile so that it covers the window of simulated days."""
+        if self.profile_days is None:
+            return
+        first, last = self.profile_days
+        if day == first and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif day == last + 1 and self._profiler is not None:
+            self._stop_profile()
+
+    def _stop_profile(self):
+        self._profiler.disable()
+        self._profiler.dump_stats(self.profile_path)
+        self._profiler = None
+
+    @property
+    def wall_seconds(self):
+        return time.perf_counter() - self._started if self._started is not None else 0.0
+
+    def summary(self):
+        """The figures so far as a JSON-ready dict."""
+        self.rows_written = log_writer.rows_written - self._rows
+        wall = self.wall_seconds
+        timed = sum(self.seconds.values())
+        return {
+            "days": self.days,
+            "wall_seconds": wall,
+            "days_per_second": self.days / wall if wall else None,
+            "npc_days_per_second": self.npcs_stepped / wall if wall else None,
+            "phases": {name: {"seconds": seconds, "share": seconds / timed if timed else 0.0}
+                       for name, seconds in self.seconds.most_common()},
+            "counters": {"npcs_stepped": self.npcs_stepped, "births": self.births, "deaths": self.deaths,
+                         "rows_written": self.rows_written, "commits": self.commits.count},
+            "events": dict(self.events.most_common()),
+            "commit_seconds": {"count": self.commits.count, "sum": self.commits.sum,
+                               "buckets": dict(self.commits.cumulative())},
+            "population": self.population,
+            "peak_rss_bytes": self.peak_rss,
+        }
+
+    def prometheus(self, summary=None):
+        """The figures in the Prometheus text exposition format."""
+        summary = summary or self.summary()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{PREFIX}_{name}{labels} {value}")
+
+        metric("phase_seconds_total", "counter", "Wall time spent in each phase of the simulated days.",
+               [(f'{{phase="{name}"}}', phase["seconds"]) for name, phase in summary["phases"].items()])
+        metric("simulated_days_total", "counter", "Simulated days.", [("", summary["days"])])
+        for name, help_text in COUNTERS.items():
+            metric(f"{name}_total", "counter", help_text, [("", summary["counters"][name])])
+        metric("events_total", "counter", "Events fired, by event.",
+               [(f'{{event="{event}"}}', count) for event, count in summary["events"].items()])
+        commits = summary["commit_seconds"]
+        metric("commit_seconds", "histogram", "Latency of log writer commits.",
+               [(f'_bucket{{le="{bound}"}}', count) for bound, count in commits["buckets"].items()]
+               + [("_sum", commits["sum"]), ("_count", commits["count"])])
+        metric("population", "gauge", "Living NPCs.", [("", summary["population"])])
+        if summary["peak_rss_bytes"] is not None:
+            metric("peak_rss_bytes", "gauge", "Peak resident set size of the process.",
+                   [("", summary["peak_rss_bytes"])])
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Rewrite the JSON and Prometheus files with the figures so far."""
+        self._since_write = 0
+        summary = self.summary()
+        if self.json_path:
+            _replace(self.json_path, json.dumps(summary, indent=2) + "\n")
+        if self.prometheus_path:
+            _replace(self.prometheus_path, self.prometheus(summary))
+
+def _replace(path, text):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, path)
@@ -0,0 +1,431 @@
+"""NPCs: their attributes, daily life and the random helpers used to create them."""
+import math
+import random
+from datetime import datetime
+
+from . import metrics
+from .storage import default_storage
+
+# Daily probabilities of the rare per-NPC events
+DEATH_CHANCE = 0.0001
+SELF_AWARENESS_CHANCE = 0.001
+DAILY_EVENT_CHANCE = 0.05
+GROWTH_CHANCE = 0.01
+TECH_DISCOVERY_CHANCE = 0.0001
+
+# Drift over intervals up to this many days is simulated day by day in NPC.drift
+EXACT_DRIFT_DAYS = 16
+# Draws an ordinary day of NPC.live_day takes; a universe precomputes this many per NPC and day
+DAY_DRAWS = 6
+
+PERSONALITY_TRAITS = ["Friendly", "Aggressive", "Lazy", "Industrious", "Curious", "Cautious"]
+THOUGHTS = [
+    "Thinking about work.", "Worrying about money.", "Missing family.",
+    "Planning a vacation.", "Feeling stressed.", "Happy about a new opportunity.",
+    "Concerned about health.", "Excited about the future.", "Reflecting on the past.",
+    "Wondering about the meaning of life."
+]
+SELF_AWARE_THOUGHT = "I think I might be in a simulation."
+DAILY_EVENTS = ["Found money", "Lost money", "Got a job", "Lost a job", "Met someone", "Traveled", "Fell ill", "Improved skill", "Got educated"]
+RELATIONS = ["Friend", "Colleague", "Neighbor"]
+SKILL_NAMES = ["work", "social", "survival"]
+FIRST_NAMES = ["Alice", "Bob", "Charlie", "David", "Eve", "Faythe", "Grace", "Heidi", "Ivan", "Judy"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Jones", "Brown", "Davis", "Miller", "Wilson", "Moore", "Taylor"]
+
+class CodeTable:
+    """Interns repeated strings (or tuples) as small integer codes shared by every NPC."""
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+PERSONALITY_CODES = CodeTable(PERSONALITY_TRAITS)
+MOOD_CODES = CodeTable(["Neutral"])
+THOUGHT_CODES = CodeTable(["", *THOUGHTS, SELF_AWARE_THOUGHT])
+LOCATION_CODES = CodeTable()  # Country and state names
+HOME_CODES = CodeTable()  # (country, state) pairs an NPC's storage is filed under
+
+class NPC:
+    """A simulated person.
+
+    Instances use `__slots__`. Skills are plain float fields. Personality, mood,
+    thoughts and location are small-int codes into the shared tables above,
+    exposed as string properties. The storage path is derived from the NPC's
+    home location on demand. While an NPC sits in a `Population`, that
+    population is its `_observer` and is told about changes to location,
+    alive status, age, money, health, stress, personality and
+    self-awareness, for its indexes, query structures and economy
+    aggregates, and holds the social graph its links go into. Methods that
+    draw random numbers take an `rng`: the `random` module by default, or
+    the `rng.Dice` of the NPC's own stream when a universe steps it.
+    """
+    __slots__ = ("name", "_age", "_alive", "_money", "_health", "intelligence", "work_skill", "social_skill",
+                 "survival_skill", "_stress_level", "_self_awareness", "_personality", "_mood", "_thoughts",
+                 "_country", "_state", "_home", "storage", "id", "_observer")
+
+    def __init__(self, name, age, country, state, storage=None, rng=random):
+        self._observer = None
+        self.name = name
+        self.age = age
+        self.alive = True
+        self.money = 1000  # Start with some money
+        self.health = rng.uniform(50, 100)  # Health between 50 and 100
+        self.intelligence = rng.uniform(80, 120)  # IQ between 80 and 120
+        self.work_skill = rng.uniform(0, 100)  # Skills
+        self.social_skill = rng.uniform(0, 100)
+        self.survival_skill = rng.uniform(0, 100)
+        self.personality = self.generate_personality(rng)
+        self.mood = "Neutral"
+        self.country = country
+        self.state = state
+        self._home = HOME_CODES.code((country, state))
+        self.stress_level = rng.uniform(0, 100)
+        self.thoughts = ""
+        self.self_awareness = False
+        self.storage = storage or default_storage
+        self.id = self.setup_database()
+
+    @property
+    def personality(self):
+        return PERSONALITY_CODES[self._personality]
+
+    @personality.setter
+    def personality(self, value):
+        code = PERSONALITY_CODES.code(value)
+        if self._observer is not None and code != self._personality:
+            self._observer.changed(self, "personality", self._personality, code)
+        self._personality = code
+
+    mood = property(lambda self: MOOD_CODES[self._mood],
+                    lambda self, value: setattr(self, "_mood", MOOD_CODES.code(value)))
+    thoughts = property(lambda self: THOUGHT_CODES[self._thoughts],
+                        lambda self, value: setattr(self, "_thoughts", THOUGHT_CODES.code(value)))
+
+    @property
+    def country(self):
+        return LOCATION_CODES[self._country]
+
+    @country.setter
+    def country(self, value):
+        code = LOCATION_CODES.code(value)
+        if self._observer is not None and code != self._country:
+            self._observer.changed(self, "country", self._country, code)
+        self._country = code
+
+    @property
+    def state(self):
+        return LOCATION_CODES[self._state]
+
+    @state.setter
+    def state(self, value):
+        code = LOCATION_CODES.code(value)
+        if self._observer is not None and code != self._state:
+            self._observer.changed(self, "state", self._state, code)
+        self._state = code
+
+    @property
+    def alive(self):
+        return self._alive
+
+    @alive.setter
+    def alive(self, value):
+        if self._observer is not None and value != self._alive:
+            self._observer.changed(self, "alive", self._alive, value)
+        self._alive = value
+
+    @property
+    def age(self):
+        return self._age
+
+    @age.setter
+    def age(self, value):
+        if self._observer is not None:
+            self._observer.changed(self, "age", self._age, value)
+        self._age = value
+
+    @property
+    def money(self):
+        return self._money
+
+    @money.setter
+    def money(self, value):
+        if self._observer is not None:
+            self._observer.changed(self, "money", self._money, value)
+        self._money = value
+
+    @property
+    def health(self):
+        return self._health
+
+    @health.setter
+    def health(self, value):
+        if self._observer is not None:
+            self._observer.changed(self, "health", self._health, value)
+        self._health = value
+
+    @property
+    def stress_level(self):
+        return self._stress_level
+
+    @stress_level.setter
+    def stress_level(self, value):
+        if self._observer is not None:
+            self._observer.changed(self, "stress_level", self._stress_level, value)
+        self._stress_level = value
+
+    @property
+    def self_awareness(self):
+        return self._self_awareness
+
+    @self_awareness.setter
+    def self_awareness(self, value):
+        if self._observer is not None and value != self._self_awareness:
+            self._observer.changed(self, "self_awareness", self._self_awareness, value)
+        self._self_awareness = value
+
+    @property
+    def home(self):
+        """(country, state) the NPC's records are filed under; fixed at creation."""
+        return HOME_CODES[self._home]
+
+    @property
+    def family(self):
+        """(name, relation) of the NPCs this one is linked to in its population."""
+        return self._observer.relations(self) if self._observer is not None else []
+
+    @property
+    def skills(self):
+        return {'work': self.work_skill, 'social': self.social_skill, 'survival': self.survival_skill}
+
+    @property
+    def db(self):
+        return self.get_db_path()
+
+    # Pickled with plain strings: codes are only meaningful inside one process
+    _PICKLED = ("name", "age", "alive", "money", "health", "intelligence", "work_skill", "social_skill",
+                "survival_skill", "stress_level", "self_awareness", "personality", "mood", "thoughts",
+                "country", "state", "home", "id")
+
+    def __getstate__(self):
+        # Storage backends hold connections; the receiver reattaches its own
+        return {field: getattr(self, field) for field in self._PICKLED}
+
+    def __setstate__(self, state):
+        self._observer = None
+        home = state.pop("home")
+        for field, value in state.items():
+            setattr(self, field, value)
+        self._home = HOME_CODES.code(tuple(home))
+        self.storage = default_storage
+
+    def get_db_path(self):
+        return self.storage.db_path(self)
+
+    def generate_personality(self, rng=random):
+        return rng.choice(PERSONALITY_TRAITS)
+
+    def setup_database(self):
+        return self.storage.register(self)
+
+    def log_event(self, event, consequences="", choice_quality="Neutral"):
+        self.storage.log_event(self, datetime.now().strftime('%Y-%m-%d'), event, consequences, choice_quality)
+
+    def log_death(self):
+        self.storage.log_event(self, datetime.now().strftime('%Y-%m-%d'), "Died", "", "Neutral")
+
+    def update_finances(self):
+        self.storage.log_finances(self, datetime.now().strftime('%Y-%m-%d'), self.money)
+
+    def update_status(self, location, time_of_day):
+        self.storage.log_status(self, datetime.now().strftime('%Y-%m-%d'),
+                                (self.health, self.intelligence, self.work_skill, self.social_skill, self.survival_skill,
+                                 self.stress_level, self.thoughts, location, time_of_day, int(self.self_awareness), self.mood))
+
+    def relocate(self, country, state):
+        """Move to `state` of `country`; the records stay filed under `home`."""
+        self.country = country
+        self.state = state
+        self.storage.relocate(self, country, state)
+
+    def add_relation(self, other, relation):
+        """Link this NPC and `other` (an NPC or an `Acquaintance`) in their population's social graph and log the relation."""
+        if self._observer is not None:
+            self._observer.link(self, other, relation)
+        self.storage.log_family(self, other.name, relation)
+
+    def classify_choice(self, event):
+        good_choices = ["Found money", "Got a job", "Met someone"]
+        bad_choices = ["Lost money", "Lost a job"]
+        if event in good_choices:
+            return "Good"
+        elif event in bad_choices:
+            return "Bad"
+        else:
+            return "Neutral"
+
+    def check_self_awareness(self, rng=random):
+        if not self.self_awareness and rng.random() < SELF_AWARENESS_CHANCE:  # Small chance of becoming self-aware each day
+            self.become_self_aware()
+
+    def become_self_aware(self):
+        self.self_awareness = True
+        self.thoughts = SELF_AWARE_THOUGHT
+        if metrics.active is not None:
+            metrics.fired("Became self-aware")
+        self.log_event("Became self-aware", "Realized they are in a simulation", "Neutral")
+
+    def live_day(self, roll_events=True, rng=random):
+        """Advance this NPC by one day, drawing from `rng` (the `random` module or a `rng.Dice`).
+
+        With `roll_events=False` only the daily drift and logging happen; the
+        rare events are then driven by an `EventScheduler` instead.
+        """
+        if self.alive:
+            self.age += 1 / 365  # Increment age by 1 day
+            self.money += rng.uniform(-10, 10)  # Random daily money change
+            # Random daily stress change, kept within 0-100
+            self.stress_level = max(0, min(self.stress_level + rng.uniform(-5, 5), 100))
+            
+            # Health degradation with age
+            self.health -= 0.01  # Small daily health decrease
+            if roll_events:
+                self.check_self_awareness(rng)  # Check for self-awareness
+            self.thoughts = self.generate_thoughts(rng)  # Update thoughts
+            self.update_finances()
+            self.update_status(f"{self.state}, {self.country}", self.simulation_time())
+
+            if roll_events:
+                if rng.random() < DEATH_CHANCE:  # Very small chance of dying each day
+                    self.die()
+
+                # Random daily events
+                if rng.random() < DAILY_EVENT_CHANCE:
+                    self.random_event(rng)
+
+    def drift(self, days, rng=random):
+        """Apply `days` days of the continuous daily changes in one step.
+
+        Age and health are updated exactly. Money and stress are sampled from the
+        distribution of their random walks: short intervals are walked day by
+        day, longer ones use the normal limit of the summed uniforms, and stress
+        is reflected back into 0-100.
+        """
+        if days <= 0:
+            return
+        self.age += days / 365
+        self.health -= 0.01 * days
+        if days <= EXACT_DRIFT_DAYS:
+            for _ in range(days):
+                self.money += rng.uniform(-10, 10)
+                self.stress_level = max(0, min(self.stress_level + rng.uniform(-5, 5), 100))
+        else:
+            spread = math.sqrt(days / 3)  # Standard deviation of a sum of `days` uniforms on (-1, 1)
+            self.money += rng.gauss(0, 10 * spread)
+            stress = (self.stress_level + rng.gauss(0, 5 * spread)) % 200
+            self.stress_level = 200 - stress if stress > 100 else stress
+        self.thoughts = self.generate_thoughts(rng)
+
+    def die(self):
+        self.alive = False
+        self.log_death()
+        if metrics.active is not None:
+            metrics.fired("Died")
+        print(f"{self.name} has died at the age of {self.age:.2f}")
+
+    def random_event(self, rng=random):
+        event = rng.choice(DAILY_EVENTS)
+        consequences = ""
+        if event == "Found money":
+            amount = rng.uniform(50, 200)
+            self.money += amount
+            consequences = f"Gained {amount:.2f} money"
+        elif event == "Lost money":
+            amount = rng.uniform(50, 200)
+            self.money -= amount
+            consequences = f"Lost {amount:.2f} money"
+        elif event == "Got a job":
+            consequences = "Started a new job"
+            self.work_skill += rng.uniform(0, 5)  # Improve work skill
+        elif event == "Lost a job":
+            consequences = "Lost the job"
+        elif event == "Met someone":
+            other = self._observer.partner(self, rng) if self._observer is not None else None
+            relation = rng.choice(RELATIONS)
+            if other is None:
+                consequences = "Met no one"
+            else:
+                self.add_relation(other, relation)
+                consequences = f"Met {other.name}, became {relation}"
+        elif event == "Traveled":
+            origin = self._observer.countries.get(self.country) if self._observer is not None else None
+            if origin is None:
+                consequences = "Stayed home"  # Not on a planet of the universe: nowhere to go
+            else:
+                country, state = origin.travel(rng)
+                self.relocate(country, state)
+                consequences = f"Traveled to {country}"
+        elif event == "Fell ill":
+            self.health -= rng.uniform(5, 15)  # Decrease health
+            consequences = "Fell ill"
+        elif event == "Improved skill":
+            skill = rng.choice(SKILL_NAMES)
+            setattr(self, f"{skill}_skill", getattr(self, f"{skill}_skill") + rng.uniform(1, 5))  # Improve a random skill
+            consequences = f"Improved {skill} skill"
+        elif event == "Got educated":
+            self.intelligence += rng.uniform(1, 5)  # Increase intelligence
+            consequences = "Gained education"
+
+        choice_quality = self.classify_choice(event)
+        self.log_event(event, consequences, choice_quality)
+        if metrics.active is not None:
+            metrics.fired(event)
+
+    def generate_thoughts(self, rng=random):
+        if self.self_awareness:
+            return SELF_AWARE_THOUGHT
+        return rng.choice(THOUGHTS)
+
+    def simulation_time(self):
+        current_hour = self.age % 1 * 24
+        return f"{int(current_hour)}:{int((current_hour % 1) * 60):02d}"
+
+    def __str__(self):
+        return (f"{self.name}, Age: {self.age:.2f}, Alive: {self.alive}, Money: {self.money:.2f}, "
+                f"Personality: {self.personality}, Health: {self.health:.2f}, Intelligence: {self.intelligence:.2f}, "
+                f"Skills: {self.skills}, Country: {self.country}, State: {self.state}, "
+                f"Stress Level: {self.stress_level:.2f}, Thoughts: {self.thoughts}, "
+                f"Self-Aware: {self.self_awareness}, Mood: {self.mood}, Location: {self.state}, {self.country}, Time: {self.simulation_time()}")
+
+def random_name(rng=random):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def unique_name(name, npc_id):
+    """`name` made unique by the NPC's id, which it keeps for life ("Alice Smith" -> "Alice Smith 42")."""
+    return f"{name} {npc_id}"
+
+def base_name(name, npc_id):
+    """`name` without the id `unique_name` appended to it, if it has one."""
+    head, _, tail = name.rpartition(" ")
+    return head if tail == str(npc_id) else name
+
+def random_age(rng=random):
+    return rng.randint(18, 70)
+
+def random_location(planets, rng=random):
+    """(planet, country, state) of a new NPC: a planet at random, then a country and state by weight."""
+    planet = rng.choice(planets)
+    return (planet, *planet.random_location(rng))
@@ -0,0 +1,167 @@
+"""Locations of the MatrixSim output tree and setup of the global log databases.
+
+Nothing is created at import time: directories and databases are made the
+first time they are needed, under whatever `base_dir` is current then.
+"""
+import os
+import sqlite3
+
+# Root of all simulation output; change it with set_base_dir before a run
+base_dir = "MatrixSim"
+
+_ready = set()  # Global log databases already set up under the current base_dir
+
+def set_base_dir(path):
+    global base_dir
+    base_dir = path
+    _ready.clear()
+
+def _add_run_keys(cursor, table):
+    """Give a global log table the date and run_id keys, and their index, if it was created without them."""
+    columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    for column, kind in (("date", "TEXT"), ("run_id", "INTEGER")):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_run_date ON {table} (run_id, date)')
+
+# Setup BirthRate database
+def setup_birth_rate_db():
+    birth_rate_db = os.path.join(base_dir, "BirthRateData", "birth_rate_log.sqlite")
+    os.makedirs(os.path.dirname(birth_rate_db), exist_ok=True)
+    conn = sqlite3.connect(birth_rate_db)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS BirthRate (
+            year INTEGER,
+            population INTEGER,
+            births INTEGER,
+            date TEXT,
+            run_id INTEGER
+        )
+    ''')
+    _add_run_keys(cursor, "BirthRate")
+    conn.commit()
+    conn.close()
+    return birth_rate_db
+
+# Setup DeathRate database
+def setup_death_rate_db():
+    death_rate_db = os.path.join(base_dir, "DeathRate", "DeathRateLog.sqlite")
+    os.makedirs(os.path.dirname(death_rate_db), exist_ok=True)
+    conn = sqlite3.connect(death_rate_db)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS DeathRate (
+            year INTEGER,
+            population INTEGER,
+            deaths INTEGER,
+            date TEXT,
+            run_id INTEGER
+        )
+    ''')
+    _add_run_keys(cursor, "DeathRate")
+    conn.commit()
+    conn.close()
+    return death_rate_db
+
+# Setup EconomyData database
+def setup_economy_data_db():
+    economy_data_db = os.path.join(base_dir, "EconomyData", "EconomyDataLogs.sqlite")
+    os.makedirs(os.path.dirname(economy_data_db), exist_ok=True)
+    conn = sqlite3.connect(economy_data_db)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS EconomyData (
+            year INTEGER,
+            total_money REAL,
+            average_money REAL,
+            economic_events TEXT,
+            median_money REAL,
+            gini REAL,
+            date TEXT,
+            run_id INTEGER
+        )
+    ''')
+    # Logs written before the distribution columns existed get them added
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(EconomyData)')}
+    for column in ("median_money", "gini"):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE EconomyData ADD COLUMN {column} REAL')
+    _add_run_keys(cursor, "EconomyData")
+    conn.commit()
+    conn.close()
+    return economy_data_db
+
+# Setup the time-series database: runs, daily figures and their monthly and yearly rollups
+def setup_timeseries_db():
+    timeseries_db = os.path.join(base_dir, "TimeSeries", "timeseries.sqlite")
+    os.makedirs(os.path.dirname(timeseries_db), exist_ok=True)
+    conn = sqlite3.connect(timeseries_db)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started TEXT,
+            start_date TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS DailyMetrics (
+            run_id INTEGER,
+            day INTEGER,
+            days INTEGER,
+            population INTEGER,
+            births INTEGER,
+            deaths INTEGER,
+            total_money REAL,
+            average_money REAL,
+            median_money REAL,
+            gini REAL,
+            PRIMARY KEY (run_id, day)
+        ) WITHOUT ROWID
+    ''')
+    for table in ("MonthlyMetrics", "YearlyMetrics"):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                run_id INTEGER,
+                period INTEGER,
+                first_day INTEGER,
+                last_day INTEGER,
+                days INTEGER,
+                births INTEGER,
+                deaths INTEGER,
+                population INTEGER,
+                population_min INTEGER,
+                population_max INTEGER,
+                total_money REAL,
+                average_money REAL,
+                median_money REAL,
+                gini REAL,
+                PRIMARY KEY (run_id, period)
+            ) WITHOUT ROWID
+        ''')
+    conn.commit()
+    conn.close()
+    return timeseries_db
+
+def _ensure(setup):
+    key = (base_dir, setup)
+    if key not in _ready:
+        setup()
+        _ready.add(key)
+
+def birth_rate_db():
+    _ensure(setup_birth_rate_db)
+    return os.path.join(base_dir, "BirthRateData", "birth_rate_log.sqlite")
+
+def death_rate_db():
+    _ensure(setup_death_rate_db)
+    return os.path.join(base_dir, "DeathRate", "DeathRateLog.sqlite")
+
+def economy_data_db():
+    _ensure(setup_economy_data_db)
+    return os.path.join(base_dir, "EconomyData", "EconomyDataLogs.sqlite")
+
+def timeseries_db():
+    _ensure(setup_timeseries_db)
+    return os.path.join(base_dir, "TimeSeries", "timeseries.sqlite")
@@ -0,0 +1,97 @@
+"""Matplotlib charts of a run. matplotlib is only imported when a plot is drawn.
+
+The time charts read one run at one resolution from the time-series store;
+by default the finest resolution with at most `MAX_POINTS` points. Longer
+series are thinned to `PIXEL_BUDGET` points with LTTB, and only short ones
+get markers. For charts that follow a run while it goes, see
+`VeraMatrix.dashboard`.
+"""
+from .timeseries import resolution_for
+
+PIXEL_BUDGET = 1000  # Points per line: about one per horizontal pixel of a 10 inch figure
+MARKER_POINTS = 100  # Lines with more points than this are drawn without markers
+
+def use_backend(backend):
+    """Select the matplotlib backend (e.g. "Agg" for headless runs) before any plot is drawn."""
+    import matplotlib
+    matplotlib.use(backend)
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+def _finish(plt, path):
+    if path:
+        plt.savefig(path)
+        plt.close()
+    else:
+        plt.show()
+
+_PERIOD_LABELS = {"day": "Day", "month": "Month", "year": "Year"}
+
+def _history(universe, resolution, fields):
+    """The run's figures at `resolution` (chosen from the run's length if None) and the resolution used."""
+    if universe.run_id is None:
+        return resolution or "day", universe.history(resolution, fields)
+    resolution = resolution or resolution_for(universe.run_id)
+    return resolution, universe.history(resolution, fields)
+
+def _plot_line(plt, dates, values, **style):
+    """Plot one line, thinned to `PIXEL_BUDGET` points when longer."""
+    if len(dates) > PIXEL_BUDGET:
+        from .downsample import lttb_indices
+        kept = lttb_indices([date.toordinal() for date in dates], values, PIXEL_BUDGET).tolist()
+        dates, values = [dates[i] for i in kept], [values[i] for i in kept]
+    plt.plot(dates, values, marker='o' if len(dates) <= MARKER_POINTS else None, **style)
+
+def plot_population(universe, path=None, resolution=None):
+    plt = _pyplot()
+    _, history = _history(universe, resolution, ("population",))
+    plt.figure(figsize=(10, 5))
+    _plot_line(plt, history["date"], history["population"])
+    plt.xlabel('Date')
+    plt.ylabel('Population')
+    plt.title('Population Over Time')
+    plt.grid(True)
+    _finish(plt, path)
+
+def plot_death_rate(universe, path=None, resolution=None):
+    plt = _pyplot()
+    resolution, history = _history(universe, resolution, ("deaths",))
+    plt.figure(figsize=(10, 5))
+    _plot_line(plt, history["date"], history["deaths"], color='r')
+    plt.xlabel('Date')
+    plt.ylabel(f'Deaths per {_PERIOD_LABELS[resolution].lower()}')
+    plt.title('Death Rate Over Time')
+    plt.grid(True)
+    _finish(plt, path)
+
+def plot_economy(universe, path=None, resolution=None):
+    plt = _pyplot()
+    _, history = _history(universe, resolution, ("total_money", "average_money", "median_money"))
+    dates = history["date"]
+    plt.figure(figsize=(10, 5))
+    _plot_line(plt, dates, history["total_money"], color='b', label='Total Money')
+    _plot_line(plt, dates, history["average_money"], color='g', label='Average Money per NPC')
+    _plot_line(plt, dates, history["median_money"], color='orange', label='Median Money per NPC')
+    plt.xlabel('Date')
+    plt.ylabel('Money')
+    plt.title('Economy Over Time')
+    plt.legend()
+    plt.grid(True)
+    _finish(plt, path)
+
+def plot_wealth(universe, path=None, bins=30):
+    """Current money distribution, read from the universe's economy aggregates."""
+    plt = _pyplot()
+    economy = universe.economy
+    edges, counts = economy.histogram(bins)
+    plt.figure(figsize=(10, 5))
+    if counts:
+        plt.bar(edges[:-1], counts, width=edges[1] - edges[0], align='edge', color='g')
+    gini = economy.gini()
+    plt.xlabel('Money')
+    plt.ylabel('NPCs')
+    plt.title('Wealth Distribution' + (f' (Gini {gini:.3f})' if gini is not None else ''))
+    plt.grid(True)
+    _finish(plt, path)
@@ -0,0 +1,302 @@
+"""The population store: a universe's NPCs by stable id, with secondary indexes."""
+import random
+from collections import namedtuple
+
+from .economy import FIELDS, EconomyAggregates
+from .npc import LOCATION_CODES
+from .query import QueryIndexes
+
+AGE_BAND_YEARS = 10
+COMPACT_MIN_TOMBSTONES = 1024
+_ECONOMY_FIELDS = frozenset(FIELDS)
+
+Acquaintance = namedtuple("Acquaintance", "id name")  # An NPC met in another worker's shard of a sharded run
+
+def age_band(age):
+    return int(age // AGE_BAND_YEARS)
+
+class Population:
+    """The NPCs of a universe, addressable by their `id`.
+
+    NPCs are kept in a list in insertion order. Removing one leaves a
+    tombstone in O(1). The list is compacted once tombstones make up a quarter
+    of it, but never while an iteration is in progress, so NPCs may be added
+    and removed while iterating. NPCs added during an iteration are not
+    visited by it. Ids come from the storage backend and are never handed out
+    twice, so the id of a removed NPC simply stops resolving.
+
+    Members report changes to their location, alive status, age, money,
+    health, stress, personality and self-awareness through their setters, so
+    an NPC belongs to at most one population. Those updates keep `economy`,
+    an `EconomyAggregates`, current. Indexes by country, state, alive status
+    and age band are built on first query and maintained from then on, and
+    so are the structures behind `select`, `count` and `group_by` (see
+    `query.QueryIndexes`). Links between members live in `social`,
+    a `SocialGraph` created on the first link; removing a member drops its
+    links.
+
+    `partner` picks whom a member meets by id, among the members or, in a
+    worker process of a sharded run, among every NPC of the universe in
+    `roster` (a `sharding.Roster`). `countries` maps the names of the
+    countries of the universe's planets to their `world.Country`, where
+    travelling members find their destinations.
+    """
+    INDEXED = ("country", "state", "alive", "age")
+
+    def __init__(self, npcs=(), economy=None, social=None):
+        self._npcs = []
+        self._position = {}
+        self._tombstones = 0
+        self._iterating = 0
+        self._indexes = None
+        self._query = None
+        self.economy = economy if economy is not None else EconomyAggregates()
+        self._social = social
+        self._ids = None  # Sorted member ids, for `partner`; rebuilt after membership changes
+        self.roster = None
+        self.countries = {}
+        self.extend(npcs)
+
+    def __len__(self):
+        return len(self._position)
+
+    def __contains__(self, npc):
+        position = self._position.get(npc.id)
+        return position is not None and self._npcs[position] is npc
+
+    def __iter__(self):
+        self._iterating += 1
+        try:
+            npcs = self._npcs
+            for position in range(len(npcs)):
+                npc = npcs[position]
+                if npc is not None:
+                    yield npc
+        finally:
+            self._iterating -= 1
+            self._maybe_compact()
+
+    def get(self, npc_id, default=None):
+        """The NPC with `npc_id`, or `default` if it is not (or no longer) in the population."""
+        position = self._position.get(npc_id)
+        return default if position is None else self._npcs[position]
+
+    def add(self, npc):
+        if npc.id in self._position:
+            raise ValueError(f"An NPC with id {npc.id} is already in the population")
+        self._position[npc.id] = len(self._npcs)
+        self._npcs.append(npc)
+        self._ids = None
+        npc._observer = self
+        self.economy.add(npc)
+        if self._indexes is not None:
+            self._index(npc)
+        if self._query is not None:
+            self._query.add(npc)
+
+    def extend(self, npcs):
+        """Add many NPCs at once; the economy aggregates take them in one batch."""
+        npcs = list(npcs)
+        ids = [npc.id for npc in npcs]
+        if len(set(ids)) != len(ids) or not self._position.keys().isdisjoint(ids):
+            raise ValueError("NPC ids must be unique within the population")
+        self._position.update(zip(ids, range(len(self._npcs), len(self._npcs) + len(npcs))))
+        self._npcs.extend(npcs)
+        self._ids = None
+        for npc in npcs:
+            npc._observer = self
+        self.economy.add_many(npcs)
+        if self._indexes is not None:
+            for npc in npcs:
+                self._index(npc)
+        if self._query is not None:
+            for npc in npcs:
+                self._query.add(npc)
+
+    def remove(self, npc, unlink=True):
+        """Take `npc` out; `unlink=False` keeps its links, for an NPC that moves to another population."""
+        if npc not in self:
+            raise ValueError(f"NPC {npc.id} is not in the population")
+        self._npcs[self._position.pop(npc.id)] = None
+        self._tombstones += 1
+        self._ids = None
+        npc._observer = None
+        self.economy.remove(npc)
+        if unlink and self._social is not None:
+            self._social.remove(npc.id)
+        if self._indexes is not None:
+            self._unindex(npc)
+        if self._query is not None:
+            self._query.remove(npc)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if (not self._iterating and self._tombstones >= COMPACT_MIN_TOMBSTONES
+                and 4 * self._tombstones > len(self._npcs)):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstones; does nothing while the population is being iterated."""
+        if self._iterating or not self._tombstones:
+            return
+        self._npcs = [npc for npc in self._npcs if npc is not None]
+        self._position = {npc.id: position for position, npc in enumerate(self._npcs)}
+        self._tombstones = 0
+
+    @property
+    def social(self):
+        """The `SocialGraph` linking members by id."""
+        if self._social is None:
+            from .social import SocialGraph  # Imported lazily: it needs numpy
+            self._social = SocialGraph()
+        return self._social
+
+    def ids(self):
+        """The members' ids in ascending order."""
+        if self._ids is None:
+            self._ids = sorted(self._position)
+        return self._ids
+
+    def partner(self, npc, rng=random):
+        """Whom `npc` meets: the id at one uniform draw of `rng` along `ids()`, or along `roster` if set.
+
+        Returns None when the draw picks `npc` itself or there is no one. A
+        pick from `roster` that is not a member comes back as an
+        `Acquaintance`. Picking by position among sorted ids keeps the pick
+        independent of the order NPCs joined and of how they are sharded.
+        """
+        roster = self.roster
+        ids = self.ids() if roster is None else roster.ids
+        u = rng.random()
+        if not len(ids):
+            return None
+        other_id = int(ids[int(u * len(ids))])
+        if other_id == npc.id:
+            return None
+        other = self.get(other_id)
+        if other is None and roster is not None:
+            other = Acquaintance(other_id, roster.name(other_id))
+        return other
+
+    def link(self, npc, other, relation):
+        """Link two members in the social graph; `relation` is one of `social.KINDS`."""
+        self.social.link(npc.id, other.id, relation)
+
+    def relations(self, npc):
+        """(name, relation) of the members linked to `npc`."""
+        if self._social is None:
+            return []
+        found = []
+        for other_id, relation in self._social.neighbors(npc.id):
+            other = self.get(other_id)
+            if other is not None:
+                found.append((other.name, relation))
+        return found
+
+    def influence(self, streams, day):
+        """One day of social influence on the members' stress and mood (see `SocialGraph.influence`).
+
+        The draws come from the "social" streams of `streams` (a
+        `RandomStreams`) on `day`.
+        """
+        if self._social is not None and len(self._social):
+            from .social import influence_npcs
+            influence_npcs(self._social, self, streams, day)
+
+    @staticmethod
+    def _keys(npc):
+        return npc._country, npc._state, npc.alive, age_band(npc.age)
+
+    def _index(self, npc):
+        for index, key in zip(self._indexes, self._keys(npc)):
+            index.setdefault(key, {})[npc.id] = npc
+
+    def _unindex(self, npc):
+        for index, key in zip(self._indexes, self._keys(npc)):
+            del index[key][npc.id]
+
+    def _build_indexes(self):
+        self._indexes = tuple({} for _ in self.INDEXED)
+        for npc in self:
+            self._index(npc)
+
+    def _lookup(self, field, key):
+        if self._indexes is None:
+            self._build_indexes()
+        return self._indexes[self.INDEXED.index(field)].get(key, {})
+
+    def refresh(self, economy):
+        """Take `economy` as the aggregates of the members after their fields were written around the setters.
+
+        The indexes and query structures are dropped and rebuilt on their next use.
+        """
+        self.economy = economy
+        self._indexes = None
+        self._query = None
+
+    def changed(self, npc, field, old, new):
+        """Called by a member's setters before `field` changes from `old` to `new`."""
+        if self._query is not None:
+            self._query.changed(npc, field, old, new)
+        if field in _ECONOMY_FIELDS:
+            self.economy.changed(npc, field, old, new)
+            return
+        if field == "country" or field == "state":
+            self.economy.moved(npc, field, old, new)
+        if self._indexes is None or field not in self.INDEXED:
+            return
+        if field == "age":
+            old, new = age_band(old), age_band(new)
+            if old == new:
+                return
+        index = self._indexes[self.INDEXED.index(field)]
+        del index[old][npc.id]
+        index.setdefault(new, {})[npc.id] = npc
+
+    def by_country(self, country):
+        """NPCs currently in `country`."""
+        return list(self._lookup("country", LOCATION_CODES.codes.get(country)).values())
+
+    def by_state(self, state):
+        """NPCs currently in `state`."""
+        return list(self._lookup("state", LOCATION_CODES.codes.get(state)).values())
+
+    def by_age(self, low, high):
+        """NPCs with `low` <= age < `high`; only the two boundary bands are filtered one by one."""
+        found = []
+        for band in range(age_band(low), age_band(high) + 1):
+            members = self._lookup("age", band).values()
+            if low <= band * AGE_BAND_YEARS and (band + 1) * AGE_BAND_YEARS <= high:
+                found.extend(members)
+            else:
+                found.extend(npc for npc in members if low <= npc.age < high)
+        return found
+
+    def living(self):
+        return list(self._lookup("alive", True).values())
+
+    def dead(self):
+        """Members whose `alive` flag is down but that have not been removed yet."""
+        return list(self._lookup("alive", False).values())
+
+    @property
+    def query(self):
+        """The `query.QueryIndexes` of the population, created on first use."""
+        if self._query is None:
+            self._query = QueryIndexes(self)
+        return self._query
+
+    def select(self, where=None, order_by=None, descending=False, limit=None):
+        """Members matching the filters of `where`, ordered by the field `order_by`, at most `limit` of them.
+
+        See `query` for the filters. Without `order_by` the order is unspecified.
+        """
+        return self.query.select(where, order_by, descending, limit)
+
+    def count(self, where=None):
+        """Number of members matching the filters of `where`."""
+        return self.query.count(where)
+
+    def group_by(self, by, field=None, where=None):
+        """{value of `by`: {"count", and with `field` its "sum" and "mean"}} over the members matching `where`."""
+        return self.query.group_by(by, field, where)
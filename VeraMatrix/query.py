@@ -0,0 +1,417 @@
+"""Indexed queries over a live population: filters, top-k, counts and group-by, and scheduled reports.
+
+A query names its filters in a `where` dict. Categorical fields (alive,
+self_awareness, personality, country, state) take a value or a list/set of
+values. Ordered fields (money, age, health, stress_level) take a
+(low, high) range; low is inclusive, high exclusive, and None leaves that
+end open::
+
+    universe.query({"state": "Moscow"}, order_by="money", descending=True, limit=100)
+    universe.count({"self_awareness": True, "age": (60, None)})
+    universe.group_by("personality", "stress_level")
+
+`QueryIndexes` answers them from structures it keeps up to date through the
+population's change notifications, so a query never scans the population:
+
+- an `OrderIndex` (a bucketed sorted list of (value, id) pairs) per ordered
+  field, for ranges, counts and top-k;
+- a `Bitmap` over NPC ids per value of each categorical field, a packed
+  numpy array that filters are combined on with array-wide ANDs and ORs;
+- running counts and sums of the ordered fields per group of each group-by
+  field.
+
+Each structure is built on the first query that needs it and costs
+O(log n) per NPC update from then on; fields nobody queries cost nothing.
+A top-k query walks the order index from one end and skips NPCs outside the
+filters. Counts are popcounts of bitmaps or rank differences. Group-by
+without filters reads the running sums. Bitmaps need numpy, which is only
+imported by the first filter on a categorical field.
+"""
+from bisect import bisect_left, insort
+from itertools import accumulate
+from operator import attrgetter
+
+from .npc import LOCATION_CODES, PERSONALITY_CODES
+from .reporting import Reporter
+
+ORDERED = ("money", "age", "health", "stress_level")
+CATEGORICAL = ("alive", "self_awareness", "personality", "country", "state")
+# How each field is read off an NPC: the raw slot, so codes rather than names
+_KEYS = {field: attrgetter(f"_{field}") for field in ORDERED + CATEGORICAL}
+_TABLES = {"personality": PERSONALITY_CODES, "country": LOCATION_CODES, "state": LOCATION_CODES}
+
+class OrderIndex:
+    """Sorted keys in buckets of at most 2 * LOAD, for O(log n) updates and rank queries.
+
+    Keys are (value, id) pairs. A replacement that keeps a key between its
+    neighbours, the common case for small daily changes, is done in place.
+    """
+    LOAD = 512
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._buckets = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._offsets = None  # Keys before each bucket; rebuilt after a bucket changes size
+
+    def __len__(self):
+        return sum(map(len, self._buckets))
+
+    def _locate(self, key):
+        b = bisect_left(self._maxes, key)
+        return b, bisect_left(self._buckets[b], key)
+
+    def add(self, key):
+        self._offsets = None
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        b = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        bucket = self._buckets[b]
+        insort(bucket, key)
+        self._maxes[b] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[b:b + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[b:b + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+
+    def remove(self, key):
+        self._offsets = None
+        b, i = self._locate(key)
+        bucket = self._buckets[b]
+        del bucket[i]
+        if bucket:
+            self._maxes[b] = bucket[-1]
+        else:
+            del self._buckets[b], self._maxes[b]
+
+    def replace(self, old, new):
+        b, i = self._locate(old)
+        bucket = self._buckets[b]
+        before = bucket[i - 1] if i else (self._maxes[b - 1] if b else None)
+        after = bucket[i + 1] if i + 1 < len(bucket) else (self._buckets[b + 1][0] if b + 1 < len(self._buckets) else None)
+        if (before is None or before < new) and (after is None or new < after):
+            bucket[i] = new
+            if i + 1 == len(bucket):
+                self._maxes[b] = new
+            return
+        self.remove(old)
+        self.add(new)
+
+    def rank(self, key):
+        """Number of keys below `key`."""
+        b = bisect_left(self._maxes, key)
+        if b == len(self._buckets):
+            return len(self)
+        if self._offsets is None:
+            self._offsets = [0, *accumulate(map(len, self._buckets))]
+        return self._offsets[b] + bisect_left(self._buckets[b], key)
+
+    def count(self, low=None, high=None):
+        """Number of keys with low <= value < high."""
+        return ((len(self) if high is None else self.rank((high,)))
+                - (0 if low is None else self.rank((low,))))
+
+    def irange(self, low=None, high=None, reverse=False):
+        """Keys with low <= value < high, in order (or reverse order)."""
+        start = (0, 0) if low is None else self._position((low,))
+        stop = (len(self._buckets), 0) if high is None else self._position((high,))
+        if reverse:
+            b, i = stop
+            while (b, i) > start:
+                if i == 0:
+                    b -= 1
+                    i = len(self._buckets[b])
+                    continue
+                i -= 1
+                yield self._buckets[b][i]
+        else:
+            b, i = start
+            while (b, i) < stop:
+                bucket = self._buckets[b]
+                if i == len(bucket):
+                    b, i = b + 1, 0
+                    continue
+                yield bucket[i]
+                i += 1
+
+    def _position(self, key):
+        b = bisect_left(self._maxes, key)
+        if b == len(self._buckets):
+            return b, 0
+        return b, bisect_left(self._buckets[b], key)
+
+class Bitmap:
+    """A growable set of small non-negative ints (NPC ids), one bit each, little-endian in a uint8 array."""
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=None):
+        import numpy as np  # Imported lazily: only filters on categorical fields use bitmaps
+        self.bits = np.zeros(0, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def of(cls, ids):
+        """The bitmap of the int64 array `ids`."""
+        import numpy as np
+        members = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=bool)
+        members[ids] = True
+        return cls(np.packbits(members, bitorder="little"))
+
+    def add(self, i):
+        byte = i >> 3
+        if byte >= len(self.bits):
+            import numpy as np
+            grown = np.zeros(max(byte + 1, len(self.bits) * 3 // 2), dtype=np.uint8)
+            grown[:len(self.bits)] = self.bits
+            self.bits = grown
+        self.bits[byte] |= 1 << (i & 7)
+
+    def discard(self, i):
+        byte = i >> 3
+        if byte < len(self.bits):
+            self.bits[byte] &= ~(1 << (i & 7)) & 0xFF
+
+def _union(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    union = a.copy()
+    union[:len(b)] |= b
+    return union
+
+def _intersection(a, b):
+    size = min(len(a), len(b))
+    return a[:size] & b[:size]
+
+def _popcount(mask):
+    import numpy as np
+    return int(np.count_nonzero(np.unpackbits(mask)))
+
+def _contains(mask, i):
+    """Whether bit `i` is set in the bytes `mask`."""
+    byte = i >> 3
+    return byte < len(mask) and mask[byte] >> (i & 7) & 1
+
+def _members(mask):
+    """The ids set in the packed array `mask`, in order."""
+    import numpy as np
+    return np.flatnonzero(np.unpackbits(mask, bitorder="little")).tolist()
+
+class QueryIndexes:
+    """The query structures of one `Population`; see the module docstring."""
+    def __init__(self, population):
+        self.population = population
+        self.ordered = {}  # field -> OrderIndex
+        self.bitmaps = {}  # field -> {value: Bitmap}
+        self.groups = {}  # field -> {value: [count, sum of each ORDERED field]}
+
+    # Maintenance, called by the population
+
+    def add(self, npc, sign=1):
+        for field, index in self.ordered.items():
+            (index.add if sign > 0 else index.remove)((_KEYS[field](npc), npc.id))
+        for field, bitmaps in self.bitmaps.items():
+            value = _KEYS[field](npc)
+            if sign > 0:
+                bitmaps.setdefault(value, Bitmap()).add(npc.id)
+            else:
+                bitmaps[value].discard(npc.id)
+        for field, groups in self.groups.items():
+            self._count(groups.setdefault(_KEYS[field](npc), [0] * (len(ORDERED) + 1)), npc, sign)
+
+    def remove(self, npc):
+        self.add(npc, -1)
+
+    @staticmethod
+    def _count(row, npc, sign):
+        row[0] += sign
+        for i, field in enumerate(ORDERED, 1):
+            row[i] += sign * _KEYS[field](npc)
+
+    def changed(self, npc, field, old, new):
+        """`field` of `npc` is about to change from `old` to `new` (codes for coded fields)."""
+        index = self.ordered.get(field)
+        if index is not None:
+            index.replace((old, npc.id), (new, npc.id))
+        bitmaps = self.bitmaps.get(field)
+        if bitmaps is not None:
+            bitmaps[old].discard(npc.id)
+            bitmaps.setdefault(new, Bitmap()).add(npc.id)
+        if not self.groups:
+            return
+        if field in ORDERED:
+            position = ORDERED.index(field) + 1
+            for by, groups in self.groups.items():
+                groups[_KEYS[by](npc)][position] += new - old
+        elif field in self.groups:
+            groups = self.groups[field]
+            self._count(groups[old], npc, -1)
+            self._count(groups.setdefault(new, [0] * (len(ORDERED) + 1)), npc, 1)
+
+    # Lazily built structures
+
+    def _order(self, field):
+        index = self.ordered.get(field)
+        if index is None:
+            key = _KEYS[field]
+            index = self.ordered[field] = OrderIndex((key(npc), npc.id) for npc in self.population)
+        return index
+
+    def _bitmaps(self, field):
+        bitmaps = self.bitmaps.get(field)
+        if bitmaps is None:
+            import numpy as np
+            members = {}
+            key = _KEYS[field]
+            for npc in self.population:
+                members.setdefault(key(npc), []).append(npc.id)
+            bitmaps = self.bitmaps[field] = {value: Bitmap.of(np.array(ids, dtype=np.int64))
+                                             for value, ids in members.items()}
+        return bitmaps
+
+    def _groups(self, field):
+        groups = self.groups.get(field)
+        if groups is None:
+            groups = self.groups[field] = {}
+            key = _KEYS[field]
+            for npc in self.population:
+                self._count(groups.setdefault(key(npc), [0] * (len(ORDERED) + 1)), npc, 1)
+        return groups
+
+    # Queries
+
+    def _parse(self, where):
+        """(packed uint8 mask of the categorical filters or None, {ordered field: (low, high)})."""
+        mask = None
+        ranges = {}
+        for field, value in (where or {}).items():
+            if field in ORDERED:
+                if not isinstance(value, tuple) or len(value) != 2:
+                    raise ValueError(f"{field} takes a (low, high) range")
+                ranges[field] = value
+                continue
+            if field not in CATEGORICAL:
+                raise ValueError(f"Cannot filter on {field!r}; use one of {', '.join(CATEGORICAL + ORDERED)}")
+            values = value if isinstance(value, (list, set, frozenset)) else [value]
+            table = _TABLES.get(field)
+            bitmaps = self._bitmaps(field)
+            bits = Bitmap().bits
+            for value in values:
+                code = table.codes.get(value) if table is not None else value
+                bitmap = bitmaps.get(code)
+                if bitmap is not None:
+                    bits = _union(bits, bitmap.bits)
+            mask = bits if mask is None else _intersection(mask, bits)
+        return mask, ranges
+
+    @staticmethod
+    def _in_ranges(npc, ranges):
+        for field, (low, high) in ranges.items():
+            value = _KEYS[field](npc)
+            if (low is not None and value < low) or (high is not None and value >= high):
+                return False
+        return True
+
+    def _candidates(self, mask, ranges, order_by=None, descending=False):
+        """NPCs passing the filters; in `order_by` order if given, else by the cheapest index."""
+        ranges = dict(ranges)
+        if order_by is None and ranges:
+            order_by = min(ranges, key=lambda field: self._order(field).count(*ranges[field]))
+            if mask is not None and _popcount(mask) < self._order(order_by).count(*ranges[order_by]):
+                order_by = None  # The bitmap is the smaller side
+        get = self.population.get
+        if order_by is not None:
+            if order_by not in ORDERED:
+                raise ValueError(f"Cannot order by {order_by!r}; use one of {', '.join(ORDERED)}")
+            low, high = ranges.pop(order_by, (None, None))
+            probe = mask.tobytes() if mask is not None else None  # Bytes index faster than an array, one id at a time
+            for _, npc_id in self._order(order_by).irange(low, high, descending):
+                if probe is None or _contains(probe, npc_id):
+                    npc = get(npc_id)
+                    if not ranges or self._in_ranges(npc, ranges):
+                        yield npc
+        elif mask is not None:
+            for npc_id in _members(mask):
+                npc = get(npc_id)
+                if not ranges or self._in_ranges(npc, ranges):
+                    yield npc
+        else:
+            yield from self.population
+
+    def select(self, where=None, order_by=None, descending=False, limit=None):
+        mask, ranges = self._parse(where)
+        found = []
+        if limit == 0:
+            return found
+        for npc in self._candidates(mask, ranges, order_by, descending):
+            found.append(npc)
+            if len(found) == limit:
+                break
+        return found
+
+    def count(self, where=None):
+        mask, ranges = self._parse(where)
+        if not ranges:
+            return len(self.population) if mask is None else _popcount(mask)
+        if mask is None and len(ranges) == 1:
+            (field, bounds), = ranges.items()
+            return self._order(field).count(*bounds)
+        return sum(1 for _ in self._candidates(mask, ranges))
+
+    def group_by(self, by, field=None, where=None):
+        if by not in CATEGORICAL:
+            raise ValueError(f"Cannot group by {by!r}; use one of {', '.join(CATEGORICAL)}")
+        if field is not None and field not in ORDERED:
+            raise ValueError(f"Cannot aggregate {field!r}; use one of {', '.join(ORDERED)}")
+        if where:
+            mask, ranges = self._parse(where)
+            groups = {}
+            for npc in self._candidates(mask, ranges):
+                self._count(groups.setdefault(_KEYS[by](npc), [0] * (len(ORDERED) + 1)), npc, 1)
+        else:
+            groups = self._groups(by)
+        table = _TABLES.get(by)
+        position = ORDERED.index(field) + 1 if field is not None else None
+        result = {}
+        for value, row in groups.items():
+            if row[0] <= 0:
+                continue
+            name = table[value] if table is not None else value
+            result[name] = ({"count": row[0]} if position is None else
+                            {"count": row[0], "sum": row[position], "mean": row[position] / row[0]})
+        return result
+
+def _format(result):
+    if isinstance(result, dict):
+        return "; ".join(f"{key}: {_format(value)}" for key, value in result.items())
+    if isinstance(result, list):
+        return ", ".join(f"{npc.name} (#{npc.id})" if hasattr(npc, "id") else _format(npc) for npc in result)
+    if isinstance(result, float):
+        return f"{result:.2f}"
+    return str(result)
+
+class QueryReport(Reporter):
+    """Answers named queries every `every_days` simulated days.
+
+    `queries` maps a title to a function of the universe, e.g.
+    ``{"Richest in Moscow": lambda u: u.query({"state": "Moscow"}, "money", True, 10)}``.
+    Results go to `sink`, as for `reporting.Reporter`.
+    """
+    def __init__(self, queries, every_days=30, sink=None):
+        super().__init__(sink)
+        self.queries = queries
+        self.every_days = every_days
+        self._days = 0
+        self.results = {}  # Title -> result of the latest report
+
+    def record_day(self, universe, days=1):
+        self._days += days
+
+    def due(self):
+        return bool(self.every_days) and self._days >= self.every_days
+
+    def report(self, universe):
+        self._days = 0
+        self.results = {title: query(universe) for title, query in self.queries.items()}
+        lines = [f"\nQueries on {universe.current_time.strftime('%Y-%m-%d')}:"]
+        lines.extend(f"  {title}: {_format(result)}" for title, result in self.results.items())
+        self.write("\n".join(lines))
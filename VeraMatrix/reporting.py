@@ -0,0 +1,125 @@
+"""Real-time pacing and throttled status reporting for simulation runs."""
+import sys
+import time
+
+class Pacing:
+    """Real-time pacing for a run: off, a fixed sleep per day, or a target speed.
+
+    `speed` is a multiplier on real time, e.g. 86400 runs one simulated day per
+    wall-clock second. With neither `sleep` nor `speed` the run is unthrottled.
+    """
+    def __init__(self, sleep=None, speed=None):
+        if sleep is not None and speed is not None:
+            raise ValueError("Use either a fixed sleep or a target speed, not both")
+        self.sleep = sleep
+        self.speed = speed
+        self._started = None
+        self._days = 0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._days = 0
+
+    def wait(self):
+        """Called once per simulated day."""
+        if self.sleep:
+            time.sleep(self.sleep)
+        elif self.speed:
+            self._days += 1
+            remaining = self._started + self._days * 86400 / self.speed - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+class Reporter:
+    """Where a periodic report goes: `sink`, a file path or file object; stdout by default.
+
+    A path is opened for appending on the first report and closed by `close`;
+    file objects are left open.
+    """
+    def __init__(self, sink=None):
+        self._path = sink if isinstance(sink, str) else None
+        self._sink = None if self._path else sink
+
+    @property
+    def sink(self):
+        if self._sink is None:
+            self._sink = open(self._path, "a") if self._path else sys.stdout
+        return self._sink
+
+    def write(self, text):
+        """Write `text` as one report and flush it."""
+        self.sink.write(text + "\n")
+        self.sink.flush()
+
+    def close(self):
+        if self._path and self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+class StatusReporter(Reporter):
+    """Writes `Universe` status reports every N simulated days and/or every T seconds.
+
+    `verbosity` is "full" (the classic `print_status` dump), "summary" (totals
+    only) or "delta" (changes since the previous report). Reports go to
+    `sink` (see `Reporter`). Reports that are not due are never formatted.
+    """
+    def __init__(self, every_days=1, every_seconds=None, verbosity="full", sink=None):
+        if verbosity not in ("full", "summary", "delta"):
+            raise ValueError(f"Unknown verbosity: {verbosity}")
+        super().__init__(sink)
+        self.every_days = every_days
+        self.every_seconds = every_seconds
+        self.verbosity = verbosity
+        self._days = 0
+        self._last_time = time.perf_counter()
+        self._births = 0
+        self._deaths = 0
+        self._last = None  # (population, total_money, discovered technologies) at the previous report
+
+    def start(self, universe):
+        """Take the baseline for delta reports at the start of a run."""
+        if self._last is None:
+            self._remember(universe)
+        self._last_time = time.perf_counter()
+
+    def _remember(self, universe):
+        self._last = (universe.population, universe.total_money,
+                      {tech.name for tech in universe.technologies if tech.discovery_date})
+
+    def record_day(self, universe, days=1):
+        self._days += days
+        self._births += universe.births_today
+        self._deaths += universe.deaths_today
+
+    def due(self):
+        if self.every_days and self._days >= self.every_days:
+            return True
+        return bool(self.every_seconds) and time.perf_counter() - self._last_time >= self.every_seconds
+
+    def report(self, universe):
+        if self.verbosity == "delta":
+            text = self._format_delta(universe)
+        else:
+            text = universe.format_status(self.verbosity)
+        self.write(text)
+        self._remember(universe)
+        self._days = 0
+        self._births = 0
+        self._deaths = 0
+        self._last_time = time.perf_counter()
+
+    def pending(self):
+        """True if some simulated days have not been reported yet."""
+        return self._days > 0
+
+    def _format_delta(self, universe):
+        population, total_money, discovered = self._last
+        lines = [
+            f"\nSimulation Date: {universe.current_time.strftime('%Y-%m-%d')} (+{self._days} days)",
+            f"Population: {universe.population} ({universe.population - population:+d}; {self._births} births, {self._deaths} deaths)",
+            f"Total Money in Economy: {universe.total_money:.2f} ({universe.total_money - total_money:+.2f})",
+        ]
+        for tech in universe.technologies:
+            if tech.discovery_date and tech.name not in discovered:
+                lines.append(f"Discovered {tech.name} on {tech.discovery_date}")
+        return "\n".join(lines)
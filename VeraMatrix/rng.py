@@ -0,0 +1,160 @@
+"""Counter-based random streams: reproducible draws keyed by subsystem, entity and day.
+
+A draw is a hash of five things: the master seed, a subsystem name, an
+entity (usually an NPC id), the simulated day, and the draw's index within
+that day. The hash is SplitMix64 walked from a starting point mixed from
+the first four. No draw depends on the draws made before it. So an NPC's
+draws do not depend on which NPCs were stepped before it, how the population
+is batched, or which process steps it, and any draw can be recomputed on its
+own.
+
+`RandomStreams.block` hashes the first draws of many entities at once with
+numpy. `Dice` serves one entity's draws of one day through the
+`random.Random` methods the simulation uses. It reads from a block it was
+preloaded with and computes further draws `REFILL` at a time once the block
+runs out.
+"""
+import math
+import random
+import zlib
+
+MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15  # SplitMix64 increment
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_UNIT = 2.0 ** -53
+REFILL = 8  # Draws a Dice computes at a time past its preloaded block
+
+def _mix(x):
+    """SplitMix64 finalizer of a 64-bit int."""
+    x = ((x ^ (x >> 30)) * _MIX1) & MASK
+    x = ((x ^ (x >> 27)) * _MIX2) & MASK
+    return x ^ (x >> 31)
+
+def _mix_array(x, np):
+    """`_mix` in place on a uint64 array (numpy multiplication wraps around like the masking above)."""
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(_MIX1)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(_MIX2)
+    x ^= x >> np.uint64(31)
+    return x
+
+def _draw(start, index):
+    """Uniform in [0, 1) of draw `index` of the stream starting at `start`."""
+    return (_mix((start + (index + 1) * GOLDEN) & MASK) >> 11) * _UNIT
+
+class Dice:
+    """The draws of one stream, with the methods of `random.Random` the simulation calls.
+
+    Draws are served from `buffer[first:stop]`, the stream's first draws as
+    precomputed by `RandomStreams.block` (many Dice share one flat buffer),
+    and then computed `REFILL` at a time.
+    """
+    __slots__ = ("_start", "_buffer", "_next", "_stop", "_index")
+
+    def __init__(self, start, buffer=(), first=0, stop=0):
+        self._start = start
+        self._buffer = buffer
+        self._next = first
+        self._stop = stop
+        self._index = stop - first  # Stream index of the draw after the buffered ones
+
+    def random(self):
+        position = self._next
+        if position == self._stop:
+            index = self._index
+            self._buffer = [_draw(self._start, index) for index in range(index, index + REFILL)]
+            self._index = index + REFILL
+            self._stop = REFILL
+            position = 0
+        self._next = position + 1
+        return self._buffer[position]
+
+    # uniform and choice repeat the buffered path of random: they are most of live_day's draws
+    def uniform(self, a, b):
+        position = self._next
+        if position == self._stop:
+            return a + (b - a) * self.random()
+        self._next = position + 1
+        return a + (b - a) * self._buffer[position]
+
+    def randrange(self, stop):
+        return int(self.random() * stop)
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        position = self._next
+        if position == self._stop:
+            return seq[int(self.random() * len(seq))]
+        self._next = position + 1
+        return seq[int(self._buffer[position] * len(seq))]
+
+    def gauss(self, mu=0.0, sigma=1.0):
+        """Box-Muller from two draws."""
+        radius = math.sqrt(-2.0 * math.log(1.0 - self.random()))
+        return mu + sigma * radius * math.cos(2.0 * math.pi * self.random())
+
+class RandomStreams:
+    """The streams of one master seed, addressed by (subsystem, entity, day).
+
+    `seed` defaults to 64 bits from the `random` module, so seeding `random`
+    first still reproduces a run. Subsystem names keep the streams of
+    different uses apart: an NPC's daily life, its scheduled events and the
+    social graph never share draws.
+    """
+    def __init__(self, seed=None):
+        self.seed = (random.getrandbits(64) if seed is None else seed) & MASK
+        self._keys = {}
+
+    def __getstate__(self):
+        return {"seed": self.seed}
+
+    def __setstate__(self, state):
+        self.__init__(state["seed"])
+
+    def key(self, subsystem):
+        key = self._keys.get(subsystem)
+        if key is None:
+            key = self._keys[subsystem] = _mix((self.seed + (zlib.crc32(subsystem.encode()) + 1) * GOLDEN) & MASK)
+        return key
+
+    def start(self, subsystem, entity, day):
+        """Starting point of the stream of `entity` in `subsystem` on `day`."""
+        return _mix((_mix((self.key(subsystem) + entity * GOLDEN) & MASK) + day * GOLDEN) & MASK)
+
+    def value(self, subsystem, entity, day, index=0):
+        """Draw `index` of one stream."""
+        return _draw(self.start(subsystem, entity, day), index)
+
+    def dice(self, subsystem, entity, day):
+        return Dice(self.start(subsystem, entity, day))
+
+    def _starts(self, subsystem, entities, day, np):
+        starts = np.asarray(entities, dtype=np.uint64) * np.uint64(GOLDEN) + np.uint64(self.key(subsystem))
+        _mix_array(starts, np)
+        starts += np.uint64(day * GOLDEN & MASK)
+        return _mix_array(starts, np)
+
+    def _block(self, subsystem, entities, day, count, first, np):
+        starts = self._starts(subsystem, entities, day, np)
+        steps = np.arange(first + 1, first + count + 1, dtype=np.uint64) * np.uint64(GOLDEN)
+        values = _mix_array(starts[:, None] + steps, np) >> np.uint64(11)
+        return starts, values.astype(np.float64) * _UNIT
+
+    def block(self, subsystem, entities, day, count, first=0):
+        """Draws `first` to `first + count - 1` of every entity's stream, as a len(entities) x count array."""
+        import numpy as np  # Imported lazily: only the batched draws need numpy
+        return self._block(subsystem, entities, day, count, first, np)[1]
+
+    def dice_many(self, subsystem, entities, day, count):
+        """A `Dice` per entity, each preloaded with its stream's first `count` draws."""
+        import numpy as np
+        size = len(entities)
+        if not size:
+            return []
+        starts, values = self._block(subsystem, entities, day, count, 0, np)
+        stops = range(count, count * size + 1, count)
+        return list(map(Dice, starts.tolist(), [values.ravel().tolist()] * size, range(0, count * size, count), stops))
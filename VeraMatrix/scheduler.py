@@ -0,0 +1,119 @@
+"""Next-event scheduling of rare events drawn from geometric distributions."""
+import heapq
+import itertools
+import math
+import random
+import zlib
+from operator import itemgetter
+
+from .npc import DAILY_EVENT_CHANCE, DEATH_CHANCE, GROWTH_CHANCE, SELF_AWARENESS_CHANCE, TECH_DISCOVERY_CHANCE
+
+def geometric_delay(chance, u=None):
+    """Days until a daily event with probability `chance` next happens (always at least 1).
+
+    `u` is the uniform draw to invert; by default it comes from the `random` module.
+    """
+    u = random.random() if u is None else u
+    return int(math.log(1.0 - u) / math.log1p(-chance)) + 1
+
+class EventScheduler:
+    """Priority queue of upcoming rare NPC events keyed by simulated date.
+
+    Instead of rolling dice for every NPC every day, each NPC's time to its next
+    death, self-awareness and random event is drawn from the matching geometric
+    distribution, which gives exactly the same daily probabilities. Each day only
+    the NPCs whose events are due are touched.
+
+    With `streams` (a `RandomStreams`) every delay is a draw of the
+    "schedule" stream of its subject on the day it is scheduled, counted from
+    the day `origin`. The stream is keyed by NPC id, by technology name, or 0
+    for growth, so the schedule does not depend on the order subjects are
+    added in.
+
+    Checkpoints save the queue with `entries` and `take_pushed` and put it
+    back with `restore`, so a resumed run fires the events the uninterrupted
+    one would have.
+    """
+    # Event kinds, in the order they fire within a day
+    AWARENESS = 0
+    DEATH = 1
+    EVENT = 2
+    GROWTH = 3
+    DISCOVERY = 4
+
+    def __init__(self, streams=None, origin=0):
+        self.streams = streams
+        self.origin = origin
+        self._queue = []
+        self._sequence = itertools.count()
+        self._pushed = None  # Entries pushed since `take_pushed`, once it has been called
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _push(self, day, kind, npc):
+        entry = (day, kind, next(self._sequence), npc)
+        heapq.heappush(self._queue, entry)
+        if self._pushed is not None:
+            self._pushed.append(entry)
+
+    def entries(self):
+        """The queued (day, kind, sequence, subject) entries in the order they were pushed."""
+        return sorted(self._queue, key=itemgetter(2))
+
+    def take_pushed(self):
+        """The entries pushed since the previous call (None on the first), and start recording afresh."""
+        pushed, self._pushed = self._pushed, []
+        return pushed
+
+    def restore(self, entries):
+        """Queue (day, kind, subject) entries saved by a checkpoint, in the order they were pushed."""
+        for day, kind, subject in entries:
+            self._push(day, kind, subject)
+
+    def _delay(self, subject, kind, today):
+        if self.streams is None:
+            return geometric_delay(self.chance(kind))
+        if subject is None:
+            entity = 0
+        elif hasattr(subject, "id"):
+            entity = subject.id
+        else:
+            entity = zlib.crc32(subject.name.encode())
+        return geometric_delay(self.chance(kind), self.streams.value("schedule", entity, today - self.origin, kind))
+
+    def add(self, npc, today):
+        """Schedule the first occurrence of each rare event for a newly added NPC."""
+        if not npc.self_awareness:
+            self._push(today + self._delay(npc, self.AWARENESS, today), self.AWARENESS, npc)
+        self._push(today + self._delay(npc, self.DEATH, today), self.DEATH, npc)
+        self._push(today + self._delay(npc, self.EVENT, today), self.EVENT, npc)
+
+    def pop_due(self, today):
+        """Remove and return the (kind, npc) pairs due on or before `today` for living NPCs."""
+        due = []
+        queue = self._queue
+        while queue and queue[0][0] <= today:
+            _, kind, _, npc = heapq.heappop(queue)
+            if npc.alive:
+                due.append((kind, npc))
+        return due
+
+    def pop_next(self, until):
+        """Remove and return the earliest (day, kind, subject) due on or before `until`, or None."""
+        if self._queue and self._queue[0][0] <= until:
+            day, kind, _, subject = heapq.heappop(self._queue)
+            return day, kind, subject
+        return None
+
+    def chance(self, kind):
+        return {
+            self.AWARENESS: SELF_AWARENESS_CHANCE,
+            self.DEATH: DEATH_CHANCE,
+            self.EVENT: DAILY_EVENT_CHANCE,
+            self.GROWTH: GROWTH_CHANCE,
+            self.DISCOVERY: TECH_DISCOVERY_CHANCE,
+        }[kind]
+
+    def reschedule(self, subject, kind, today):
+        self._push(today + self._delay(subject, kind, today), kind, subject)
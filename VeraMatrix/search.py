@@ -0,0 +1,71 @@
+"""In-memory name search over NPCs: prefix and substring (trigram) lookups."""
+from bisect import bisect_left
+
+from .npc import base_name
+
+class NameIndex:
+    """NPC ids by name, searchable by prefix and by substring, case-insensitively.
+
+    Names end in the NPC's id (see `npc.unique_name`), so NPCs are grouped
+    by their base name, the name without the id. Base names repeat a lot, so
+    the sorted name list and the trigram postings grow with the number of
+    distinct base names, not with the population. A prefix query bisects the
+    sorted names. A substring query intersects the postings of the query's
+    trigrams and checks only the names that survive. A query ending in a
+    number is an id, looked up directly (see `search`).
+    """
+    def __init__(self, npcs):
+        self.ids = {}  # base name -> ids of the NPCs with that base name, in population order
+        for npc in npcs:
+            name = base_name(npc.name, npc.id)
+            ids = self.ids.get(name)
+            if ids is None:
+                self.ids[name] = [npc.id]
+            else:
+                ids.append(npc.id)
+        self._names = sorted((name.lower(), name) for name in self.ids)
+        self._keys = [key for key, _ in self._names]
+        self._trigrams = {}  # trigram -> set of names containing it
+        for key, name in self._names:
+            for i in range(len(key) - 2):
+                self._trigrams.setdefault(key[i:i + 3], set()).add(name)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.ids.values())
+
+    def prefix(self, text):
+        """Distinct base names starting with `text`, in order."""
+        key = text.lower()
+        found = []
+        for i in range(bisect_left(self._keys, key), len(self._keys)):
+            if not self._keys[i].startswith(key):
+                break
+            found.append(self._names[i][1])
+        return found
+
+    def substring(self, text):
+        """Distinct base names containing `text`, in order."""
+        key = text.lower()
+        if len(key) < 3:
+            return [name for lowered, name in self._names if key in lowered]
+        postings = sorted((self._trigrams.get(key[i:i + 3], set()) for i in range(len(key) - 2)), key=len)
+        candidates = set.intersection(*postings)
+        return sorted((name for name in candidates if key in name.lower()), key=str.lower)
+
+    def search(self, text, lookup=None):
+        """Ids of the NPCs whose base name contains `text`; names starting with it come first.
+
+        A `text` ending in a number, such as "42" or "Alice Smith 42", finds
+        the NPC with that id instead, through `lookup` (e.g.
+        `Population.get`), if its name contains `text`.
+        """
+        head, _, tail = text.rpartition(" ")
+        if tail.isdigit():
+            npc = lookup(int(tail)) if lookup is not None else None
+            return [npc.id] if npc is not None and text.lower() in npc.name.lower() else []
+        starting = self.prefix(text)
+        first = set(starting)
+        ids = []
+        for name in starting + [name for name in self.substring(text) if name not in first]:
+            ids.extend(self.ids[name])
+        return ids
@@ -0,0 +1,385 @@
+"""Multi-process execution: each worker process owns the NPCs of a group of home states.
+
+The coordinator (the parent process) keeps the `Universe`. It steps the
+workers one day at a time in lockstep, collects per-day deaths and the
+changes to each worker's economy aggregates (the group rows and sketch
+buckets that changed, not the whole aggregates) for the global logs, and
+spawns new NPCs.
+
+An NPC belongs to the worker that owns its home for its whole life, so NPCs
+never move between workers, and each worker writes its NPCs' records
+through its own log writer. With `WorldStorage` every shard file then has
+one writer: a worker owns whole home states with `shard_by="state"` and
+whole home countries with `shard_by="country"`. Unsharded world storage
+would have every worker write one file and is refused.
+
+A run is the same NPC for NPC whatever the number of workers. Workers draw
+from the universe's random streams, keyed by NPC id and day. Whom an NPC
+meets is picked by id from a `Roster` of every NPC in the universe, which
+each worker keeps a copy of, so partners may live in another worker's shard.
+The social graph lives in the coordinator, because a link may join NPCs of
+two workers. Every day the workers send it their new links and their NPCs'
+stress and mood, the coordinator runs the day's influence over the whole
+graph, which is O(links), and sends each worker the changes to its NPCs.
+That second round trip is skipped for workers without changes. The cost is
+a copy of the roster's ids and names per worker and about 20 bytes per NPC
+of pipe traffic per day. `seconds` splits the coordinator's time between
+waiting for the workers and the influence pass;
+benchmarks/sharding.py reports it per number of workers.
+"""
+import multiprocessing
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+
+from . import paths
+from .npc import DAY_DRAWS, LOCATION_CODES, MOOD_CODES
+from .economy import EconomyAggregates
+from .population import Population
+from .social import KIND_CODES, influence_columns
+from .storage import WorldStorage, log_writer
+from .world import countries_of
+
+def home_unit(storage):
+    """The function from an NPC's home to the unit a worker owns whole: a home state, or a home country.
+
+    Raises ValueError for world storage that keeps every NPC in one file.
+    """
+    shard_by = storage.shard_by if isinstance(storage, WorldStorage) else "state"
+    if shard_by is None:
+        raise ValueError("World storage in one file cannot be shared by several workers; "
+                         "shard it by state or country")
+    return (lambda home: home[0]) if shard_by == "country" else (lambda home: home)
+
+def partition_homes(npcs, units, workers, unit_of):
+    """Assign `units` (of `unit_of(npc.home)`) to workers so that every worker gets about the same number of NPCs."""
+    counts = {unit: 0 for unit in units}
+    for npc in npcs:
+        unit = unit_of(npc.home)
+        counts[unit] = counts.get(unit, 0) + 1
+    loads = [0] * workers
+    owner = {}
+    for unit in sorted(counts, key=counts.get, reverse=True):
+        worker = loads.index(min(loads))
+        owner[unit] = worker
+        loads[worker] += counts[unit]
+    return owner
+
+class Roster:
+    """Ids, in ascending order, and names of every NPC of a sharded universe (see `Population.partner`)."""
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.names = np.zeros(0, dtype="S1")  # UTF-8
+
+    def __len__(self):
+        return len(self.ids)
+
+    def name(self, npc_id):
+        return self.names[np.searchsorted(self.ids, npc_id)].decode()
+
+    def update(self, added_ids, added_names, removed_ids):
+        """Drop the NPCs `removed_ids`, then add `added_ids` named `added_names` (an array of UTF-8 bytes)."""
+        if len(removed_ids):
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[np.searchsorted(self.ids, removed_ids)] = False
+            self.ids, self.names = self.ids[keep], self.names[keep]
+        if len(added_ids):
+            ids, names = np.concatenate((self.ids, added_ids)), np.concatenate((self.names, added_names))
+            if np.any(ids[1:] < ids[:-1]):
+                order = np.argsort(ids, kind="stable")
+                ids, names = ids[order], names[order]
+            self.ids, self.names = ids, names
+
+class _LinkLog:
+    """Stands in for a worker's social graph: keeps the links made, in order, for the coordinator's graph."""
+    def __init__(self):
+        self.links = []
+
+    def __len__(self):
+        return len(self.links)
+
+    def link(self, a, b, kind):
+        self.links.append((a, b, KIND_CODES[kind]))
+
+    def remove(self, npc_id):
+        pass  # The coordinator drops the NPCs that die from its graph
+
+def _moods(codes, table):
+    """Mood `codes` of another process's `table` (its `MOOD_CODES.values`) as codes of this process."""
+    return np.array([MOOD_CODES.code(mood) for mood in table], dtype=np.int32)[codes]
+
+def _columns(npcs):
+    """(ids, stress, mood codes, mood table) of `npcs`, for the coordinator's influence pass."""
+    npcs = list(npcs)
+    return (np.fromiter((npc.id for npc in npcs), dtype=np.int64, count=len(npcs)),
+            np.fromiter((npc._stress_level for npc in npcs), dtype=np.float64, count=len(npcs)),
+            np.fromiter((npc._mood for npc in npcs), dtype=np.int32, count=len(npcs)), list(MOOD_CODES.values))
+
+def _economy_delta(economy, sent):
+    """Changes to a worker's `economy` since `sent` (its groups and sketch buckets as last sent), which is updated.
+
+    Returns the changed group rows by (country, state) name, None for a
+    group that emptied, and the change of each sketch bucket's count.
+    """
+    groups, buckets = sent
+    rows = {}
+    for key, sums in economy.groups.items():
+        if groups.get(key) != sums:
+            groups[key] = list(sums)
+            rows[LOCATION_CODES[key[0]], LOCATION_CODES[key[1]]] = sums
+    for key in [key for key in groups if key not in economy.groups]:
+        del groups[key]
+        rows[LOCATION_CODES[key[0]], LOCATION_CODES[key[1]]] = None
+    sketch = economy.sketch
+    current = {(1, bucket): count for bucket, count in sketch.positive.items()}
+    current.update(((-1, bucket), count) for bucket, count in sketch.negative.items())
+    if sketch.zeros:
+        current[0, 0] = sketch.zeros
+    counts = {key: current.get(key, 0) - buckets.get(key, 0) for key in current.keys() | buckets.keys()}
+    sent[1] = current
+    return rows, {key: count for key, count in counts.items() if count}
+
+def _apply_delta(economy, delta):
+    """Bring the coordinator's copy `economy` of one worker's aggregates up to date with its `_economy_delta`.
+
+    The copy is the worker's alone, so the worker's group rows replace the
+    copy's outright.
+    """
+    rows, counts = delta
+    for (country, state), sums in rows.items():
+        key = LOCATION_CODES.code(country), LOCATION_CODES.code(state)
+        if sums is None:
+            del economy.groups[key]
+        else:
+            economy.groups[key] = sums
+    for key, count in counts.items():
+        economy.sketch.add_key(key, count)
+
+def _step_shard(npcs, streams, day, sent):
+    dead = []
+    members = list(npcs)
+    for npc, rng in zip(members, streams.dice_many("npc", [npc.id for npc in members], day, DAY_DRAWS)):
+        npc.live_day(rng=rng)
+        if not npc.alive:
+            dead.append(npc)
+    for npc in dead:  # Removed after the day, like the single-process loop does
+        npcs.remove(npc)
+    log_writer.end_day()
+    links, npcs._social = npcs._social.links, _LinkLog()
+    return [npc.id for npc in dead], links, _columns(npcs), _economy_delta(npcs.economy, sent)
+
+def _influence_shard(npcs, changes):
+    """Apply the coordinator's influence `changes` to the worker's NPCs."""
+    (stress_ids, stress), (mood_ids, mood, table) = changes
+    for npc_id, value in zip(stress_ids.tolist(), stress.tolist()):
+        npcs.get(npc_id).stress_level = value  # Through the setter, for the economy aggregates
+    for npc_id, code in zip(mood_ids.tolist(), _moods(mood, table).tolist()):
+        npcs.get(npc_id)._mood = code
+
+def _worker_main(conn, storage, base_dir, planets, streams):
+    paths.set_base_dir(base_dir)
+    npcs = Population(social=_LinkLog())
+    npcs.roster = Roster()
+    npcs.countries = countries_of(planets)  # Travel destinations
+    sent = [{}, {}]  # The economy as last sent to the coordinator (see `_economy_delta`)
+    try:
+        while True:
+            command, payload = conn.recv()
+            if command == "add":
+                for npc in payload:
+                    npc.storage = storage
+                npcs.extend(payload)
+            elif command == "step":
+                day, changes = payload
+                for change in changes:
+                    npcs.roster.update(*change)
+                conn.send(_step_shard(npcs, streams, day, sent))
+            elif command == "influence":
+                _influence_shard(npcs, payload)
+                conn.send(_economy_delta(npcs.economy, sent))
+            elif command == "collect":
+                log_writer.flush()
+                conn.send(list(npcs))
+            elif command == "stop":
+                break
+    finally:
+        log_writer.close()
+
+class ShardedSimulation:
+    """Runs a universe's daily loop across worker processes, one group of home states per worker."""
+    def __init__(self, universe, workers=None):
+        self.universe = universe
+        self.unit_of = home_unit(universe.storage)
+        units = {self.unit_of((country.name, state.name))
+                 for planet in universe.planets for country in planet.countries for state in country.states}
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(units)))
+        self.owner = partition_homes(universe.npcs, sorted(units), self.workers, self.unit_of)
+        self.roster = Roster()
+        self._changes = []  # Roster changes not yet sent to the workers
+        self._connections = []
+        self._processes = []
+        self.economies = []  # Per worker: aggregates over its NPCs as of the last step (see `_apply_delta`)
+        self.seconds = Counter()  # Coordinator wall time: "workers" stepping, "influence" pass, "exchange" of its changes
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")  # Never fork open SQLite connections
+        log_writer.flush()
+        for worker in range(self.workers):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(target=_worker_main, daemon=True, args=(
+                child_end, self.universe.storage, paths.base_dir, self.universe.planets, self.universe.random))
+            process.start()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+        self._enroll(sorted(self.universe.npcs, key=lambda npc: npc.id))
+        self._send_npcs(self.universe.npcs)
+        self.universe._economy = self.universe.npcs.economy
+        accuracy = self.universe._economy.sketch.relative_accuracy
+        self.economies = [EconomyAggregates(accuracy) for _ in range(self.workers)]
+        self._hand_over()
+
+    def _hand_over(self):
+        """Leave the universe an empty population that picks partners and parents from the roster."""
+        self.universe.npcs = []  # Workers own the NPCs until gather()
+        self.universe.npcs.roster = self.roster
+
+    def _enroll(self, npcs, removed=()):
+        """Add `npcs` to the roster and drop the ids `removed`; the workers' copies follow on the next step."""
+        ids = np.fromiter((npc.id for npc in npcs), dtype=np.int64, count=len(npcs))
+        names = np.array([npc.name.encode() for npc in npcs]) if len(npcs) else np.zeros(0, dtype="S1")
+        removed = np.asarray(removed, dtype=np.int64)
+        self.roster.update(ids, names, removed)
+        self._changes.append((ids, names, removed))
+
+    def _send_npcs(self, npcs):
+        shards = [[] for _ in range(self.workers)]
+        for npc in npcs:
+            shards[self.owner[self.unit_of(npc.home)]].append(npc)
+        for conn, shard in zip(self._connections, shards):
+            if shard:
+                conn.send(("add", shard))
+
+    def _influence(self, columns):
+        """Run the day's social influence over every NPC and send each worker the changes to its own.
+
+        Returns the connections of the workers that were sent changes; each answers with an economy delta.
+        """
+        universe = self.universe
+        graph = universe.npcs.social
+        sizes = [len(ids) for ids, _, _, _ in columns]
+        ids = np.concatenate([ids for ids, _, _, _ in columns])
+        stress = np.concatenate([stress for _, stress, _, _ in columns])
+        mood = np.concatenate([_moods(codes, table) for _, _, codes, table in columns])
+        if len(graph) and len(ids):
+            new_stress, new_mood = influence_columns(graph, ids, stress, mood, universe.random, universe.day)
+        else:
+            new_stress, new_mood = stress, mood
+        table = list(MOOD_CODES.values)
+        bounds = np.cumsum([0] + sizes)
+        changed = []
+        for conn, first, last in zip(self._connections, bounds[:-1], bounds[1:]):
+            part = slice(first, last)
+            stressed = np.flatnonzero(new_stress[part] != stress[part]) + first
+            moved = np.flatnonzero(new_mood[part] != mood[part]) + first
+            if len(stressed) or len(moved):
+                conn.send(("influence", ((ids[stressed], new_stress[stressed]), (ids[moved], new_mood[moved], table))))
+                changed.append(conn)
+        return changed
+
+    def step_day(self):
+        """Step every worker through the universe's current day; updates `economies`. Returns the number of deaths."""
+        changes, self._changes = self._changes, []
+        started = time.perf_counter()
+        for conn in self._connections:
+            conn.send(("step", (self.universe.day, changes)))
+        dead = []
+        links = []
+        columns = []
+        for conn, economy in zip(self._connections, self.economies):
+            shard_dead, shard_links, shard_columns, delta = conn.recv()
+            dead.extend(shard_dead)
+            links.extend(shard_links)
+            columns.append(shard_columns)
+            _apply_delta(economy, delta)
+        stepped = time.perf_counter()
+        self.seconds["workers"] += stepped - started
+        graph = self.universe.npcs.social
+        for npc_id in dead:
+            graph.remove(npc_id)
+        if links:
+            links.sort(key=lambda link: link[0])  # In stepping order: a later link between two NPCs wins
+            graph.link_many(*zip(*links))
+        self._enroll([], sorted(dead))
+        changed = self._influence(columns)
+        influenced = time.perf_counter()
+        self.seconds["influence"] += influenced - stepped
+        for conn in changed:
+            _apply_delta(self.economies[self._connections.index(conn)], conn.recv())
+        self.seconds["exchange"] += time.perf_counter() - influenced
+        return len(dead)
+
+    def gather(self):
+        """Return copies of every NPC currently owned by the workers, in id order."""
+        for conn in self._connections:
+            conn.send(("collect", None))
+        npcs = []
+        for conn in self._connections:
+            npcs.extend(conn.recv())
+        for npc in npcs:
+            npc.storage = self.universe.storage
+        npcs.sort(key=lambda npc: npc.id)
+        return npcs
+
+    def stop(self):
+        for conn in self._connections:
+            conn.send(("stop", None))
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def run(self, days_to_simulate, pacing, reporter):
+        """Run `days_to_simulate` days and hand the NPCs back to the universe."""
+        universe = self.universe
+        self.start()
+        try:
+            pacing.start()
+            reporter.start(universe)
+            for _ in range(days_to_simulate):
+                universe.current_time += timedelta(days=1)
+                universe.births_today = 0
+                deaths = self.step_day()
+                universe.population -= deaths
+                universe.deaths_today = deaths
+                universe.simulate_population_growth()
+                universe.add_arrivals()
+                handed = EconomyAggregates(self.economies[0].sketch.relative_accuracy)  # Not in any worker's figures yet
+                handed.add_many(list(universe.npcs))
+                if universe.npcs:
+                    self._enroll(list(universe.npcs))
+                    self._send_npcs(universe.npcs)
+                    self._hand_over()
+                universe._economy = EconomyAggregates.combine([*self.economies, handed])
+                universe.check_technology_discovery()
+                universe.population_over_time.append((universe.current_time, universe.population))
+                universe.log_birth_rate()
+                universe.log_death_rate()
+                universe.log_economy_data()
+                log_writer.end_day()
+                reporter.record_day(universe)
+                if reporter.due():
+                    if reporter.verbosity == "full":
+                        universe.npcs = self.gather()
+                    reporter.report(universe)
+                    self._hand_over()
+                pacing.wait()
+        finally:
+            try:
+                universe.npcs = self.gather()
+                universe._economy = None
+            finally:
+                self.stop()
+                log_writer.flush()
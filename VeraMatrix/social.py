@@ -0,0 +1,297 @@
+"""The social graph: typed links between NPCs, stored as compressed sparse rows.
+
+Nodes are NPC ids. Every link is stored in both directions, each as an int32
+neighbour id and a uint8 kind, so one link costs 10 bytes. New links go to
+an append buffer and removed NPCs are masked at once. `merge` folds the
+buffer into the CSR arrays and drops the links of removed NPCs. It sorts
+only the buffer and interleaves it with the already sorted arrays, which
+costs O(edges) plus O(buffer log buffer).
+
+Making links only merges once the buffer holds an eighth as many entries as
+the arrays do, so a run of `link` calls costs amortized O(1) each. The
+daily `influence` pass and every bulk read (edges, degrees, components)
+merge first, though, so a run with a social graph merges once a day. That
+is the same O(edges) as the influence pass itself, which sums over every
+link. `neighbors` reads the arrays and the buffer without merging.
+
+The merged arrays hold every live link exactly once per direction, sorted by
+(id, neighbour id), whatever order the links were made in and however often
+they were merged, so results do not depend on when earlier merges happened.
+Requires numpy.
+"""
+from array import array
+
+import numpy as np
+
+KINDS = ("Friend", "Colleague", "Neighbor", "Family")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+STRESS_INFLUENCE = 0.05  # Share of the gap to the neighbours' mean stress closed each day
+MOOD_CONTAGION = 0.02  # Daily chance that a linked NPC takes on the mood of a random neighbour
+MERGE_MIN = 1 << 16  # Buffered entries always allowed before a merge
+MERGE_FRACTION = 0.125  # Merge once the buffer holds this share of the merged entries
+
+def _segment_sums(values, indptr):
+    """Sum of `values` over each CSR row; empty rows sum to zero."""
+    sums = np.zeros(len(indptr) - 1, dtype=values.dtype)
+    nonempty = np.flatnonzero(indptr[1:] > indptr[:-1])
+    if len(nonempty):
+        sums[nonempty] = np.add.reduceat(values, indptr[nonempty])
+    return sums
+
+class SocialGraph:
+    """Undirected, typed links between NPC ids."""
+    def __init__(self):
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.kinds = np.zeros(0, dtype=np.uint8)
+        self.removed = np.zeros(0, dtype=bool)  # By id; True once an NPC left the graph
+        self.version = 0  # Bumped by every change, so a checkpoint can tell whether to store the links again
+        self._sources = array("i")
+        self._targets = array("i")
+        self._kinds = array("B")
+        self._stale = False  # Removed NPCs still have links in the CSR arrays
+
+    @property
+    def size(self):
+        """One more than the largest node id the graph knows."""
+        return max(len(self.indptr) - 1, len(self.removed))
+
+    def __len__(self):
+        """Number of stored link entries (two per link), counting buffered and stale ones."""
+        return len(self.indices) + len(self._sources)
+
+    @property
+    def nbytes(self):
+        return (self.indptr.nbytes + self.indices.nbytes + self.kinds.nbytes + self.removed.nbytes
+                + len(self._sources) * 9)
+
+    def _grow(self, size):
+        if size > len(self.removed):
+            removed = np.zeros(max(size, 2 * len(self.removed)), dtype=bool)
+            removed[:len(self.removed)] = self.removed
+            self.removed = removed
+
+    def link(self, a, b, kind):
+        """Link NPC ids `a` and `b` as `kind` (one of `KINDS`); a newer link between them replaces the kind."""
+        code = KIND_CODES[kind]
+        self._sources.extend((a, b))
+        self._targets.extend((b, a))
+        self._kinds.extend((code, code))
+        self._grow(max(a, b) + 1)
+        self.version += 1
+        self._maybe_merge()
+
+    def link_many(self, sources, targets, kinds):
+        """Link id arrays `sources` and `targets` pairwise; `kinds` holds kind codes."""
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        kinds = np.asarray(kinds, dtype=np.uint8)
+        if not len(sources):
+            return
+        # Both directions of each link side by side, so a later link in the arrays replaces an earlier one both ways
+        self._sources.frombytes(np.column_stack((sources, targets)).tobytes())
+        self._targets.frombytes(np.column_stack((targets, sources)).tobytes())
+        self._kinds.frombytes(np.column_stack((kinds, kinds)).tobytes())
+        self._grow(int(max(sources.max(), targets.max())) + 1)
+        self.version += 1
+        self._maybe_merge()
+
+    def remove(self, npc_id):
+        """Drop NPC `npc_id` and all its links."""
+        self._grow(npc_id + 1)
+        if not self.removed[npc_id]:
+            self.removed[npc_id] = True
+            self._stale = True
+            self.version += 1
+
+    def retain(self, ids):
+        """Drop every NPC that is not in `ids`."""
+        keep = np.zeros(self.size, dtype=bool)
+        ids = np.asarray(ids, dtype=np.int64)
+        keep[ids[ids < self.size]] = True
+        self._grow(self.size)
+        gone = ~keep & ~self.removed[:self.size]
+        if gone.any():
+            self.removed[:self.size] |= gone
+            self._stale = True
+            self.version += 1
+
+    def _maybe_merge(self):
+        if len(self._sources) > max(MERGE_MIN, MERGE_FRACTION * len(self.indices)):
+            self.merge()
+
+    def _buffer(self):
+        return (np.frombuffer(self._sources, dtype=np.int32), np.frombuffer(self._targets, dtype=np.int32),
+                np.frombuffer(self._kinds, dtype=np.uint8))
+
+    def merge(self):
+        """Fold the buffer into the CSR arrays and drop the links of removed NPCs."""
+        if not len(self._sources) and not self._stale:
+            return
+        size = self.size
+        self._grow(size)
+        removed = self.removed
+        keys = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr)) << 32 | self.indices
+        live = ~removed[keys >> 32] & ~removed[self.indices]
+        keys, kinds = keys[live], self.kinds[live]  # Still sorted and unique
+        sources, targets, new_kinds = self._buffer()
+        live = ~removed[sources] & ~removed[targets]
+        new_keys = sources[live].astype(np.int64) << 32 | targets[live]
+        order = np.argsort(new_keys, kind="stable")  # Stable: among duplicates the newest link sorts last
+        new_keys, new_kinds = new_keys[order], new_kinds[live][order]
+        last = np.ones(len(new_keys), dtype=bool)
+        last[:-1] = new_keys[1:] != new_keys[:-1]
+        new_keys, new_kinds = new_keys[last], new_kinds[last]
+        at = np.searchsorted(keys, new_keys)
+        known = at < len(keys)
+        known[known] = keys[at[known]] == new_keys[known]
+        kinds[at[known]] = new_kinds[known]  # A newer link between the same NPCs replaces the kind
+        fresh = ~known
+        keys = np.insert(keys, at[fresh], new_keys[fresh])
+        self.kinds = np.insert(kinds, at[fresh], new_kinds[fresh])
+        self.indices = (keys & 0xFFFFFFFF).astype(np.int32)
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys >> 32, minlength=size), out=self.indptr[1:])
+        self._sources, self._targets, self._kinds = array("i"), array("i"), array("B")
+        self._stale = False
+
+    def neighbors(self, npc_id):
+        """(id, kind) of every NPC linked to `npc_id`."""
+        found = {}
+        if npc_id < len(self.indptr) - 1:
+            start, stop = self.indptr[npc_id], self.indptr[npc_id + 1]
+            found.update(zip(self.indices[start:stop].tolist(), self.kinds[start:stop].tolist()))
+        if len(self._sources):
+            sources, targets, kinds = self._buffer()
+            rows = np.flatnonzero(sources == npc_id)
+            found.update(zip(targets[rows].tolist(), kinds[rows].tolist()))
+        removed = self.removed
+        return [(other, KINDS[kind]) for other, kind in found.items() if not removed[other]]
+
+    def edges(self):
+        """(a, b, kind code) arrays with every link once, a < b."""
+        self.merge()
+        sources = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))
+        once = sources < self.indices
+        return sources[once], self.indices[once], self.kinds[once]
+
+    def degrees(self):
+        """Number of links of every id below `size`."""
+        self.merge()
+        degrees = np.zeros(self.size, dtype=np.int64)
+        degrees[:len(self.indptr) - 1] = np.diff(self.indptr)
+        return degrees
+
+    def linked(self):
+        """Ids with at least one live link, ascending."""
+        self.merge()
+        return np.flatnonzero(self.indptr[1:] > self.indptr[:-1])
+
+    def degree_distribution(self, ids):
+        """counts[d] is the number of NPCs in `ids` with d links."""
+        degrees = self.degrees()
+        ids = np.asarray(ids, dtype=np.int64)
+        known = ids < len(degrees)
+        counts = np.zeros(len(ids), dtype=np.int64)
+        counts[known] = degrees[ids[known]]
+        return np.bincount(counts)
+
+    def components(self):
+        """Label of every id below `size`: the smallest id in its connected component."""
+        self.merge()
+        labels = np.arange(self.size, dtype=np.int64)
+        rows = len(self.indptr) - 1
+        nonempty = np.flatnonzero(self.indptr[1:] > self.indptr[:-1])
+        starts = self.indptr[nonempty]
+        while True:
+            # Take the smallest label among the neighbours, then jump labels to their own labels
+            updated = labels.copy()
+            if len(nonempty):
+                smallest = np.minimum.reduceat(labels[self.indices], starts)
+                updated[nonempty] = np.minimum(updated[nonempty], smallest)
+            while True:
+                jumped = updated[updated]
+                if np.array_equal(jumped, updated):
+                    break
+                updated = jumped
+            if np.array_equal(updated[:rows], labels[:rows]):
+                return updated
+            labels = updated
+
+    def component_sizes(self, ids):
+        """Sizes of the connected components of the NPCs in `ids`, largest first."""
+        labels = self.components()
+        ids = np.asarray(ids, dtype=np.int64)
+        own = ids >= len(labels)  # NPCs the graph has never seen are components of their own
+        _, counts = np.unique(labels[ids[~own]], return_counts=True)
+        return np.sort(np.concatenate((counts, np.ones(own.sum(), dtype=np.int64))))[::-1]
+
+    def _neighbour_sums(self, values):
+        """Sums of `values` (indexed by id) over every id's neighbours in the merged arrays, and their counts."""
+        size = len(values)
+        rows = min(len(self.indptr) - 1, size)
+        sums = np.zeros(size)
+        counts = np.zeros(size)
+        if len(self.indices):
+            indptr = self.indptr[:rows + 1]
+            indices = self.indices[:indptr[-1]]
+            inside = (indices < size).astype(np.float64)
+            sums[:rows] = _segment_sums(np.where(inside > 0, values[np.minimum(indices, size - 1)], 0.0), indptr)
+            counts[:rows] = _segment_sums(inside, indptr)
+        return sums, counts
+
+    def influence(self, stress, mood, draws, stress_influence=STRESS_INFLUENCE, mood_contagion=MOOD_CONTAGION):
+        """One day of social influence over arrays indexed by NPC id; returns new (stress, mood) arrays.
+
+        Every linked NPC closes `stress_influence` of the gap between its
+        stress and its neighbours' mean. With chance `mood_contagion` it also
+        takes on the mood code of one neighbour picked at random from its
+        links. `draws` holds two uniforms per id, for the contagion roll and
+        the pick; only the rows of `linked()` ids are read. Merges first, so
+        the result depends only on the live links.
+        """
+        self.merge()
+        sums, counts = self._neighbour_sums(stress)
+        linked = counts > 0
+        stress = stress.copy()
+        stress[linked] += stress_influence * (sums[linked] / counts[linked] - stress[linked])
+        mood = mood.copy()
+        rows = min(len(self.indptr) - 1, len(mood))
+        degrees = np.diff(self.indptr[:rows + 1])
+        catching = np.flatnonzero((degrees > 0) & linked[:rows] & (draws[:rows, 0] < mood_contagion))
+        if len(catching):
+            picks = self.indices[self.indptr[catching] + (draws[catching, 1] * degrees[catching]).astype(np.int64)]
+            inside = picks < len(mood)
+            mood[catching[inside]] = mood[picks[inside]]
+        return stress, mood
+
+def influence_columns(graph, ids, stress, mood, streams, day):
+    """One `graph.influence` day over the NPCs `ids` with `stress` and `mood` codes; returns their new values.
+
+    The draws come from the "social" streams of `streams` on `day`, for the
+    linked NPCs only.
+    """
+    size = max(graph.size, int(ids.max()) + 1)
+    all_stress = np.zeros(size)
+    all_stress[ids] = stress
+    all_mood = np.zeros(size, dtype=np.int32)
+    all_mood[ids] = mood
+    linked = graph.linked()
+    draws = np.zeros((size, 2))
+    draws[linked] = streams.block("social", linked, day, 2)
+    all_stress, all_mood = graph.influence(all_stress, all_mood, draws)
+    return all_stress[ids], all_mood[ids]
+
+def influence_npcs(graph, npcs, streams, day):
+    """Run `influence_columns` over NPC objects, writing changed stress and mood back onto them."""
+    npcs = list(npcs)
+    if not npcs:
+        return
+    ids = np.fromiter((npc.id for npc in npcs), dtype=np.int64, count=len(npcs))
+    stress = np.fromiter((npc._stress_level for npc in npcs), dtype=np.float64, count=len(npcs))
+    mood = np.fromiter((npc._mood for npc in npcs), dtype=np.int32, count=len(npcs))
+    new_stress, new_mood = influence_columns(graph, ids, stress, mood, streams, day)
+    for position in np.flatnonzero(new_stress != stress).tolist():
+        npcs[position].stress_level = float(new_stress[position])  # Through the setter, for the economy aggregates
+    for position in np.flatnonzero(new_mood != mood).tolist():
+        npcs[position]._mood = int(new_mood[position])
@@ -0,0 +1,585 @@
+"""SQLite storage for NPC records: the batched log writer and the storage backends."""
+import atexit
+import glob
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from . import paths
+from .world import build_earth
+
+# Durability levels for the log writer: (journal_mode, synchronous)
+DURABILITY_LEVELS = {
+    "full": ("DELETE", "FULL"),    # Classic rollback journal, fsync on every commit
+    "normal": ("WAL", "NORMAL"),   # Write-ahead log, fsync only at checkpoints
+    "off": ("WAL", "OFF"),         # Leave flushing to the OS (fastest, least safe)
+}
+
+class LogWriter:
+    """Buffers log rows in memory and writes them out in large batched transactions.
+
+    Rows are grouped per database file and per INSERT statement so each flush is
+    one transaction per file with a single executemany per statement. Flushes
+    happen when `flush_rows` rows are pending or every `flush_days` simulated days.
+    """
+    def __init__(self, flush_rows=100000, flush_days=30, durability="normal", max_connections=64):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.flush_rows = flush_rows
+        self.flush_days = flush_days
+        self.durability = durability
+        self.max_connections = max_connections
+        self.pending_rows = 0
+        self.days_since_flush = 0
+        self.rows_written = 0
+        self.commits = 0
+        self.on_commit = None  # Called with each commit's latency in seconds (see VeraMatrix.metrics)
+        self._buffers = {}  # db_path -> {sql: [params, ...]}
+        self._connections = OrderedDict()  # db_path -> connection, least recently used first
+
+    def connection(self, db_path):
+        conn = self._connections.get(db_path)
+        if conn is not None:
+            self._connections.move_to_end(db_path)
+            return conn
+        conn = sqlite3.connect(db_path)
+        journal_mode, synchronous = DURABILITY_LEVELS[self.durability]
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._connections[db_path] = conn
+        if len(self._connections) > self.max_connections:
+            old_path, old_conn = self._connections.popitem(last=False)
+            self._flush_path(old_path, old_conn)
+            old_conn.close()
+        return conn
+
+    def execute_script(self, db_path, script):
+        conn = self.connection(db_path)
+        conn.executescript(script)
+        conn.commit()
+
+    def write(self, db_path, sql, params):
+        self._buffers.setdefault(db_path, {}).setdefault(sql, []).append(params)
+        self.pending_rows += 1
+        if self.pending_rows >= self.flush_rows:
+            self.flush()
+
+    def write_many(self, db_path, sql, rows):
+        """Buffer many rows of one statement; they are committed together, in one transaction."""
+        self._buffers.setdefault(db_path, {}).setdefault(sql, []).extend(rows)
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.flush_rows:
+            self.flush()
+
+    def end_day(self):
+        self.days_since_flush += 1
+        if self.days_since_flush >= self.flush_days:
+            self.flush()
+
+    def _flush_path(self, db_path, conn):
+        statements = self._buffers.pop(db_path, None)
+        if not statements:
+            return
+        started = time.perf_counter()
+        with conn:
+            for sql, rows in statements.items():
+                conn.executemany(sql, rows)
+                self.rows_written += len(rows)
+                self.pending_rows -= len(rows)
+        self.commits += 1
+        if self.on_commit is not None:
+            self.on_commit(time.perf_counter() - started)
+
+    def flush(self, db_path=None):
+        if db_path is not None:
+            if db_path in self._buffers:
+                self._flush_path(db_path, self.connection(db_path))
+            return
+        for path in list(self._buffers):
+            self._flush_path(path, self.connection(path))
+        self.days_since_flush = 0
+
+    def close(self):
+        self.flush()
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+# Shared writer used by every NPC and the global logs; flushed on interpreter exit
+log_writer = LogWriter()
+atexit.register(log_writer.close)
+
+# Per-NPC files live in MatrixSim/EarthData/<country dir>/<state dir>
+PLANET_DIR = "EarthData"
+
+def location_dir(name):
+    """Directory of a country or state: its letters and digits, then "Data" ("New York" -> "NewYorkData")."""
+    return "".join(char for char in name if char.isalnum()) + "Data"
+
+def location_names(planets=None):
+    """{directory: name} of the countries and states of `planets`, by default the bundled Earth."""
+    names = {}
+    for planet in planets or [build_earth()]:
+        for country in planet.countries:
+            names[location_dir(country.name)] = country.name
+            for state in country.states:
+                names[location_dir(state.name)] = state.name
+    return names
+
+NPC_TABLES = '''
+    CREATE TABLE IF NOT EXISTS LifeEvents (
+        date TEXT,
+        event TEXT,
+        consequences TEXT,
+        choice_quality TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Finances (
+        date TEXT,
+        money REAL
+    );
+    CREATE TABLE IF NOT EXISTS Family (
+        name TEXT,
+        relation TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Status (
+        date TEXT,
+        health REAL,
+        intelligence REAL,
+        work_skill REAL,
+        social_skill REAL,
+        survival_skill REAL,
+        stress_level REAL,
+        thoughts TEXT,
+        location TEXT,
+        time_of_day TEXT,
+        self_awareness INTEGER,
+        mood TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_lifeevents_date ON LifeEvents (date);
+    CREATE INDEX IF NOT EXISTS idx_finances_date ON Finances (date);
+    CREATE INDEX IF NOT EXISTS idx_status_date ON Status (date);
+'''
+
+WORLD_TABLES = '''
+    CREATE TABLE IF NOT EXISTS Npcs (
+        npc_id INTEGER PRIMARY KEY,
+        name TEXT,
+        country TEXT,
+        state TEXT
+    );
+    CREATE TABLE IF NOT EXISTS LifeEvents (
+        npc_id INTEGER,
+        date TEXT,
+        event TEXT,
+        consequences TEXT,
+        choice_quality TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Finances (
+        npc_id INTEGER,
+        date TEXT,
+        money REAL
+    );
+    CREATE TABLE IF NOT EXISTS Family (
+        npc_id INTEGER,
+        name TEXT,
+        relation TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Status (
+        npc_id INTEGER,
+        date TEXT,
+        health REAL,
+        intelligence REAL,
+        work_skill REAL,
+        social_skill REAL,
+        survival_skill REAL,
+        stress_level REAL,
+        thoughts TEXT,
+        location TEXT,
+        time_of_day TEXT,
+        self_awareness INTEGER,
+        mood TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_lifeevents_npc_date ON LifeEvents (npc_id, date);
+    CREATE INDEX IF NOT EXISTS idx_finances_npc_date ON Finances (npc_id, date);
+    CREATE INDEX IF NOT EXISTS idx_family_npc ON Family (npc_id);
+    CREATE INDEX IF NOT EXISTS idx_status_npc_date ON Status (npc_id, date);
+'''
+
+HISTORY_TABLES = ("LifeEvents", "Finances", "Family", "Status")
+_EMPTY_NPC_DATABASE = None
+
+def _empty_npc_database():
+    """The bytes of a database file with the NPC tables and no rows."""
+    global _EMPTY_NPC_DATABASE
+    if _EMPTY_NPC_DATABASE is None:
+        conn = sqlite3.connect(":memory:")
+        conn.executescript(NPC_TABLES)
+        _EMPTY_NPC_DATABASE = conn.serialize()
+        conn.close()
+    return _EMPTY_NPC_DATABASE
+
+def _take_ids(storage, count):
+    """Advance `storage`'s `next_id` past `count` ids and return them as a range."""
+    first = storage.next_id
+    storage.next_id = first + count
+    return range(first, first + count)
+
+def _history_page_sql(table, by_npc, after):
+    """SELECT for one page of an NPC history table, in history order and after the page key `after`.
+
+    Rows start with their page key columns (see `split_history_row`), so the
+    next page continues through the index instead of skipping an OFFSET.
+    """
+    if table not in HISTORY_TABLES:
+        raise ValueError(f"Unknown history table: {table}")
+    keys, order, bound = (("rowid", "rowid", "rowid > ?") if table == "Family"
+                          else ("rowid, date", "date, rowid", "(date, rowid) > (?, ?)"))
+    conditions = (["npc_id = ?"] if by_npc else []) + ([bound] if after is not None else [])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f'SELECT {keys}, * FROM {table}{where} ORDER BY {order} LIMIT ?'
+
+def split_history_row(table, row):
+    """(page key, record) of a row from a `history_query`; pass the key of a page's last row as `after`."""
+    if table == "Family":
+        return row[:1], row[1:]
+    return (row[1], row[0]), row[2:]
+
+class PerNPCStorage:
+    """Original storage layout: one SQLite file per NPC under MatrixSim/EarthData.
+
+    Paths are computed once per home and name and reused for every row.
+    Directories are created when the first NPC of a state registers. A new
+    NPC's file is written from an image of an empty database with the NPC
+    tables, so registering does not open a connection.
+    """
+    def __init__(self, writer=None):
+        self.writer = writer or log_writer
+        self.next_id = 1
+        self._directories = set()
+        self._paths = {}  # (home code, name) -> file, under _base_dir
+        self._base_dir = paths.base_dir
+
+    def __getstate__(self):
+        return {}  # Connections stay behind; an unpickled copy uses the receiving process's writer
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def db_path(self, npc):
+        if self._base_dir != paths.base_dir:
+            self._paths.clear()
+            self._base_dir = paths.base_dir
+        key = (npc._home, npc.name)
+        path = self._paths.get(key)
+        if path is None:
+            country, state = npc.home
+            path = self._paths[key] = os.path.join(paths.base_dir, PLANET_DIR, location_dir(country),
+                                                   location_dir(state),
+                                                   f"{npc.name.lower().replace(' ', '_')}_db.sqlite")
+        return path
+
+    def _create(self, npc):
+        db = self.db_path(npc)
+        directory = os.path.dirname(db)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        try:
+            with open(db, "xb") as f:
+                f.write(_empty_npc_database())
+        except FileExistsError:
+            pass  # Same as CREATE TABLE IF NOT EXISTS: an existing file keeps its records
+
+    def register(self, npc):
+        self._create(npc)
+        return _take_ids(self, 1)[0]
+
+    def register_many(self, npcs):
+        """Create the files of NPCs whose ids came from `new_ids`."""
+        for npc in npcs:
+            self._create(npc)
+
+    def new_ids(self, count):
+        """A range of `count` fresh ids."""
+        return _take_ids(self, count)
+
+    def reserve_ids(self, last_id):
+        """Hand out ids above `last_id` from now on (used when resuming a checkpoint)."""
+        self.next_id = last_id + 1
+
+    def log_event(self, npc, date, event, consequences, choice_quality):
+        self.writer.write(self.db_path(npc), 'INSERT INTO LifeEvents (date, event, consequences, choice_quality) VALUES (?, ?, ?, ?)',
+                          (date, event, consequences, choice_quality))
+
+    def log_finances(self, npc, date, money):
+        self.writer.write(self.db_path(npc), 'INSERT INTO Finances (date, money) VALUES (?, ?)', (date, money))
+
+    def log_status(self, npc, date, status):
+        self.writer.write(self.db_path(npc), '''
+            INSERT INTO Status (date, health, intelligence, work_skill, social_skill, survival_skill, stress_level, thoughts, location, time_of_day, self_awareness, mood)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (date,) + status)
+
+    def log_family(self, npc, name, relation):
+        self.writer.write(self.db_path(npc), 'INSERT INTO Family (name, relation) VALUES (?, ?)', (name, relation))
+
+    def relocate(self, npc, country, state):
+        pass  # The file stays under the NPC's home; Status rows carry the current location
+
+    def history(self, npc, table, limit=100, offset=0):
+        if table not in HISTORY_TABLES:
+            raise ValueError(f"Unknown history table: {table}")
+        self.writer.flush(self.db_path(npc))
+        order = "rowid" if table == "Family" else "date, rowid"
+        conn = self.writer.connection(self.db_path(npc))
+        return conn.execute(f'SELECT * FROM {table} ORDER BY {order} LIMIT ? OFFSET ?', (limit, offset)).fetchall()
+
+    def history_query(self, npc, table, limit=100, after=None):
+        """(database path, SQL, parameters) of one keyset page of `npc`'s `table` history."""
+        return self.db_path(npc), _history_page_sql(table, False, after), (*(after or ()), limit)
+
+def _max_npc_id(directory):
+    """Largest npc_id in the Npcs tables of the world databases in `directory`; 0 if there are none."""
+    max_id = 0
+    for path in glob.glob(os.path.join(directory, "world*.sqlite")):
+        conn = sqlite3.connect(path)
+        try:
+            row = conn.execute('SELECT MAX(npc_id) FROM Npcs').fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        conn.close()
+        if row and row[0]:
+            max_id = max(max_id, row[0])
+    return max_id
+
+def _fresh_directory(directory):
+    """`directory`, or the first of `directory`_2, _3, ... that holds no NPCs."""
+    candidate, number = directory, 1
+    while _max_npc_id(candidate):
+        number += 1
+        candidate = f"{directory}_{number}"
+    return candidate
+
+class WorldStorage:
+    """All NPC tables in one database, or one shard per country/state, keyed by a stable npc_id.
+
+    Shards are created on first use. An NPC's rows go to the shard of its
+    home; its Npcs row follows it when it relocates.
+
+    A directory holds the NPCs of one run. Ids start at 1, as with the other
+    backends, so a run's names and random streams do not depend on what was
+    stored before. Without a `directory`, the first of WorldData, WorldData_2,
+    WorldData_3, ... under the base directory that holds no NPCs yet is used,
+    so every run gets its own. Handing out ids in a given `directory` that
+    already has NPCs raises ValueError, unless the id space was taken over
+    with `reserve_ids` (when resuming that run from a checkpoint, or when
+    importing with `migrate_per_npc_files`).
+    """
+    def __init__(self, writer=None, shard_by=None, directory=None):
+        if shard_by not in (None, "country", "state"):
+            raise ValueError(f"Unknown shard key: {shard_by}")
+        self.writer = writer or log_writer
+        self.shard_by = shard_by
+        self.directory = directory or _fresh_directory(os.path.join(paths.base_dir, "WorldData"))
+        self._ready = set()
+        self._paths = {}  # Home code -> shard
+        self.next_id = None  # Set on first use, once the directory is known to hold no other run
+
+    def __getstate__(self):
+        return {"shard_by": self.shard_by, "directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(shard_by=state["shard_by"], directory=state["directory"])
+
+    def _start_ids(self):
+        if self.next_id is None:
+            if self._max_existing_id():
+                raise ValueError(f"{self.directory} already holds the NPCs of another run; use another output "
+                                 f"directory, or resume that run from one of its checkpoints")
+            self.next_id = 1
+
+    def reserve_ids(self, last_id):
+        """Hand out ids above `last_id` from now on, whatever the directory holds."""
+        self.next_id = last_id + 1
+
+    def _max_existing_id(self):
+        return _max_npc_id(self.directory)
+
+    def shard_path(self, country, state):
+        if self.shard_by == "country":
+            name = f"world_{country}"
+        elif self.shard_by == "state":
+            name = f"world_{country}_{state}"
+        else:
+            name = "world"
+        path = os.path.join(self.directory, name.lower().replace(' ', '_') + ".sqlite")
+        if path not in self._ready:
+            os.makedirs(self.directory, exist_ok=True)
+            self.writer.execute_script(path, WORLD_TABLES)
+            self._ready.add(path)
+        return path
+
+    def db_path(self, npc):
+        path = self._paths.get(npc._home)
+        if path is None:
+            path = self._paths[npc._home] = self.shard_path(*npc.home)
+        return path
+
+    def register(self, npc):
+        npc_id = self.new_ids(1)[0]
+        self.writer.write(self.db_path(npc), 'INSERT OR REPLACE INTO Npcs (npc_id, name, country, state) VALUES (?, ?, ?, ?)',
+                          (npc_id, npc.name, npc.country, npc.state))
+        return npc_id
+
+    def register_many(self, npcs):
+        """Add the Npcs rows of NPCs whose ids came from `new_ids`; each shard's rows commit together."""
+        rows = {}
+        for npc in npcs:
+            rows.setdefault(self.db_path(npc), []).append((npc.id, npc.name, npc.country, npc.state))
+        for path, shard_rows in rows.items():
+            self.writer.write_many(path, 'INSERT OR REPLACE INTO Npcs (npc_id, name, country, state) VALUES (?, ?, ?, ?)',
+                                   shard_rows)
+
+    def new_ids(self, count):
+        """A range of `count` fresh ids."""
+        self._start_ids()
+        return _take_ids(self, count)
+
+    def relocate(self, npc, country, state):
+        # The same statement as register, so the two stay in order in the writer's buffer
+        self.writer.write(self.db_path(npc), 'INSERT OR REPLACE INTO Npcs (npc_id, name, country, state) VALUES (?, ?, ?, ?)',
+                          (npc.id, npc.name, country, state))
+
+    def log_event(self, npc, date, event, consequences, choice_quality):
+        self.writer.write(self.db_path(npc), 'INSERT INTO LifeEvents (npc_id, date, event, consequences, choice_quality) VALUES (?, ?, ?, ?, ?)',
+                          (npc.id, date, event, consequences, choice_quality))
+
+    def log_finances(self, npc, date, money):
+        self.writer.write(self.db_path(npc), 'INSERT INTO Finances (npc_id, date, money) VALUES (?, ?, ?)', (npc.id, date, money))
+
+    def log_status(self, npc, date, status):
+        self.writer.write(self.db_path(npc), '''
+            INSERT INTO Status (npc_id, date, health, intelligence, work_skill, social_skill, survival_skill, stress_level, thoughts, location, time_of_day, self_awareness, mood)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (npc.id, date) + status)
+
+    def log_family(self, npc, name, relation):
+        self.writer.write(self.db_path(npc), 'INSERT INTO Family (npc_id, name, relation) VALUES (?, ?, ?)', (npc.id, name, relation))
+
+    def history(self, npc, table, limit=100, offset=0):
+        if table not in HISTORY_TABLES:
+            raise ValueError(f"Unknown history table: {table}")
+        self.writer.flush(self.db_path(npc))
+        order = "rowid" if table == "Family" else "date, rowid"
+        conn = self.writer.connection(self.db_path(npc))
+        return conn.execute(f'SELECT * FROM {table} WHERE npc_id = ? ORDER BY {order} LIMIT ? OFFSET ?',
+                            (npc.id, limit, offset)).fetchall()
+
+    def history_query(self, npc, table, limit=100, after=None):
+        """(database path, SQL, parameters) of one keyset page of `npc`'s `table` history."""
+        return self.db_path(npc), _history_page_sql(table, True, after), (npc.id, *(after or ()), limit)
+
+class NullStorage:
+    """Discards all NPC records; useful for benchmarks and throwaway runs."""
+    def __init__(self):
+        self.next_id = 1
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def db_path(self, npc):
+        return None
+
+    def register(self, npc):
+        return _take_ids(self, 1)[0]
+
+    def register_many(self, npcs):
+        pass
+
+    def new_ids(self, count):
+        return _take_ids(self, count)
+
+    def reserve_ids(self, last_id):
+        self.next_id = last_id + 1
+
+    def log_event(self, npc, date, event, consequences, choice_quality):
+        pass
+
+    def log_finances(self, npc, date, money):
+        pass
+
+    def log_status(self, npc, date, status):
+        pass
+
+    def log_family(self, npc, name, relation):
+        pass
+
+    def relocate(self, npc, country, state):
+        pass
+
+    def history(self, npc, table, limit=100, offset=0):
+        return []
+
+    def history_query(self, npc, table, limit=100, after=None):
+        return None  # Nothing is stored
+
+def migrate_per_npc_files(world_storage, source_dir=None, remove=False, planets=None):
+    """Import every per-NPC SQLite file under `source_dir` into a WorldStorage.
+
+    Returns the number of NPC files imported. The NPC's country and state are
+    recovered from its directory, among those of `planets` (the bundled
+    Earth by default), and its name from the file name. Imported NPCs get
+    ids after those already in `world_storage`.
+    """
+    source_dir = source_dir or paths.base_dir
+    if world_storage.next_id is None:
+        world_storage.reserve_ids(world_storage._max_existing_id())
+    names = location_names(planets)
+    imported = 0
+    pattern = os.path.join(source_dir, PLANET_DIR, "*", "*", "*_db.sqlite")
+    for path in sorted(glob.glob(pattern)):
+        state_dir = os.path.dirname(path)
+        country = names.get(os.path.basename(os.path.dirname(state_dir)))
+        state = names.get(os.path.basename(state_dir))
+        if country is None or state is None:
+            continue
+        name = os.path.basename(path)[:-len("_db.sqlite")].replace('_', ' ').title()
+        shard = world_storage.shard_path(country, state)
+        npc_id = world_storage.new_ids(1)[0]
+        world_storage.writer.flush(shard)
+        conn = world_storage.writer.connection(shard)
+        conn.execute('ATTACH DATABASE ? AS src', (path,))
+        try:
+            with conn:
+                conn.execute('INSERT INTO Npcs (npc_id, name, country, state) VALUES (?, ?, ?, ?)',
+                             (npc_id, name, country, state))
+                conn.execute('INSERT INTO LifeEvents SELECT ?, date, event, consequences, choice_quality FROM src.LifeEvents', (npc_id,))
+                conn.execute('INSERT INTO Finances SELECT ?, date, money FROM src.Finances', (npc_id,))
+                conn.execute('INSERT INTO Family SELECT ?, name, relation FROM src.Family', (npc_id,))
+                conn.execute('''
+                    INSERT INTO Status SELECT ?, date, health, intelligence, work_skill, social_skill, survival_skill,
+                        stress_level, thoughts, location, time_of_day, self_awareness, mood FROM src.Status
+                ''', (npc_id,))
+        finally:
+            conn.execute('DETACH DATABASE src')
+        if remove:
+            os.remove(path)
+        imported += 1
+    return imported
+
+STORAGE_MODES = ("files", "world", "world-country", "world-state", "none")
+
+def make_storage(mode):
+    """Create the storage backend for one of the STORAGE_MODES names."""
+    if mode == "files":
+        return PerNPCStorage()
+    if mode == "none":
+        return NullStorage()
+    shard_by = {"world": None, "world-country": "country", "world-state": "state"}[mode]
+    return WorldStorage(shard_by=shard_by)
+
+default_storage = PerNPCStorage()
@@ -0,0 +1,241 @@
+"""Time series of a run: compact in-memory columns and indexed rollup tables.
+
+`TimeSeries` keeps append-only columns in typed `array.array`s. Once
+`memory_rows` rows are held it spills them to one file per column, so a long
+run keeps a bounded slice of its history in memory. `PopulationTimeline` is
+the universe's (date, population) series built on it.
+
+The daily figures of every run go to one SQLite database, keyed by run id
+and day. `RunRecorder` writes them and maintains monthly and yearly rollups
+as the days come in. `query` reads one run at one resolution through the
+primary key indexes, so a plot of one run never touches the rows of the
+others.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+from array import array
+from datetime import datetime, timedelta
+
+from . import paths
+from .storage import log_writer
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MEMORY_ROWS = 1 << 16  # Rows per column held in memory before a spill
+MAX_POINTS = 1000  # Largest number of periods `resolution_for` picks
+
+RESOLUTIONS = ("day", "month", "year")
+METRICS = ("population", "births", "deaths", "total_money", "average_money", "median_money", "gini")
+TABLES = {"day": "DailyMetrics", "month": "MonthlyMetrics", "year": "YearlyMetrics"}
+
+def _close_spill(directory, files):
+    for f in files:
+        f.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+class TimeSeries:
+    """Append-only typed columns, spilled to disk past `memory_rows` rows.
+
+    `columns` is a sequence of (name, array typecode) pairs. Spill files live
+    in a temporary directory under `spill_dir` (the system default if None)
+    and are removed when the series is garbage collected.
+    """
+    def __init__(self, columns, memory_rows=MEMORY_ROWS, spill_dir=None):
+        self.names = tuple(name for name, _ in columns)
+        self.typecodes = tuple(typecode for _, typecode in columns)
+        self.memory_rows = memory_rows
+        self.spill_dir = spill_dir
+        self.spilled = 0
+        self._columns = [array(typecode) for typecode in self.typecodes]
+        self._files = None  # One spill file per column, opened on the first spill
+
+    def __len__(self):
+        return self.spilled + len(self._columns[0])
+
+    def append(self, row):
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        if len(self._columns[0]) >= self.memory_rows:
+            self._spill()
+
+    def extend_columns(self, columns):
+        """Append whole columns at once (one iterable per column, of equal lengths)."""
+        for column, values in zip(self._columns, columns):
+            column.extend(values)
+        if len(self._columns[0]) >= self.memory_rows:
+            self._spill()
+
+    def _spill(self):
+        if self._files is None:
+            directory = tempfile.mkdtemp(prefix="veramatrix-series-", dir=self.spill_dir)
+            self._files = [open(os.path.join(directory, f"{name}.bin"), "w+b") for name in self.names]
+            weakref.finalize(self, _close_spill, directory, self._files)
+        for f, column in zip(self._files, self._columns):
+            f.seek(0, os.SEEK_END)
+            column.tofile(f)
+        self.spilled += len(self._columns[0])
+        self._columns = [array(typecode) for typecode in self.typecodes]
+
+    def columns(self, start=0, stop=None):
+        """Rows `start` to `stop` of every column, as one array per column."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        result = []
+        for i, typecode in enumerate(self.typecodes):
+            column = array(typecode)
+            if start < self.spilled:
+                f = self._files[i]
+                f.seek(start * column.itemsize)
+                column.fromfile(f, min(stop, self.spilled) - start)
+            low, high = max(start - self.spilled, 0), stop - self.spilled
+            if high > low:
+                column.extend(self._columns[i][low:high])
+            result.append(column)
+        return result
+
+    def rows(self, start=0, stop=None):
+        """Iterate rows as tuples, reading spilled rows back one chunk at a time."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for low in range(start, stop, self.memory_rows):
+            yield from zip(*self.columns(low, min(low + self.memory_rows, stop)))
+
+    def __iter__(self):
+        return self.rows()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("Time series slices do not take a step")
+            return list(self.rows(index.start, index.stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("time series index out of range")
+        return next(self.rows(index, index + 1))
+
+class PopulationTimeline(TimeSeries):
+    """(datetime, population) points of a universe, stored as microseconds since `EPOCH` and counts."""
+    def __init__(self, memory_rows=MEMORY_ROWS, spill_dir=None):
+        super().__init__((("time", "q"), ("population", "q")), memory_rows, spill_dir)
+
+    def append(self, point):
+        time, population = point
+        super().append(((time - EPOCH) // MICROSECOND, population))
+
+    def extend(self, points):
+        for point in points:
+            self.append(point)
+
+    def rows(self, start=0, stop=None):
+        for time, population in super().rows(start, stop):
+            yield EPOCH + timedelta(microseconds=time), population
+
+def _connection():
+    db_path = paths.timeseries_db()
+    log_writer.flush(db_path)  # Readers see every buffered row
+    return log_writer.connection(db_path)
+
+def begin_run(start_date, run_id=None):
+    """Register a run and return its id; an existing `run_id` (a resumed run) is kept."""
+    conn = _connection()
+    with conn:
+        cursor = conn.execute('INSERT OR IGNORE INTO Runs (run_id, started, start_date) VALUES (?, ?, ?)',
+                              (run_id, datetime.now().isoformat(), start_date.date().isoformat()))
+    return run_id if run_id is not None else cursor.lastrowid
+
+def runs():
+    """(run_id, started, start_date) of every registered run."""
+    return _connection().execute('SELECT run_id, started, start_date FROM Runs ORDER BY run_id').fetchall()
+
+def _period(resolution, day):
+    date = datetime.fromordinal(day)
+    return date.year * 100 + date.month if resolution == "month" else date.year
+
+class RunRecorder:
+    """Writes the figures of one run and keeps its monthly and yearly rollups current.
+
+    Each `record` writes one DailyMetrics row and rewrites the open month and
+    year rows, all through the shared write-behind `log_writer`. A rollup row
+    holds the sums of births and deaths over the period, the minimum and
+    maximum population, and the other figures as of the period's last day.
+    """
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.last = None  # (date, days, population, births, deaths, total, average and median money, gini) last recorded
+        self._open = {}  # resolution -> rollup row of the period in progress
+
+    def _rollup(self, resolution, period):
+        row = self._open.get(resolution)
+        if row is not None and row[1] == period:
+            return row
+        if row is None:  # Resuming a run: carry on with the row written before the checkpoint
+            found = _connection().execute(
+                f'SELECT * FROM {TABLES[resolution]} WHERE run_id = ? AND period = ?',
+                (self.run_id, period)).fetchone()
+            if found is not None:
+                row = self._open[resolution] = list(found)
+                return row
+        row = self._open[resolution] = [self.run_id, period, None, None, 0, 0, 0, None, None, None,
+                                        None, None, None, None]
+        return row
+
+    def record(self, date, days, population, births, deaths, total_money, average_money, median_money, gini):
+        """Record the `days` days ending on `date` (1 for a daily run, more when fast-forwarding)."""
+        db_path = paths.timeseries_db()
+        day = date.toordinal()
+        figures = (total_money, average_money, median_money, gini)
+        self.last = (date, days, population, births, deaths) + figures
+        log_writer.write(db_path, 'INSERT OR REPLACE INTO DailyMetrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (self.run_id, day, days, population, births, deaths) + figures)
+        for resolution in ("month", "year"):
+            row = self._rollup(resolution, _period(resolution, day))
+            # run_id, period, first_day, last_day, days, births, deaths, population, min, max, money figures
+            if row[2] is None:
+                row[2] = day - days + 1
+            row[3] = day
+            row[4] += days
+            row[5] += births
+            row[6] += deaths
+            row[7] = population
+            row[8] = population if row[8] is None else min(row[8], population)
+            row[9] = population if row[9] is None else max(row[9], population)
+            row[10:14] = figures
+            log_writer.write(db_path, f'INSERT OR REPLACE INTO {TABLES[resolution]} VALUES '
+                                      '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', tuple(row))
+
+def resolution_for(run_id, max_points=MAX_POINTS):
+    """The finest resolution at which run `run_id` has at most `max_points` periods."""
+    first, last = _connection().execute('SELECT MIN(day), MAX(day) FROM DailyMetrics WHERE run_id = ?',
+                                        (run_id,)).fetchone()
+    if first is None or last - first < max_points:
+        return "day"
+    first, last = datetime.fromordinal(first), datetime.fromordinal(last)
+    if (last.year - first.year) * 12 + last.month - first.month < max_points:
+        return "month"
+    return "year"
+
+def query(run_id, resolution="day", fields=METRICS, start=None, end=None):
+    """Columns of run `run_id` at `resolution`, optionally limited to dates `start` to `end` inclusive.
+
+    Returns a dict with a "date" list (the last day of each period) and one
+    list per field. Rollups also offer "days", "population_min" and
+    "population_max".
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    # Rollups are keyed by (run_id, period), daily rows by (run_id, day): bound by the key to use the index
+    key, date = ("day", "day") if resolution == "day" else ("period", "last_day")
+    sql = f'SELECT {", ".join((date,) + tuple(fields))} FROM {TABLES[resolution]} WHERE run_id = ?'
+    params = [run_id]
+    for bound, operator in ((start, ">="), (end, "<=")):
+        if bound is not None:
+            sql += f' AND {key} {operator} ?'
+            params.append(bound.toordinal() if key == "day" else _period(resolution, bound.toordinal()))
+    sql += f' ORDER BY {key}'
+    rows = _connection().execute(sql, params).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+    result = {"date": [datetime.fromordinal(day) for day in columns[0]]}
+    result.update((field, list(column)) for field, column in zip(fields, columns[1:]))
+    return result
@@ -0,0 +1,582 @@
+"""The Universe: world, population and the simulation loops."""
+import random
+from datetime import datetime, timedelta
+
+from . import paths
+from .metrics import NO_METRICS
+from .npc import DAY_DRAWS, GROWTH_CHANCE, TECH_DISCOVERY_CHANCE
+from .population import Population
+from .reporting import Pacing, StatusReporter
+from .rng import RandomStreams
+from .scheduler import EventScheduler
+from .storage import NullStorage, default_storage, log_writer
+from .timeseries import METRICS, PopulationTimeline, RunRecorder, begin_run, query, resolution_for
+from .world import DEFAULT_TECHNOLOGIES, Technology, build_earth, countries_of, load_planet
+
+class Universe:
+    """A world, its NPCs and the simulation loops.
+
+    Every random draw of a run comes from `random`, a `RandomStreams` of
+    `seed` (64 bits from the `random` module by default), keyed by day
+    number since `start_date`. Each NPC's daily life draws from its own
+    stream, so a run does not depend on the order NPCs are stepped in.
+    """
+    def __init__(self, storage=None, seed=None):
+        self.storage = storage or default_storage
+        self.random = RandomStreams(seed)
+        self.planets = []
+        self.countries = {}  # Name -> Country of the planets' countries, for travel (see `world.countries_of`)
+        self.npcs = []
+        self.current_time = datetime.now() - timedelta(days=random.randint(0, 3650))  # Start up to 10 years in the past
+        self.start_date = self.current_time
+        self.population = 0
+        self.technologies = []
+        self.population_over_time = PopulationTimeline()  # Track population changes over time
+        self.recorder = None  # RunRecorder of this run, registered on the first logged day
+        self.births_today = 0
+        self.deaths_today = 0
+        self.economic_events = []
+        self._arrivals = []  # Growth streams of the NPCs due to arrive at the end of the day
+        self._economy = None  # Set while the NPC objects are not the source of truth (vector or sharded runs)
+        self.scheduler = None  # EventScheduler of the last events="scheduled" run, which the next one continues
+
+    @property
+    def npcs(self):
+        """The living NPCs as a `Population`; assigning any iterable of NPCs replaces it."""
+        return self._npcs
+
+    @npcs.setter
+    def npcs(self, npcs):
+        previous = getattr(self, "_npcs", None)
+        self._npcs = npcs if isinstance(npcs, Population) else Population(npcs)
+        if previous is not None and self._npcs._social is None:
+            self._npcs._social = previous._social  # The social graph outlives swaps of the NPC list
+        self._npcs.countries = self.countries
+
+    @property
+    def economy(self):
+        """`EconomyAggregates` of the current population."""
+        return self._economy or self.npcs.economy
+
+    @property
+    def day(self):
+        """Days simulated since `start_date`; the day the random streams are keyed by."""
+        return (self.current_time - self.start_date).days
+
+    @property
+    def total_money(self):
+        return self.economy.total("money")
+
+    def add_planet(self, planet):
+        """Add `planet`; its NPCs travel among its countries."""
+        self.planets.append(planet)
+        self.countries.update(countries_of([planet]))
+
+    def add_npc(self, npc):
+        self.npcs.add(npc)
+        self.population += 1
+
+    def add_npcs(self, npcs):
+        self.npcs.extend(npcs)
+        self.population += len(npcs)
+
+    def remove_npc(self, npc):
+        self.npcs.remove(npc)
+        self.population -= 1
+
+    def remove_npcs(self, npcs):
+        for npc in npcs:
+            self.npcs.remove(npc)
+        self.population -= len(npcs)
+
+    def add_technology(self, tech):
+        self.technologies.append(tech)
+
+    def check_technology_discovery(self):
+        rng = self.random.dice("discovery", 0, self.day)
+        for tech in self.technologies:
+            if tech.discovery_date is None and rng.random() < TECH_DISCOVERY_CHANCE:
+                tech.discover(self.current_time.strftime('%Y-%m-%d'))
+
+    def populate(self, count):
+        """Add `count` starting NPCs, sampled and registered in bulk (see `VeraMatrix.bootstrap`).
+
+        NPC i (from 1) draws from entity i of the "create" streams, so the
+        same seed gives the same NPCs whatever else the universe holds.
+        """
+        from .bootstrap import create_npcs  # Imported lazily: it needs numpy
+        npcs = create_npcs(self.random, self.planets, self.storage, count)
+        self.add_npcs(npcs)
+        return npcs
+
+    def simulate_population_growth(self):
+        """On 1% of days, queue a newborn or immigrant; `add_arrivals` adds the day's queue."""
+        rng = self.random.dice("growth", 0, self.day)
+        if rng.random() < GROWTH_CHANCE:  # 1% daily chance of new NPC being born or immigrating
+            self._arrivals.append(rng)
+
+    def add_arrivals(self):
+        """Add the NPCs queued since the last call in one batch; returns them."""
+        if not self._arrivals:
+            return []
+        rngs, self._arrivals = self._arrivals, []
+        return self.spawn_npcs(rngs)
+
+    def spawn_npc(self, rng=None):
+        """Add a newborn or immigrant NPC drawn from `rng` (by default the day's "growth" stream)."""
+        return self.spawn_npcs([rng or self.random.dice("growth", 0, self.day)])[0]
+
+    def spawn_npcs(self, rngs):
+        """Add a newborn or immigrant NPC per `Dice` of `rngs`, sampled and registered together.
+
+        Newborns (age 0) are linked to a parent picked at random among the
+        NPCs already there.
+        """
+        from .bootstrap import BIRTH_AGES, build_npcs, draws_of
+        npcs = build_npcs(draws_of(rngs), self.planets, self.storage.new_ids(len(rngs)), self.storage, BIRTH_AGES)
+        parents = [self.npcs.partner(npc, rng) if npc.age == 0 else None for npc, rng in zip(npcs, rngs)]
+        self.storage.register_many(npcs)
+        self.add_npcs(npcs)
+        for npc, parent in zip(npcs, parents):
+            if parent is not None:
+                npc.add_relation(parent, "Family")
+        self.births_today += len(npcs)
+        return npcs
+
+    @property
+    def run_id(self):
+        """Id of this run in the time-series database, or None before its first logged day."""
+        return self.recorder.run_id if self.recorder is not None else None
+
+    def _run_recorder(self):
+        if self.recorder is None:
+            self.recorder = RunRecorder(begin_run(self.start_date))
+        return self.recorder
+
+    def log_birth_rate(self):
+        year = self.current_time.year
+        log_writer.write(paths.birth_rate_db(),
+                         'INSERT INTO BirthRate (year, population, births, date, run_id) VALUES (?, ?, ?, ?, ?)',
+                         (year, self.population, self.births_today, self.current_time.date().isoformat(),
+                          self._run_recorder().run_id))
+
+    def log_death_rate(self):
+        year = self.current_time.year
+        log_writer.write(paths.death_rate_db(),
+                         'INSERT INTO DeathRate (year, population, deaths, date, run_id) VALUES (?, ?, ?, ?, ?)',
+                         (year, self.population, self.deaths_today, self.current_time.date().isoformat(),
+                          self._run_recorder().run_id))
+
+    def log_economy_data(self, days=1):
+        """Log the day's economy row, and the period's figures to the time-series store.
+
+        `days` is the number of days the figures cover, more than one when
+        fast-forwarding.
+        """
+        year = self.current_time.year
+        economy = self.economy
+        economic_events = "; ".join(self.economic_events)
+        total, mean, median, gini = economy.total("money"), economy.mean("money"), economy.median(), economy.gini()
+        recorder = self._run_recorder()
+        log_writer.write(paths.economy_data_db(),
+                         'INSERT INTO EconomyData (year, total_money, average_money, economic_events, median_money, gini, date, run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (year, total, mean, economic_events, median, gini, self.current_time.date().isoformat(),
+                          recorder.run_id))
+        recorder.record(self.current_time, days, self.population, self.births_today, self.deaths_today,
+                        total, mean, median, gini)
+        self.economic_events = []  # Reset the economic events list for the next day
+
+    def history(self, resolution=None, fields=METRICS, start=None, end=None):
+        """This run's logged figures at `resolution` ("day", "month" or "year"; None picks one for plotting).
+
+        See `VeraMatrix.timeseries.query`; empty before the first logged day.
+        """
+        if self.run_id is None:
+            return {"date": [], **{field: [] for field in fields}}
+        return query(self.run_id, resolution or resolution_for(self.run_id), fields, start, end)
+
+    def query(self, where=None, order_by=None, descending=False, limit=None):
+        """NPCs matching `where`, ordered by `order_by`, at most `limit` of them (see `VeraMatrix.query`).
+
+        During a vector run the NPC objects only catch up when a report,
+        checkpoint or query report is due, so query from a `QueryReport`.
+        """
+        return self.npcs.select(where, order_by, descending, limit)
+
+    def count(self, where=None):
+        """Number of NPCs matching `where` (see `VeraMatrix.query`)."""
+        return self.npcs.count(where)
+
+    def group_by(self, by, field=None, where=None):
+        """Count, and sum and mean of `field`, of the NPCs matching `where` per value of `by`."""
+        return self.npcs.group_by(by, field, where)
+
+    def run_simulation(self, days_to_simulate, engine="object", events="daily", pacing=None, reporter=None,
+                       checkpoints=None, dashboard=None, metrics=None, queries=None):
+        """Simulate `days_to_simulate` days.
+
+        `engine` selects how NPCs are stepped: "object" calls `NPC.live_day` on
+        each NPC, "vector" advances the whole population with a
+        `VectorizedPopulation` (requires numpy). With the object engine,
+        `events="scheduled"` drives death, self-awareness and random events
+        from an `EventScheduler` instead of daily dice rolls. Its queue stays
+        in `scheduler`, where the next scheduled run and checkpoints pick it
+        up.
+
+        `pacing` and `reporter` default to the interactive behaviour: a 0.1s
+        sleep and a full status dump every day (see `run_headless`). An optional
+        `checkpoints` (a `VeraMatrix.checkpoint.CheckpointManager`) and an
+        optional live `dashboard` (a `VeraMatrix.dashboard.Dashboard`) are
+        offered every simulated day. An optional `metrics` (a
+        `VeraMatrix.metrics.Metrics`) times each phase of the days and counts
+        what they did. An optional `queries` (a `VeraMatrix.query.QueryReport`)
+        answers its queries on the population whenever it is due.
+        """
+        pacing = pacing or Pacing(sleep=0.1)
+        metrics = metrics or NO_METRICS
+        reporter = reporter or StatusReporter()
+        if engine not in ("object", "vector"):
+            raise ValueError(f"Unknown engine: {engine}")
+        if events not in ("daily", "scheduled"):
+            raise ValueError(f"Unknown event mode: {events}")
+        if engine == "vector" and events == "scheduled":
+            raise ValueError("The vector engine rolls its own events; use events='daily'")
+        metrics.start(self)
+        try:
+            self._run_days(days_to_simulate, engine, events, pacing, reporter, checkpoints, dashboard, metrics,
+                           queries)
+        finally:
+            log_writer.flush()  # Never lose buffered rows, even if the run is interrupted
+            if dashboard is not None:
+                dashboard.close()
+            if queries is not None:
+                queries.close()
+            metrics.finish(self)
+
+    def run_headless(self, days_to_simulate, report_every_days=30, report_every_seconds=None,
+                     verbosity="summary", sink=None, pacing=None, **options):
+        """Run without artificial sleeps and with throttled status reports.
+
+        The last simulated day is always reported. Remaining keyword arguments
+        go to `run_simulation`.
+        """
+        reporter = StatusReporter(report_every_days, report_every_seconds, verbosity, sink)
+        try:
+            self.run_simulation(days_to_simulate, pacing=pacing or Pacing(), reporter=reporter, **options)
+            if reporter.pending():
+                reporter.report(self)
+        finally:
+            reporter.close()
+
+    def run_sharded(self, days_to_simulate, workers=None, report_every_days=30, report_every_seconds=None,
+                    verbosity="summary", sink=None, pacing=None):
+        """Run headlessly with the population split across worker processes by home state.
+
+        See `VeraMatrix.sharding.ShardedSimulation`; `workers` defaults to the
+        number of CPUs.
+        """
+        from .sharding import ShardedSimulation
+        reporter = StatusReporter(report_every_days, report_every_seconds, verbosity, sink)
+        try:
+            ShardedSimulation(self, workers).run(days_to_simulate, pacing or Pacing(), reporter)
+            if reporter.pending():
+                reporter.report(self)
+        finally:
+            reporter.close()
+
+    def _daily_dice(self, npcs):
+        """Each NPC's "npc" stream of the day, preloaded with the draws a day usually takes."""
+        return self.random.dice_many("npc", [npc.id for npc in npcs], self.day, DAY_DRAWS)
+
+    def _step_scheduled_day(self, scheduler, today):
+        due = scheduler.pop_due(today)
+        for kind, npc in due:
+            if kind == EventScheduler.AWARENESS:
+                npc.become_self_aware()
+        npcs = list(self.npcs)
+        for npc, rng in zip(npcs, self._daily_dice(npcs)):
+            npc.live_day(roll_events=False, rng=rng)
+        died = []
+        for kind, npc in due:
+            if kind == EventScheduler.DEATH:
+                npc.die()
+                died.append(npc)
+            elif kind == EventScheduler.EVENT:
+                npc.random_event(self.random.dice("event", npc.id, self.day))
+                if npc.alive:
+                    scheduler.reschedule(npc, kind, today)
+        return died
+
+    def _run_days(self, days_to_simulate, engine, events, pacing, reporter, checkpoints=None, dashboard=None,
+                  metrics=NO_METRICS, queries=None):
+        population = None
+        scheduler = None
+        if engine == "vector":
+            from .vectorized import VectorizedPopulation  # Imported lazily: it needs numpy
+            population = VectorizedPopulation(self.npcs, log_records=not isinstance(self.storage, NullStorage),
+                                              streams=self.random, social=self.npcs.social, countries=self.countries)
+        elif events == "scheduled":
+            scheduler = self.scheduler
+            if scheduler is None:
+                scheduler = self.scheduler = EventScheduler(self.random, self.start_date.toordinal())
+                for npc in self.npcs:
+                    scheduler.add(npc, self.current_time.toordinal())
+        if scheduler is None:
+            self.scheduler = None  # Days stepped without it leave its queue behind
+        end_time = self.current_time + timedelta(days=days_to_simulate)
+        pacing.start()
+        reporter.start(self)
+        while self.current_time < end_time:
+            self.current_time += timedelta(days=1)
+            self.births_today = 0
+            self.deaths_today = 0
+            stepped = self.population
+            metrics.phase("step")
+            if scheduler is not None:
+                died = self._step_scheduled_day(scheduler, self.current_time.toordinal())
+                self.remove_npcs(died)
+                self.deaths_today += len(died)
+                metrics.phase("social")
+                self.npcs.influence(self.random, self.day)
+            elif population is None:
+                npcs = list(self.npcs)
+                died = []
+                for npc, rng in zip(npcs, self._daily_dice(npcs)):
+                    npc.live_day(rng=rng)
+                    if not npc.alive:
+                        died.append(npc)  # Removed after the day, so everyone stepped today can still be met
+                self.remove_npcs(died)
+                self.deaths_today += len(died)
+                metrics.phase("social")
+                self.npcs.influence(self.random, self.day)
+            else:
+                died = population.step_day(self.day)
+                self.remove_npcs(died)
+                self.deaths_today += len(died)
+            metrics.phase("growth")
+            self.simulate_population_growth()
+            born = self.add_arrivals()
+            if population is not None:
+                population.extend(born)
+            elif scheduler is not None:
+                for npc in born:
+                    scheduler.add(npc, self.current_time.toordinal())
+            metrics.phase("economy")
+            if population is not None:
+                self._economy = population.economy()  # The columns are ahead of the NPC objects
+            metrics.phase("technology")
+            self.check_technology_discovery()
+            metrics.phase("global_logs")
+            self.population_over_time.append((self.current_time, self.population))  # Record population data
+            self.log_birth_rate()  # Log the birth rate for the day
+            self.log_death_rate()  # Log the death rate for the day
+            self.log_economy_data()  # Log the economy data for the day
+            metrics.phase("flush")
+            log_writer.end_day()
+            metrics.phase("report")
+            reporter.record_day(self)
+            if reporter.due():
+                if population is not None and reporter.verbosity == "full":
+                    population.sync_to_npcs(self.npcs)
+                reporter.report(self)
+            if checkpoints is not None:
+                metrics.phase("checkpoint")
+                checkpoints.record_day(self)
+                if checkpoints.due():
+                    checkpoints.checkpoint(self, population)
+            if dashboard is not None:
+                metrics.phase("dashboard")
+                dashboard.record_day(self)
+                if dashboard.due():
+                    dashboard.update()
+            if queries is not None:
+                metrics.phase("queries")
+                queries.record_day(self)
+                if queries.due():
+                    if population is not None:
+                        population.sync_to_npcs(self.npcs)
+                    queries.report(self)
+            metrics.phase("pacing")
+            pacing.wait()  # Optionally pace the run against real time
+            metrics.end_day(self, stepped)
+        if population is not None:
+            population.sync_to_npcs(self.npcs)  # Also brings the population's aggregates and indexes up to date
+            self._economy = None
+
+    def fast_forward(self, days, resolution=None, reporter=None, checkpoints=None, dashboard=None):
+        """Advance `days` days by jumping every NPC across its event-free intervals.
+
+        Rare events come from an `EventScheduler` and still happen on their exact
+        days; between them `NPC.drift` applies the accumulated daily changes in
+        one step. Per-NPC Finances/Status rows are not written and social
+        influence is not applied while jumping.
+        `resolution` ("day", "month" or "year") writes BirthRate/DeathRate/
+        EconomyData summary rows and population points once per period; None
+        skips them. An optional `reporter` and `dashboard` are offered each
+        period summary, and optional `checkpoints` each period end, when every
+        NPC has caught up.
+        """
+        if resolution not in (None, "day", "month", "year"):
+            raise ValueError(f"Unknown resolution: {resolution}")
+        if checkpoints is not None and resolution is None:
+            raise ValueError("Checkpoints while fast-forwarding need a resolution")
+        if dashboard is not None and resolution is None:
+            raise ValueError("A dashboard while fast-forwarding needs a resolution")
+        self.scheduler = None  # Jumping draws its own schedule, which the day-by-day loop does not continue
+        try:
+            self._fast_forward(days, resolution, reporter, checkpoints, dashboard)
+        finally:
+            log_writer.flush()
+            if dashboard is not None:
+                dashboard.close()
+
+    def _period_end(self, day, resolution):
+        if resolution == "day":
+            return day
+        date = datetime.fromordinal(day)
+        if resolution == "month":
+            following = date.replace(day=28) + timedelta(days=4)
+            return (following - timedelta(days=following.day)).toordinal()
+        return date.replace(month=12, day=31).toordinal()
+
+    def _fast_forward(self, days, resolution, reporter, checkpoints=None, dashboard=None):
+        start_time = self.current_time
+        start = today = start_time.toordinal()
+        end = start + days
+        origin = self.start_date.toordinal()
+        scheduler = EventScheduler(self.random, origin)
+        last_day = {}
+        for npc in self.npcs:
+            scheduler.add(npc, today)
+            last_day[npc] = today
+        scheduler.reschedule(None, EventScheduler.GROWTH, today)
+        for tech in self.technologies:
+            if tech.discovery_date is None:
+                scheduler.reschedule(tech, EventScheduler.DISCOVERY, today)
+        died_on = {}
+        if reporter is not None:
+            reporter.start(self)
+        self.births_today = 0
+        self.deaths_today = 0
+        while today < end:
+            previous = today
+            until = min(self._period_end(today + 1, resolution), end) if resolution else end
+            entry = scheduler.pop_next(until)
+            while entry is not None:
+                day, kind, subject = entry
+                self.current_time = start_time + timedelta(days=day - start)
+                if kind == EventScheduler.GROWTH:
+                    npc = self.spawn_npc()
+                    scheduler.add(npc, day)
+                    last_day[npc] = day
+                    scheduler.reschedule(None, kind, day)
+                elif kind == EventScheduler.DISCOVERY:
+                    subject.discover(self.current_time.strftime('%Y-%m-%d'))
+                elif subject.alive or died_on.get(subject) == day:  # Events still land on the day an NPC dies
+                    subject.drift(day - last_day[subject], self.random.dice("drift", subject.id, day - origin))
+                    last_day[subject] = day
+                    if kind == EventScheduler.AWARENESS:
+                        subject.become_self_aware()
+                    elif kind == EventScheduler.DEATH:
+                        subject.die()
+                        died_on[subject] = day
+                        self.remove_npc(subject)
+                        self.deaths_today += 1
+                    else:
+                        subject.random_event(self.random.dice("event", subject.id, day - origin))
+                        if subject.alive:
+                            scheduler.reschedule(subject, kind, day)
+                entry = scheduler.pop_next(until)
+            today = until
+            self.current_time = start_time + timedelta(days=today - start)
+            if resolution:
+                for npc in self.npcs:
+                    npc.drift(today - last_day[npc], self.random.dice("drift", npc.id, today - origin))
+                    last_day[npc] = today
+                self.population_over_time.append((self.current_time, self.population))
+                self.log_birth_rate()
+                self.log_death_rate()
+                self.log_economy_data(today - previous)
+                if reporter is not None:
+                    reporter.record_day(self, today - previous)
+                    if reporter.due():
+                        reporter.report(self)
+                if checkpoints is not None:
+                    checkpoints.record_day(self, today - previous)
+                    if checkpoints.due():
+                        checkpoints.checkpoint(self)
+                if dashboard is not None:
+                    dashboard.record_day(self, today - previous)
+                    if dashboard.due():
+                        dashboard.update()
+                self.births_today = 0
+                self.deaths_today = 0
+        for npc in self.npcs:
+            npc.drift(end - last_day[npc], self.random.dice("drift", npc.id, end - origin))
+
+    def checkpoint(self, path):
+        """Write a full binary snapshot of the universe to `path` (see `VeraMatrix.checkpoint`)."""
+        from .checkpoint import save_checkpoint  # Imported lazily: it needs numpy
+        return save_checkpoint(self, path)
+
+    def print_status(self):
+        print(self.format_status())
+
+    def format_status(self, verbosity="full"):
+        """Build the status report; "summary" leaves out the world tree and the NPC list."""
+        lines = [
+            f"\nSimulation Date: {self.current_time.strftime('%Y-%m-%d')} (Start Date: {self.start_date.strftime('%Y-%m-%d')})",
+            f"Total Population: {self.population}",
+            f"Total Money in Economy: {self.total_money:.2f}",
+            f"Economic Events: {', '.join(self.economic_events)}",
+        ]
+        if verbosity == "full":
+            for planet in self.planets:
+                lines.append(f"Planet: {planet.name}")
+                for country in planet.countries:
+                    lines.append(f"  Country: {country.name}")
+                    for state in country.states:
+                        lines.append(f"    State: {state.name}")
+            lines.extend(str(npc) for npc in self.npcs)
+            lines.append("Technological Advancements:")
+            for tech in self.technologies:
+                status = f"Discovered on {tech.discovery_date}" if tech.discovery_date else "Not yet discovered"
+                lines.append(f"  {tech.name}: {status}")
+        else:
+            discovered = sum(1 for tech in self.technologies if tech.discovery_date)
+            lines.append(f"Technologies Discovered: {discovered}/{len(self.technologies)}")
+        return "\n".join(lines)
+
+    def plot_population(self, path=None, resolution=None):
+        from .plots import plot_population
+        plot_population(self, path, resolution)
+
+    def plot_death_rate(self, path=None, resolution=None):
+        from .plots import plot_death_rate
+        plot_death_rate(self, path, resolution)
+
+    def plot_economy(self, path=None, resolution=None):
+        from .plots import plot_economy
+        plot_economy(self, path, resolution)
+
+    def plot_wealth(self, path=None):
+        from .plots import plot_wealth
+        plot_wealth(self, path)
+
+def create_universe(population=None, storage=None, seed=None, geography=None):
+    """Build a planet with `population` NPCs (10-100 at random if None) and the default technologies.
+
+    The planet is read from the `geography` file (see `VeraMatrix.world`),
+    by default the bundled Earth. The universe's streams use `seed`; the
+    starting NPCs are drawn from them too.
+    """
+    universe = Universe(storage, seed)
+    universe.add_planet(load_planet(geography) if geography else build_earth())
+
+    # Randomly generate a number of NPCs, each from a stream of its own
+    num_npcs = population if population is not None else universe.random.dice("create", 0, 0).randint(10, 100)
+    universe.populate(num_npcs)
+
+    for tech_name in DEFAULT_TECHNOLOGIES:
+        universe.add_technology(Technology(tech_name))
+    return universe
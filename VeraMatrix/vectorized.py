@@ -0,0 +1,317 @@
+"""NumPy structure-of-arrays engine that steps a whole population per call."""
+from collections import deque
+from datetime import datetime
+from itertools import repeat
+from operator import attrgetter
+
+import numpy as np
+
+from . import metrics
+from .economy import EconomyAggregates
+from .npc import (DAILY_EVENT_CHANCE, DAILY_EVENTS, DEATH_CHANCE, LOCATION_CODES, MOOD_CODES, RELATIONS,
+                  SELF_AWARE_THOUGHT, SELF_AWARENESS_CHANCE, SKILL_NAMES, THOUGHT_CODES, THOUGHTS)
+from .rng import RandomStreams
+from .social import KIND_CODES, influence_columns
+
+class VectorizedPopulation:
+    """Structure-of-arrays copy of a population that advances every NPC at once with NumPy.
+
+    Each simulated day uses a handful of batched random draws and masked array
+    updates. The probabilities, event effects and logged rows match
+    `NPC.live_day`. NPC objects are only touched for logging and
+    `sync_to_npcs`. With a `social` graph, "Met someone" links living NPCs
+    in it and every day ends with its influence on stress and mood.
+    Travellers leave from the `world.Country` of their country's name in
+    `countries` (see `world.countries_of`) and stay home without one.
+
+    Draws come from the "npc" stream of each row's id in `streams` (a
+    `RandomStreams`, by default one of `seed`). Every draw has a fixed slot
+    in the day, so a row's draws do not depend on the other rows.
+    """
+    FLOAT_COLUMNS = ("age", "money", "health", "stress_level", "intelligence", "work", "social", "survival")
+    # Column -> the NPC slot it is read from and written back to
+    SLOTS = {"age": "_age", "money": "_money", "health": "_health", "stress_level": "_stress_level",
+             "intelligence": "intelligence", "work": "work_skill", "social": "social_skill",
+             "survival": "survival_skill", "alive": "_alive", "self_aware": "_self_awareness", "mood": "_mood"}
+
+    def __init__(self, npcs=(), log_records=True, seed=None, social=None, streams=None, countries=None):
+        if np is None:
+            raise ImportError("The vectorized engine requires numpy")
+        self.streams = streams or RandomStreams(seed)
+        self.log_records = log_records
+        self.graph = social
+        self.origins = countries or {}  # Country name -> world.Country travellers leave from
+        self.npcs = []
+        self.size = 0
+        self.countries = []
+        self.states = []
+        self._country_codes = {}
+        self._state_codes = {}
+        self.thought_table = ["", *THOUGHTS, SELF_AWARE_THOUGHT]
+        self._thought_codes = {thought: code for code, thought in enumerate(self.thought_table)}
+        self._state_codes_of = {}  # Country name -> codes of its states, in the country's order
+        self.columns = {}
+        self._allocate(max(len(npcs), 1024))
+        self.extend(npcs)
+
+    def _code(self, table, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def _allocate(self, capacity):
+        dtypes = {name: np.float64 for name in self.FLOAT_COLUMNS}
+        dtypes.update(alive=np.bool_, self_aware=np.bool_, country=np.int32, state=np.int32, thought=np.int16,
+                      mood=np.int32, id=np.int64)
+        for name, dtype in dtypes.items():
+            column = np.zeros(capacity, dtype=dtype)
+            if name in self.columns:
+                column[:self.size] = self.columns[name][:self.size]
+            self.columns[name] = column
+            setattr(self, name, column)
+
+    def _recode(self, codes, table, lookup):
+        """Shared `table` codes of `codes`, re-coded through `lookup` (value -> code of this population)."""
+        values, inverse = np.unique(codes, return_inverse=True)
+        return np.array([lookup(table[value]) for value in values.tolist()], dtype=np.int64)[inverse]
+
+    def extend(self, npcs):
+        npcs = list(npcs)
+        count = len(npcs)
+        if self.size + count > len(self.age):
+            self._allocate(max(2 * len(self.age), self.size + count))
+        if not count:
+            return
+        rows = slice(self.size, self.size + count)
+        for name, slot in (*self.SLOTS.items(), ("id", "id")):
+            column = self.columns[name]
+            column[rows] = np.fromiter(map(attrgetter(slot), npcs), dtype=column.dtype, count=count)
+        codes = {slot: np.fromiter(map(attrgetter(slot), npcs), dtype=np.int64, count=count)
+                 for slot in ("_country", "_state", "_thoughts")}
+        self.country[rows] = self._recode(codes["_country"], LOCATION_CODES,
+                                          lambda name: self._code(self.countries, self._country_codes, name))
+        self.state[rows] = self._recode(codes["_state"], LOCATION_CODES,
+                                        lambda name: self._code(self.states, self._state_codes, name))
+        self.thought[rows] = self._recode(codes["_thoughts"], THOUGHT_CODES,
+                                          lambda thought: self._thought_codes.get(thought, 0))
+        self.npcs.extend(npcs)
+        self.size += count
+
+    def _sync_rows(self, rows):
+        for i in rows:
+            npc = self.npcs[i]
+            npc.age = float(self.age[i])
+            npc.money = float(self.money[i])
+            npc.health = float(self.health[i])
+            npc.stress_level = float(self.stress_level[i])
+            npc.intelligence = float(self.intelligence[i])
+            npc.work_skill = float(self.work[i])
+            npc.social_skill = float(self.social[i])
+            npc.survival_skill = float(self.survival[i])
+            npc.alive = bool(self.alive[i])
+            npc.self_awareness = bool(self.self_aware[i])
+            npc.country = self.countries[self.country[i]]
+            npc.state = self.states[self.state[i]]
+            npc.thoughts = self.thought_table[self.thought[i]]
+            npc._mood = int(self.mood[i])
+
+    def sync_to_npcs(self, population=None):
+        """Copy the column values back onto the NPC objects.
+
+        The values are written straight into the NPCs' slots, bypassing the
+        setters, so the population the NPCs belong to is not told about them;
+        pass it as `population` to have it take its economy from the columns
+        and rebuild its indexes (see `Population.refresh`).
+        """
+        rows = slice(0, self.size)
+        columns = [self.columns[name][rows].tolist() for name in self.SLOTS]
+        columns.extend(codes.tolist() for codes in self.shared_codes(rows))
+        for slot, values in zip((*self.SLOTS.values(), "_country", "_state", "_thoughts"), columns):
+            deque(map(setattr, self.npcs, repeat(slot), values), maxlen=0)
+        if population is not None:
+            population.refresh(self.economy())
+
+    def shared_codes(self, rows):
+        """Country, state and thought codes of `rows` in the shared code tables of `npc`."""
+        found = []
+        for table, names, codes in ((LOCATION_CODES, self.countries, self.country),
+                                    (LOCATION_CODES, self.states, self.state),
+                                    (THOUGHT_CODES, self.thought_table, self.thought)):
+            shared = np.array([table.code(name) for name in names] or [0], dtype=np.int64)
+            found.append(shared[codes[rows]])
+        return found
+
+    def economy(self):
+        """`EconomyAggregates` of the living rows, computed straight from the columns."""
+        live = np.flatnonzero(self.alive[:self.size])
+        return EconomyAggregates.from_columns(self.money[live], self.health[live], self.stress_level[live],
+                                              self.country[live], self.state[live], self.countries, self.states)
+
+    def compact(self):
+        """Drop rows of dead NPCs."""
+        keep = np.flatnonzero(self.alive[:self.size])
+        for column in self.columns.values():
+            column[:len(keep)] = column[keep]
+        self.npcs = [self.npcs[i] for i in keep]
+        self.size = len(keep)
+
+    def _travel(self, rows, first, second):
+        """Move `rows` as `Country.travel` would with the draws `first` and `second`.
+
+        Returns a mask of the rows that moved; rows whose country is not in
+        `origins` stay where they are.
+        """
+        origins = self.country[rows]
+        moved = np.zeros(len(rows), dtype=np.bool_)
+        for code in np.unique(origins).tolist():
+            origin = self.origins.get(self.countries[code])
+            if origin is None:
+                continue
+            travellers = np.flatnonzero(origins == code)
+            moved[travellers] = True
+            candidates, picked = origin.planet.destinations(origin.name, first[travellers])
+            for index in np.unique(picked).tolist():
+                destination = candidates[index]
+                group = travellers[picked == index]
+                chosen = rows[group]
+                state_codes = self._state_codes_of.get(destination.name)
+                if state_codes is None:
+                    state_codes = self._state_codes_of[destination.name] = np.array(
+                        [self._code(self.states, self._state_codes, state.name) for state in destination.states])
+                self.country[chosen] = self._code(self.countries, self._country_codes, destination.name)
+                self.state[chosen] = state_codes[destination.state_table.index_array(second[group])]
+        if self.log_records:
+            for i in rows[moved].tolist():
+                npc = self.npcs[i]
+                npc.storage.relocate(npc, self.countries[self.country[i]], self.states[self.state[i]])
+        return moved
+
+    def _influence(self, n, day):
+        """Apply a day of the social graph's influence to the stress and mood columns."""
+        self.stress_level[:n], self.mood[:n] = influence_columns(self.graph, self.id[:n], self.stress_level[:n],
+                                                                 self.mood[:n], self.streams, day)
+
+    def step_day(self, day):
+        """Advance every living NPC by one day (`day` keys the random streams) and return the NPCs that died."""
+        n = self.size
+        npcs = self.npcs
+        live = np.flatnonzero(self.alive[:n])
+        m = len(live)
+        date = datetime.now().strftime('%Y-%m-%d')
+        # Slots: money, stress, self-awareness, thought, death, event; events take three more
+        draws = self.streams.block("npc", self.id[live], day, 6)
+
+        self.age[live] += 1 / 365
+        self.money[live] += -10 + 20 * draws[:, 0]
+        self.stress_level[live] = np.clip(self.stress_level[live] + (-5 + 10 * draws[:, 1]), 0, 100)
+        self.health[live] -= 0.01
+
+        awakened = live[~self.self_aware[live] & (draws[:, 2] < SELF_AWARENESS_CHANCE)]
+        self.self_aware[awakened] = True
+        if metrics.active is not None and len(awakened):
+            metrics.fired("Became self-aware", len(awakened))
+        aware_code = len(self.thought_table) - 1
+        thoughts = 1 + (draws[:, 3] * len(THOUGHTS)).astype(np.int16)
+        self.thought[live] = np.where(self.self_aware[live], aware_code, thoughts)
+
+        if self.log_records:
+            for i in awakened:
+                npcs[i].log_event("Became self-aware", "Realized they are in a simulation", "Neutral")
+            columns = [self.columns[name].tolist() for name in ("money", "health", "intelligence", "work", "social", "survival", "stress_level", "age")]
+            money, health, intelligence, work, social, survival, stress_level, age = columns
+            thought, country, state, self_aware, mood = (self.thought.tolist(), self.country.tolist(),
+                                                         self.state.tolist(), self.self_aware.tolist(),
+                                                         self.mood.tolist())
+            for i in live.tolist():
+                npc = npcs[i]
+                current_hour = age[i] % 1 * 24
+                npc.storage.log_finances(npc, date, money[i])
+                npc.storage.log_status(npc, date, (
+                    health[i], intelligence[i], work[i], social[i], survival[i], stress_level[i],
+                    self.thought_table[thought[i]], f"{self.states[state[i]]}, {self.countries[country[i]]}",
+                    f"{int(current_hour)}:{int((current_hour % 1) * 60):02d}", int(self_aware[i]), MOOD_CODES[mood[i]]))
+
+        died = live[draws[:, 4] < DEATH_CHANCE]
+        self.alive[died] = False
+        if metrics.active is not None and len(died):
+            metrics.fired("Died", len(died))
+        for i in died:
+            if self.log_records:
+                npcs[i].log_death()
+            print(f"{npcs[i].name} has died at the age of {self.age[i]:.2f}")
+
+        happened = draws[:, 5] < DAILY_EVENT_CHANCE
+        events = self.streams.block("npc", self.id[live[happened]], day, 3, first=6)
+        happened = live[happened]
+        kinds = (events[:, 0] * len(DAILY_EVENTS)).astype(np.int64)
+        for kind, event in enumerate(DAILY_EVENTS):
+            chosen = kinds == kind
+            rows = happened[chosen]
+            if not len(rows):
+                continue
+            first, second = events[chosen, 1], events[chosen, 2]
+            if metrics.active is not None:
+                metrics.fired(event, len(rows))
+            if event == "Found money":
+                amount = 50 + 150 * first
+                self.money[rows] += amount
+                consequences = (f"Gained {a:.2f} money" for a in amount)
+            elif event == "Lost money":
+                amount = 50 + 150 * first
+                self.money[rows] -= amount
+                consequences = (f"Lost {a:.2f} money" for a in amount)
+            elif event == "Got a job":
+                self.work[rows] += 5 * first
+                consequences = ["Started a new job"] * len(rows)
+            elif event == "Lost a job":
+                consequences = ["Lost the job"] * len(rows)
+            elif event == "Met someone":
+                # Partners are picked along the ids in ascending order, as `Population.partner` does
+                ranked = live if np.all(self.id[live[1:]] > self.id[live[:-1]]) else live[np.argsort(self.id[live])]
+                others = ranked[(first * m).astype(np.int64)]
+                relations = (second * len(RELATIONS)).astype(np.int64)
+                met = others != rows
+                if self.graph is not None:
+                    codes = np.array([KIND_CODES[relation] for relation in RELATIONS], dtype=np.uint8)
+                    self.graph.link_many(self.id[rows[met]], self.id[others[met]], codes[relations[met]])
+                consequences = []
+                for i, other, relation, linked in zip(rows, others, relations, met):
+                    if not linked:
+                        consequences.append("Met no one")
+                        continue
+                    if self.log_records:
+                        npcs[i].storage.log_family(npcs[i], npcs[other].name, RELATIONS[relation])
+                    consequences.append(f"Met {npcs[other].name}, became {RELATIONS[relation]}")
+            elif event == "Traveled":
+                moved = self._travel(rows, first, second)
+                consequences = (f"Traveled to {self.countries[self.country[i]]}" if went else "Stayed home"
+                                for i, went in zip(rows, moved))
+            elif event == "Fell ill":
+                self.health[rows] -= 5 + 10 * first
+                consequences = ["Fell ill"] * len(rows)
+            elif event == "Improved skill":
+                skills = (first * len(SKILL_NAMES)).astype(np.int64)
+                gains = 1 + 4 * second
+                for code, skill in enumerate(SKILL_NAMES):
+                    self.columns[skill][rows[skills == code]] += gains[skills == code]
+                consequences = (f"Improved {SKILL_NAMES[code]} skill" for code in skills)
+            elif event == "Got educated":
+                self.intelligence[rows] += 1 + 4 * first
+                consequences = ["Gained education"] * len(rows)
+            if self.log_records:
+                choice_quality = npcs[rows[0]].classify_choice(event)
+                for i, consequence in zip(rows, consequences):
+                    npcs[i].log_event(event, consequence, choice_quality)
+
+        if self.graph is not None and len(self.graph):
+            for i in died.tolist():
+                self.graph.remove(int(self.id[i]))  # The dead take no part in the day's influence
+            self._influence(n, day)
+
+        self._sync_rows(died)
+        died = [npcs[i] for i in died]
+        if 4 * (self.size - len(live) + len(died)) > self.size:
+            self.compact()
+        return died
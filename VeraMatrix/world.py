@@ -0,0 +1,205 @@
+"""The world hierarchy (Planet -> Country -> State), its geography files and technologies.
+
+A planet's geography is data: `load_planet` reads a JSON file such as the
+bundled earth.json::
+
+    {"name": "Earth",
+     "countries": [{"name": "USA", "states": [{"name": "California", "weight": 39.0}, ...]}, ...],
+     "migration": {"USA": {"China": 1.0, "Germany": 2.0}, ...}}
+
+State weights (1 by default) are populations in any unit. A country weighs
+the sum of its states unless it gives a "weight" of its own. New NPCs are
+placed in a country, then a state, in proportion to those weights.
+"migration" optionally gives, per origin country, the relative weights of
+the countries its travellers go to; travellers from countries without a
+row pick a destination like a new NPC would. Both draws go through alias
+tables, so a location costs O(1) whatever the size of the geography.
+
+A universe keeps the countries of its planets by name (see `countries_of`);
+that is where a travelling NPC looks up the country it leaves from, and so
+the planet its destinations come from.
+"""
+import json
+import os
+
+EARTH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "earth.json")
+
+class AliasTable:
+    """Vose's alias method: picks index i with probability weights[i] / sum(weights) in O(1).
+
+    One uniform draw picks both the column (its integer part after scaling)
+    and the side of the column (its fractional part).
+    """
+    def __init__(self, weights):
+        size = len(weights)
+        total = float(sum(weights))
+        if not size or total <= 0 or min(weights) < 0:
+            raise ValueError("An alias table needs non-negative weights with a positive sum")
+        scaled = [weight * size / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1 - scaled[low]
+            (small if scaled[high] < 1 else large).append(high)
+        self.size = size
+        self._arrays = None
+
+    def __getstate__(self):
+        return {"probability": self.probability, "alias": self.alias, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _arrays=None)
+
+    def index(self, u):
+        """The index picked by the uniform draw `u` in [0, 1)."""
+        x = u * self.size
+        i = int(x)
+        return i if x - i < self.probability[i] else self.alias[i]
+
+    def index_array(self, u):
+        """`index` of every draw in the numpy array `u`."""
+        import numpy as np  # Only the vectorized engine samples in bulk
+        if self._arrays is None:
+            self._arrays = np.array(self.probability), np.array(self.alias, dtype=np.int64)
+        probability, alias = self._arrays
+        x = u * self.size
+        i = x.astype(np.int64)
+        return np.where(x - i < probability[i], i, alias[i])
+
+class State:
+    def __init__(self, name, weight=1.0):
+        self.name = name
+        self.weight = weight
+
+class Country:
+    def __init__(self, name, weight=None):
+        self.name = name
+        self.states = []
+        self.planet = None
+        self._weight = weight
+        self._states = None  # AliasTable over `states`, built on first use
+
+    @property
+    def weight(self):
+        """The weight given in the geography, or the sum of the state weights."""
+        return self._weight if self._weight is not None else sum(state.weight for state in self.states)
+
+    def add_state(self, state):
+        self.states.append(state)
+        self._states = None
+
+    @property
+    def state_table(self):
+        """AliasTable over `states` by weight."""
+        if self._states is None:
+            self._states = AliasTable([state.weight for state in self.states])
+        return self._states
+
+    def random_state(self, rng):
+        return self.states[self.state_table.index(rng.random())]
+
+    def travel(self, rng):
+        """(country, state) names of a trip from this country, per its planet's migration weights."""
+        destination = self.planet.destination(self.name, rng.random())
+        return destination.name, destination.random_state(rng).name
+
+class Planet:
+    def __init__(self, name, migration=None):
+        self.name = name
+        self.countries = []
+        self.migration = migration or {}  # Origin country -> {destination country: weight}
+        self._tables = None
+
+    def add_country(self, country):
+        country.planet = self
+        self.countries.append(country)
+        self._tables = None
+
+    def _table(self, origin):
+        """(destination countries, AliasTable over them) for travellers from `origin`; None is a new NPC."""
+        if self._tables is None:
+            self._tables = {None: (self.countries, AliasTable([country.weight for country in self.countries]))}
+        table = self._tables.get(origin)
+        if table is None:
+            row = self.migration.get(origin)
+            if not row:
+                return self._tables[None]
+            by_name = {country.name: country for country in self.countries}
+            table = self._tables[origin] = [by_name[name] for name in row], AliasTable(list(row.values()))
+        return table
+
+    def random_location(self, rng):
+        """(country, state) names of a new NPC, picked by weight."""
+        countries, table = self._table(None)
+        country = countries[table.index(rng.random())]
+        return country.name, country.random_state(rng).name
+
+    def destination(self, origin, u):
+        """The Country picked by the uniform draw `u` for a traveller from `origin`."""
+        countries, table = self._table(origin)
+        return countries[table.index(u)]
+
+    def destinations(self, origin, u):
+        """(candidate Countries, index of the one picked by each draw of the numpy array `u`) from `origin`."""
+        countries, table = self._table(origin)
+        return countries, table.index_array(u)
+
+    def to_dict(self):
+        """The planet in the geography file format."""
+        countries = []
+        for country in self.countries:
+            data = {"name": country.name, "states": [{"name": state.name, "weight": state.weight}
+                                                     for state in country.states]}
+            if country._weight is not None:
+                data["weight"] = country._weight
+            countries.append(data)
+        return {"name": self.name, "countries": countries, "migration": self.migration}
+
+def planet_from_dict(data):
+    """Build a Planet from the geography file format; states may also be plain names (weight 1)."""
+    planet = Planet(data["name"], data.get("migration"))
+    for country_data in data["countries"]:
+        if not country_data["states"]:
+            raise ValueError(f"Country {country_data['name']} has no states")
+        country = Country(country_data["name"], country_data.get("weight"))
+        for state in country_data["states"]:
+            if isinstance(state, str):
+                country.add_state(State(state))
+            else:
+                country.add_state(State(state["name"], state.get("weight", 1.0)))
+        planet.add_country(country)
+    names = {country.name for country in planet.countries}
+    for origin, row in planet.migration.items():
+        unknown = ({origin} | set(row)) - names
+        if unknown:
+            raise ValueError(f"Migration between unknown countries: {', '.join(sorted(unknown))}")
+    return planet
+
+def load_planet(path):
+    """Read a planet from a geography file (see the module docstring)."""
+    with open(path) as f:
+        return planet_from_dict(json.load(f))
+
+def countries_of(planets):
+    """{name: Country} of the countries of `planets`, where travellers look up the country they leave."""
+    return {country.name: country for planet in planets for country in planet.countries}
+
+class Technology:
+    def __init__(self, name):
+        self.name = name
+        self.discovery_date = None
+
+    def discover(self, date):
+        self.discovery_date = date
+        print(f"Technology '{self.name}' discovered on {date}.")
+
+DEFAULT_TECHNOLOGIES = ["Fire", "Wheel", "Steam Engine", "Electricity", "Internet", "Artificial Intelligence"]
+
+def build_earth():
+    """Create Earth with its countries and states from the bundled geography."""
+    return load_planet(EARTH_FILE)
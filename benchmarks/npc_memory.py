@@ -0,0 +1,69 @@
+"""Memory per NPC: the compact __slots__ NPC versus the original dict-based layout.
+
+    python benchmarks/npc_memory.py --count 1000000
+
+Both populations are built from the same random draws and measured with
+tracemalloc. The storage is a NullStorage, so no files are created.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VeraMatrix.npc import NPC, random_location, random_name  # noqa: E402
+from VeraMatrix.storage import PLANET_DIR, NullStorage, location_dir  # noqa: E402
+from VeraMatrix.world import build_earth  # noqa: E402
+
+class DictNPC:
+    """The attribute layout NPC had before __slots__: per-instance dict, skills dict and a stored db path."""
+    def __init__(self, name, age, country, state):
+        self.name = name
+        self.age = age
+        self.alive = True
+        self.money = 1000
+        self.health = random.uniform(50, 100)
+        self.intelligence = random.uniform(80, 120)
+        self.skills = {'work': random.uniform(0, 100), 'social': random.uniform(0, 100), 'survival': random.uniform(0, 100)}
+        self.personality = "Friendly"
+        self.mood = "Neutral"
+        self.family = []
+        self.country = country
+        self.state = state
+        self.stress_level = random.uniform(0, 100)
+        self.thoughts = ""
+        self.self_awareness = False
+        base_path = os.path.join("MatrixSim", PLANET_DIR, location_dir(country), location_dir(state))
+        self.db = os.path.join(base_path, f"{name.lower().replace(' ', '_')}_db.sqlite")
+
+def measure(factory, count, seed):
+    random.seed(seed)
+    planets = [build_earth()]
+    gc.collect()
+    tracemalloc.start()
+    population = [factory(random_name(), random.randint(18, 70), *random_location(planets)[1:]) for _ in range(count)]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del population
+    gc.collect()
+    return used / count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    storage = NullStorage()
+    compact = measure(lambda name, age, country, state: NPC(name, age, country, state, storage), args.count, args.seed)
+    legacy = measure(DictNPC, args.count, args.seed)
+    print(f"NPCs measured:        {args.count:,}")
+    print(f"dict-based NPC:       {legacy:8.0f} bytes/NPC  ({legacy * args.count / 2**20:,.0f} MiB)")
+    print(f"__slots__ NPC:        {compact:8.0f} bytes/NPC  ({compact * args.count / 2**20:,.0f} MiB)")
+    print(f"reduction:            {1 - compact / legacy:8.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Scaling of sharded runs: wall time and throughput per number of worker processes.
+
+    python benchmarks/sharding.py --population 100000 --days 30 --workers 1 2 4 8
+
+Every case builds the same universe from a fixed seed in a temporary base
+directory and runs it headlessly, first in this process ("serial") and then
+across each number of workers. Per case it prints the wall time of the run,
+NPC-days per second, the speedup over the serial run, and how the
+coordinator spent the run: waiting for the workers to step their NPCs, the
+social influence pass it runs over the whole graph, and sending the
+influence changes back. Speedups are bounded by the CPUs available, which
+are printed first.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VeraMatrix import paths  # noqa: E402
+from VeraMatrix.reporting import Pacing, StatusReporter  # noqa: E402
+from VeraMatrix.sharding import ShardedSimulation  # noqa: E402
+from VeraMatrix.storage import STORAGE_MODES, make_storage  # noqa: E402
+from VeraMatrix.universe import create_universe  # noqa: E402
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout at the descriptor level, so worker processes stay quiet too."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+def run_case(population, days, seed, storage, workers):
+    """(wall seconds, NPC-days, coordinator seconds by phase) of one run; `workers` None runs in this process."""
+    with tempfile.TemporaryDirectory() as base_dir, quiet():
+        paths.set_base_dir(base_dir)
+        random.seed(seed)
+        universe = create_universe(population, make_storage(storage), seed)
+        started = time.perf_counter()
+        if workers is None:
+            universe.run_headless(days, report_every_days=0)
+            seconds = {}
+        else:
+            simulation = ShardedSimulation(universe, workers)
+            simulation.run(days, Pacing(), StatusReporter(every_days=0))
+            seconds = dict(simulation.seconds)
+        wall = time.perf_counter() - started
+    return wall, population * days, seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--population", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--storage", choices=[mode for mode in STORAGE_MODES if mode != "world"], default="none")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs, {args.population:,} NPCs, {args.days} days, storage {args.storage}")
+    print(f"{'case':<10}{'wall s':>9}{'NPC-days/s':>13}{'speedup':>9}{'workers s':>11}{'influence s':>13}"
+          f"{'exchange s':>12}")
+    serial = None
+    for workers in [None, *args.workers]:
+        wall, npc_days, seconds = run_case(args.population, args.days, args.seed, args.storage, workers)
+        serial = serial or wall
+        phases = "".join(f"{seconds[phase]:>{width}.2f}" if phase in seconds else f"{'-':>{width}}"
+                         for phase, width in (("workers", 11), ("influence", 13), ("exchange", 12)))
+        print(f"{'serial' if workers is None else f'{workers} workers':<10}{wall:>9.2f}{npc_days / wall:>13,.0f}"
+              f"{serial / wall:>9.2f}{phases}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Simulation throughput, I/O and memory, from fixed seeds, compared against a baseline.
+
+    python benchmarks/suite.py --sizes 100 1000 10000 100000 1000000 --output results.json
+    python benchmarks/suite.py --baseline benchmarks/baseline.json --threshold 0.1
+
+Each case builds a universe of a fixed size from a fixed seed with one engine
+and storage backend. It runs headless, without pacing, in a fresh process, so
+peak RSS and the log writer's state belong to that case alone. The MatrixSim
+base directory is a temporary directory. The days of a case are capped so
+that it steps about --npc-days NPC-days. Per case the suite records:
+
+- the build time and the time to the end of the first simulated day;
+- NPC-days, rows and commits per second over the remaining days (from
+  `VeraMatrix.metrics.Metrics`);
+- peak RSS growth per NPC;
+- the time to format a full status report;
+- with --plots, the time to render every plot to PNG.
+
+Every case runs --repeat times, each in its own process, and its figures
+are the medians over those runs.
+
+--output writes the results as JSON. --baseline compares them with an earlier
+output and exits with status 1 if any figure is worse by more than
+--threshold. A timing that took less than --min-seconds, in the baseline or
+now, is too short to tell a regression from noise and is not compared.
+`benchmarks/baseline.json` holds the results of the default cases.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VeraMatrix import paths  # noqa: E402
+from VeraMatrix.metrics import Metrics, peak_rss  # noqa: E402
+from VeraMatrix.reporting import StatusReporter  # noqa: E402
+from VeraMatrix.storage import STORAGE_MODES, make_storage  # noqa: E402
+from VeraMatrix.universe import create_universe  # noqa: E402
+
+FILES_MAX_NPCS = 10_000  # Larger "files" cases would create one SQLite file per NPC
+PLOTS = ("population", "death", "economy", "wealth")
+# Compared figures and whether higher is better
+COMPARED = {
+    "npc_days_per_second": True,
+    "rows_per_second": True,
+    "build_seconds": False,
+    "first_day_seconds": False,
+    "peak_rss_per_npc": False,
+    "report_seconds": False,
+    "plot_seconds": False,
+}
+# Rates and the time they were measured over; other "_seconds" figures are their own time
+RATE_SECONDS = {"npc_days_per_second": "wall_seconds", "rows_per_second": "wall_seconds"}
+
+def case_name(case):
+    return f"{case['engine']}/{case['storage']}/{case['size']}"
+
+def run_case(size, engine, storage, days, seed, plots):
+    """Build and run one universe in the current process; the figures as a dict."""
+    with contextlib.suppress(ImportError):
+        import numpy  # noqa: F401  Loaded before the RSS baseline, like the rest of the code
+    baseline_rss = peak_rss()
+    with tempfile.TemporaryDirectory() as base_dir, contextlib.redirect_stdout(io.StringIO()):
+        paths.set_base_dir(base_dir)
+        started = time.perf_counter()
+        universe = create_universe(size, make_storage(storage), seed)
+        built = time.perf_counter()
+        universe.run_headless(1, report_every_days=0, engine=engine)
+        first_day = time.perf_counter()
+        metrics = Metrics(every_days=0)
+        universe.run_headless(days - 1, report_every_days=0, engine=engine, metrics=metrics)
+        summary = metrics.summary()
+        wall = summary["wall_seconds"]
+        result = {
+            "size": size, "engine": engine, "storage": storage, "days": days, "seed": seed,
+            "build_seconds": built - started,
+            "first_day_seconds": first_day - started,
+            "npc_days_per_second": summary["npc_days_per_second"],
+            "rows_per_second": summary["counters"]["rows_written"] / wall,
+            "commits_per_second": summary["counters"]["commits"] / wall,
+            "peak_rss_per_npc": (peak_rss() - baseline_rss) / size if baseline_rss is not None else None,
+            "wall_seconds": wall,
+        }
+        report = time.perf_counter()
+        StatusReporter(verbosity="full", sink=io.StringIO()).report(universe)
+        result["report_seconds"] = time.perf_counter() - report
+        if plots:
+            from VeraMatrix import plots as plotting
+            plotting.use_backend("Agg")
+            drawn = time.perf_counter()
+            universe.plot_population(os.path.join(base_dir, "population.png"))
+            universe.plot_death_rate(os.path.join(base_dir, "death.png"))
+            universe.plot_economy(os.path.join(base_dir, "economy.png"))
+            universe.plot_wealth(os.path.join(base_dir, "wealth.png"))
+            result["plot_seconds"] = time.perf_counter() - drawn
+    return result
+
+def cases(args):
+    for size in args.sizes:
+        days = max(2, min(args.days, args.npc_days // size))
+        for engine in args.engines:
+            for storage in args.storages:
+                if storage == "files" and size > FILES_MAX_NPCS:
+                    continue
+                yield size, engine, storage, days, args.seed, args.plots
+
+def median_case(runs):
+    """One result with the median of every figure over `runs` (results of the same case)."""
+    result = dict(runs[0], repeats=len(runs))
+    for figure, value in runs[0].items():
+        if isinstance(value, float):
+            values = [run[figure] for run in runs if run.get(figure) is not None]
+            result[figure] = statistics.median(values) if values else None
+    return result
+
+def timed_seconds(case, figure):
+    """How long `figure` of `case` was measured over, or None for a figure that is not a timing."""
+    if figure in RATE_SECONDS:
+        return case.get(RATE_SECONDS[figure])
+    return case.get(figure) if figure.endswith("_seconds") else None
+
+def compare(results, baseline, threshold, min_seconds=0.0):
+    """(case, figure, baseline value, value) of every figure worse than the baseline by more than `threshold`.
+
+    Timings shorter than `min_seconds` in either run are skipped.
+    """
+    before = {case_name(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = before.get(case_name(case))
+        if old is None:
+            continue
+        for figure, higher_is_better in COMPARED.items():
+            value, reference = case.get(figure), old.get(figure)
+            if not value or not reference:
+                continue
+            durations = [timed_seconds(run, figure) for run in (case, old)]
+            if any(duration is not None and duration < min_seconds for duration in durations):
+                continue
+            change = value / reference - 1
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((case_name(case), figure, reference, value))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10_000], metavar="NPCS")
+    parser.add_argument("--engines", nargs="+", choices=("object", "vector"), default=["object", "vector"])
+    parser.add_argument("--storages", nargs="+", choices=STORAGE_MODES, default=["none", "world", "world-state", "files"])
+    parser.add_argument("--days", type=int, default=30, help="simulated days per case at most (default: %(default)s)")
+    parser.add_argument("--npc-days", type=int, default=2_000_000,
+                        help="cap the days of a case at about this many NPC-days (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--plots", action="store_true", help="also time rendering every plot to PNG")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change that counts as a regression (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per case; the medians are reported and compared (default: %(default)s)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="do not compare timings shorter than this (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = {"python": platform.python_version(), "platform": platform.platform(), "cases": []}
+    context = multiprocessing.get_context("spawn")
+    print(f"{'case':<28}{'days':>6}{'first day s':>13}{'NPC-days/s':>13}{'rows/s':>11}{'commits/s':>11}"
+          f"{'RSS B/NPC':>11}{'report s':>10}")
+    for case in cases(args):
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                runs.append(pool.submit(run_case, *case).result())
+        result = median_case(runs)
+        results["cases"].append(result)
+        rss = result["peak_rss_per_npc"]
+        print(f"{case_name(result):<28}{result['days']:>6}{result['first_day_seconds']:>13.3f}"
+              f"{result['npc_days_per_second']:>13,.0f}{result['rows_per_second']:>11,.0f}"
+              f"{result['commits_per_second']:>11.1f}{rss if rss is not None else float('nan'):>11,.0f}"
+              f"{result['report_seconds']:>10.4f}", flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_seconds)
+        for name, figure, reference, value in regressions:
+            print(f"REGRESSION {name} {figure}: {reference:.6g} -> {value:.6g}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
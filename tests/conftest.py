@@ -0,0 +1,42 @@
+"""Shared fixtures: every test writes under its own temporary MatrixSim directory."""
+import contextlib
+import io
+import random
+
+import pytest
+
+from VeraMatrix import create_universe, log_writer, paths
+from VeraMatrix.storage import NullStorage
+
+@pytest.fixture(autouse=True)
+def output_dir(tmp_path):
+    """Point the MatrixSim base directory at `tmp_path` and leave no buffered rows or connections behind."""
+    previous = paths.base_dir
+    paths.set_base_dir(str(tmp_path))
+    yield tmp_path
+    log_writer.close()
+    paths.set_base_dir(previous)
+
+def quiet_universe(population, seed=1, storage=None, **options):
+    """`create_universe` without the console output, after seeding `random` like `simulate` does."""
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return create_universe(population, storage if storage is not None else NullStorage(), seed, **options)
+
+def run_quietly(universe, days, **options):
+    """`universe.run_headless(days)` without status reports or console output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        universe.run_headless(days, report_every_days=0, **options)
+    return universe
+
+def population_state(npcs):
+    """Every NPC's id mapped to the fields a run changes, for comparing two runs NPC for NPC."""
+    return {npc.id: (npc.name, npc.age, npc.money, npc.health, npc.stress_level, npc.mood, npc.thoughts,
+                     npc.country, npc.state, npc.alive, npc.self_awareness, npc.work_skill)
+            for npc in npcs}
+
+def social_links(population):
+    """Every link of a population's social graph as sorted (a, b, kind code) triples, a < b."""
+    if population._social is None:
+        return []
+    return sorted(zip(*(column.tolist() for column in population.social.edges())))
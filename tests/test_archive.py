@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from VeraMatrix import EventArchive, NullStorage, WorldStorage, archive, archive_storage, log_writer
+
+from .conftest import quiet_universe, run_quietly
+
+EVENTS = [
+    (2, "2030-01-02", "Got a job", "Gained 123.45 money", "Good"),
+    (1, "2030-01-01", "Found {money}", "Gained 007 money", "Bad"),
+    (1, "2030-01-03", "Got sick", None, "Neutral"),
+    (2, "2030-01-02", "Got a job", "Lost 1e5 friends", "Good"),
+    (3, None, "Moved", "Moved to Texas", None),
+]
+
+def as_rows(columns):
+    """Query columns as tuples of plain values: dates as 'YYYY-MM-DD' and missing values as None."""
+    plain = []
+    for values in columns.values():
+        if values.dtype.kind == "M":
+            values = np.where(np.isnat(values), None, values.astype(str))
+        plain.append([None if value is None or value != value else value for value in values.tolist()])
+    return list(zip(*plain))
+
+def test_append_and_query_round_trip(tmp_path):
+    events = EventArchive(str(tmp_path))
+    assert events.append("LifeEvents", EVENTS) == 5
+    # By NPC and date; rows of one NPC and day keep their logged order
+    assert as_rows(events.query("LifeEvents")) == [EVENTS[1], EVENTS[2], EVENTS[0], EVENTS[3], EVENTS[4]]
+
+def test_filters_and_reopening(tmp_path):
+    EventArchive(str(tmp_path)).append("LifeEvents", EVENTS)
+    events = EventArchive(str(tmp_path))
+    assert events.query("LifeEvents", npcs=1, columns=["event"])["event"].tolist() == ["Found {money}", "Got sick"]
+    assert events.query("LifeEvents", start="2030-01-02", end="2030-01-02")["npc_id"].tolist() == [2, 2]
+    assert events.query("LifeEvents", events="Moved")["consequences"].tolist() == ["Moved to Texas"]
+    assert events.query("LifeEvents", events="Never happened")["npc_id"].tolist() == []
+    with pytest.raises(ValueError):
+        events.query("Npcs", start="2030-01-01")
+    with pytest.raises(ValueError):
+        events.query("Finances", events="Got sick")
+
+def test_reals_and_flags_keep_their_bits(tmp_path):
+    rng = np.random.default_rng(1)
+    money = np.round(rng.normal(1000, 300, 50).cumsum(), 2).tolist()
+    rows = [(7, f"2031-02-{1 + day % 28:02d}", value) for day, value in enumerate(money)]
+    rows[3] = (7, "2031-02-04", None)
+    events = EventArchive(str(tmp_path))
+    events.append("Finances", rows)
+    stored = events.query("Finances")["money"]
+    expected = np.array([row[2] if row[2] is not None else np.nan for row in sorted(rows, key=lambda row: row[1])])
+    np.testing.assert_array_equal(stored, expected)
+
+def test_segments_are_skipped_by_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SEGMENT_ROWS", 10)
+    events = EventArchive(str(tmp_path))
+    events.append("Finances", [(npc_id, "2030-05-01", float(npc_id)) for npc_id in range(1, 41)])
+    assert len(events.segments("Finances")) == 4 and events.rows("Finances") == 40
+    read = []
+    original = events._read_block
+    monkeypatch.setattr(events, "_read_block", lambda f, block, count: read.append(block) or original(f, block, count))
+    assert events.query("Finances", npcs=[12, 15])["money"].tolist() == [12.0, 15.0]
+    assert len(read) == 3  # The three blocks of the one segment holding ids 11 to 20
+    events.append("Finances", [(41, "2030-05-02", 41.0)])  # Appends add segments; old ones stay as they were
+    with open(os.path.join(str(tmp_path), archive.MANIFEST)) as f:
+        assert len(json.load(f)["tables"]["Finances"]) == 5
+
+def test_archive_a_world_storage_run(output_dir, tmp_path):
+    storage = WorldStorage()
+    run_quietly(quiet_universe(12, seed=17, storage=storage), 25)
+    log_writer.flush()
+    events = archive_storage(str(tmp_path / "archive"), storage)
+    conn = sqlite3.connect(os.path.join(storage.directory, "world.sqlite"))
+    for table, schema in archive.TABLES.items():
+        columns = [column for column, _ in schema]
+        order = "npc_id, date, rowid" if "date" in columns else "npc_id, rowid"
+        expected = [tuple(row) for row in conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order}")]
+        stored = as_rows(events.query(table))
+        if table == "Status":  # Flags come back as booleans
+            expected = [(*row[:11], bool(row[11]), row[12]) for row in expected]
+        assert stored == expected, table
+    conn.close()
+    assert events.rows("Finances") == 12 * 25
+
+def test_nothing_to_archive(tmp_path):
+    with pytest.raises(ValueError):
+        archive_storage(str(tmp_path), NullStorage())
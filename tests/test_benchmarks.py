@@ -0,0 +1,66 @@
+import argparse
+import importlib.util
+import json
+import os
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+@pytest.fixture(scope="module")
+def suite():
+    spec = importlib.util.spec_from_file_location("suite", os.path.join(BENCHMARKS, "suite.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def case(**figures):
+    return {"engine": "object", "storage": "none", "size": 100, "wall_seconds": 1.0, **figures}
+
+def test_compare_flags_changes_past_the_threshold(suite):
+    baseline = {"cases": [case(npc_days_per_second=1000.0, build_seconds=0.5, peak_rss_per_npc=100.0)]}
+    results = {"cases": [case(npc_days_per_second=850.0, build_seconds=0.54, peak_rss_per_npc=150.0),
+                         case(size=200, npc_days_per_second=1.0)]}  # Not in the baseline
+    assert suite.compare(results, baseline, 0.1) == [
+        ("object/none/100", "npc_days_per_second", 1000.0, 850.0),
+        ("object/none/100", "peak_rss_per_npc", 100.0, 150.0),
+    ]
+    assert suite.compare(results, baseline, 0.6) == []
+    faster = {"cases": [case(npc_days_per_second=2000.0, build_seconds=0.1)]}
+    assert suite.compare(faster, baseline, 0.1) == []
+
+def test_short_timings_are_not_compared(suite):
+    baseline = {"cases": [case(build_seconds=0.01, report_seconds=0.2, npc_days_per_second=1000.0)]}
+    results = {"cases": [case(build_seconds=0.03, report_seconds=0.4, npc_days_per_second=500.0, wall_seconds=0.02)]}
+    assert suite.compare(results, baseline, 0.1, min_seconds=0.05) == [
+        ("object/none/100", "report_seconds", 0.2, 0.4)]  # The rate was measured over 0.02s only
+    assert len(suite.compare(results, baseline, 0.1)) == 3
+
+def test_median_case(suite):
+    runs = [case(build_seconds=value, peak_rss_per_npc=None) for value in (0.3, 0.1, 0.2)]
+    result = suite.median_case(runs)
+    assert result["build_seconds"] == 0.2 and result["repeats"] == 3
+    assert result["peak_rss_per_npc"] is None and result["size"] == 100
+
+def test_days_are_capped_and_file_cases_kept_small(suite):
+    args = argparse.Namespace(sizes=[100, 50_000], engines=["object"], storages=["none", "files"], days=30,
+                              npc_days=100_000, seed=1, plots=False)
+    assert [(size, storage, days) for size, _, storage, days, _, _ in suite.cases(args)] == [
+        (100, "none", 30), (100, "files", 30), (50_000, "none", 2)]
+
+def test_a_case_reports_every_compared_figure(suite):
+    result = suite.run_case(30, "vector", "world", 3, 1, False)
+    for figure in suite.COMPARED:
+        if figure != "plot_seconds":
+            assert figure in result
+    assert result["npc_days_per_second"] > 0 and result["rows_per_second"] > 0 and result["wall_seconds"] > 0
+
+def test_the_committed_baseline_covers_the_default_cases(suite):
+    with open(os.path.join(BENCHMARKS, "baseline.json")) as f:
+        baseline = json.load(f)
+    args = argparse.Namespace(sizes=[100, 1000, 10_000], engines=["object", "vector"],
+                              storages=["none", "world", "world-state", "files"], days=30, npc_days=2_000_000,
+                              seed=1, plots=False)
+    names = {f"{engine}/{storage}/{size}" for size, engine, storage, _, _, _ in suite.cases(args)}
+    assert {suite.case_name(case) for case in baseline["cases"]} == names
+    assert suite.compare(baseline, baseline, 0.0) == []
@@ -0,0 +1,84 @@
+import glob
+import os
+import sqlite3
+
+import pytest
+
+from VeraMatrix import PerNPCStorage, WorldStorage, bootstrap, log_writer
+from VeraMatrix.npc import FIRST_NAMES, LAST_NAMES, PERSONALITY_TRAITS, base_name
+from VeraMatrix.storage import NullStorage
+
+from .conftest import population_state, quiet_universe
+
+def attributes(npcs):
+    return [(npc.id, npc.name, npc.age, npc.health, npc.intelligence, npc.work_skill, npc.social_skill,
+             npc.survival_skill, npc.personality, npc.stress_level, npc.country, npc.state, npc.home)
+            for npc in npcs]
+
+def test_starting_npcs_are_numbered_and_named_by_id():
+    universe = quiet_universe(500, seed=91)
+    npcs = list(universe.npcs)
+    assert [npc.id for npc in npcs] == list(range(1, 501))
+    for npc in npcs:
+        first, last = base_name(npc.name, npc.id).split(" ")
+        assert npc.name.endswith(f" {npc.id}") and first in FIRST_NAMES and last in LAST_NAMES
+        assert 18 <= npc.age <= 70 and 50 <= npc.health <= 100 and 80 <= npc.intelligence <= 120
+        assert npc.personality in PERSONALITY_TRAITS and npc.money == 1000 and npc.alive
+        assert npc.home == (npc.country, npc.state)
+    assert len({npc.personality for npc in npcs}) == len(PERSONALITY_TRAITS)
+
+def test_bulk_draws_match_the_dice(monkeypatch):
+    universe = quiet_universe(0, seed=92)
+    streams, planets = universe.random, universe.planets
+    bulk = bootstrap.create_npcs(streams, planets, NullStorage(), 40)
+    dice = streams.dice_many("create", range(1, 41), 0, 1)  # One preloaded draw, the rest computed one by one
+    single = bootstrap.build_npcs(bootstrap.draws_of(dice), planets, range(1, 41), NullStorage())
+    assert attributes(bulk) == attributes(single)
+    monkeypatch.setattr(bootstrap, "BATCH", 7)
+    assert attributes(bootstrap.create_npcs(streams, planets, NullStorage(), 40)) == attributes(bulk)
+
+def test_the_same_seed_gives_the_same_npcs():
+    first, second = quiet_universe(300, seed=93), quiet_universe(300, seed=93)
+    assert population_state(first.npcs) == population_state(second.npcs)
+    assert population_state(first.npcs) != population_state(quiet_universe(300, seed=94).npcs)
+
+def test_arrivals_come_in_one_batch():
+    universe = quiet_universe(50, seed=95)
+    universe._arrivals = [universe.random.dice("growth", 0, day) for day in range(1, 7)]
+    before = {npc.id for npc in universe.npcs}
+    arrivals = universe.add_arrivals()
+    assert [npc.id for npc in arrivals] == list(range(51, 57))
+    assert all(npc in universe.npcs for npc in arrivals) and before < {npc.id for npc in universe.npcs}
+    assert universe.births_today == 6 and universe.add_arrivals() == []
+    assert all(0 <= npc.age <= 30 and npc.name.endswith(f" {npc.id}") for npc in arrivals)
+    for npc in arrivals:
+        relations = universe.npcs.relations(npc)
+        assert relations == [] or (npc.age == 0 and [relation for _, relation in relations] == ["Family"])
+
+def test_world_storage_registers_every_npc(output_dir):
+    storage = WorldStorage(shard_by="state")
+    universe = quiet_universe(200, seed=96, storage=storage)
+    log_writer.flush()
+    rows = []
+    for path in glob.glob(os.path.join(storage.directory, "world_*.sqlite")):
+        conn = sqlite3.connect(path)
+        rows.extend(conn.execute("SELECT npc_id, name, country, state FROM Npcs"))
+        conn.close()
+    assert sorted(rows) == sorted((npc.id, npc.name, npc.country, npc.state) for npc in universe.npcs)
+    assert storage.next_id == 201
+
+def test_per_npc_files_are_created_in_bulk(output_dir):
+    universe = quiet_universe(30, seed=97, storage=PerNPCStorage())
+    log_writer.flush()
+    files = glob.glob(os.path.join(str(output_dir), "EarthData", "*", "*", "*_db.sqlite"))
+    assert len(files) == 30  # Names are unique, so no two NPCs share a file
+    conn = sqlite3.connect(universe.storage.db_path(next(iter(universe.npcs))))
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert {"LifeEvents", "Finances", "Status", "Family"} <= tables
+
+@pytest.mark.parametrize("storage", [NullStorage, WorldStorage])
+def test_new_ids_follow_each_other(storage, output_dir):
+    backend = storage()
+    assert list(backend.new_ids(3)) == [1, 2, 3]
+    assert list(backend.new_ids(2)) == [4, 5]
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from VeraMatrix import CheckpointManager, WorldStorage, load_checkpoint
+from VeraMatrix.checkpoint import Snapshot, save_checkpoint
+
+from .conftest import population_state, quiet_universe, run_quietly, social_links
+
+def universe_state(universe):
+    return (population_state(universe.npcs), social_links(universe.npcs), universe.current_time, universe.start_date,
+            universe.population, [(tech.name, tech.discovery_date) for tech in universe.technologies],
+            list(universe.population_over_time))
+
+def columns(universe):
+    return {field: column.tolist() for field, column in Snapshot(universe).columns.items()}
+
+def test_full_snapshot_round_trip(tmp_path):
+    universe = run_quietly(quiet_universe(150, seed=61), 90)
+    path = str(tmp_path / "snapshot.vmc")
+    save_checkpoint(universe, path)
+    assert universe_state(load_checkpoint(path)) == universe_state(universe)
+
+def test_deltas_round_trip(tmp_path):
+    universe = quiet_universe(150, seed=62)
+    manager = CheckpointManager(str(tmp_path / "checkpoints"), every_days=10, full_every=12)
+    run_quietly(universe, 30, checkpoints=manager)
+    assert len(manager.written) == 3  # One full snapshot and two deltas
+    assert os.path.getsize(manager.written[1]) < os.path.getsize(manager.written[0])
+    assert universe_state(load_checkpoint(manager.directory)) == universe_state(universe)
+
+def test_resumed_storage_continues_the_ids(tmp_path):
+    universe = run_quietly(quiet_universe(40, seed=63, storage=WorldStorage()), 60)
+    path = str(tmp_path / "snapshot.vmc")
+    save_checkpoint(universe, path)
+    resumed = load_checkpoint(path)
+    assert resumed.storage.next_id == universe.storage.next_id
+
+@pytest.mark.parametrize("engine", ["object", "vector"])
+def test_resuming_continues_the_uninterrupted_run(engine, tmp_path):
+    uninterrupted = run_quietly(quiet_universe(200, seed=64), 160, engine=engine)
+    first_half = quiet_universe(200, seed=64)
+    manager = CheckpointManager(str(tmp_path / "checkpoints"), every_days=80)
+    run_quietly(first_half, 80, engine=engine, checkpoints=manager)
+    resumed = run_quietly(load_checkpoint(manager.directory), 80, engine=engine)
+    assert resumed.day == uninterrupted.day and resumed.population == uninterrupted.population
+    assert universe_state(resumed)[:2] == universe_state(uninterrupted)[:2]
+
+def test_checkpoints_do_not_change_the_run(tmp_path):
+    plain = run_quietly(quiet_universe(150, seed=65), 100)
+    checkpointed = run_quietly(quiet_universe(150, seed=65), 100,
+                               checkpoints=CheckpointManager(str(tmp_path / "checkpoints"), every_days=25))
+    assert universe_state(checkpointed)[:2] == universe_state(plain)[:2]
+
+@pytest.mark.parametrize("engine", ["object", "vector"])
+def test_deltas_carry_every_column(engine, tmp_path):
+    universe = quiet_universe(150, seed=66)
+    manager = CheckpointManager(str(tmp_path / "checkpoints"), every_days=5)
+    run_quietly(universe, 120, engine=engine, checkpoints=manager)
+    assert len(manager.written) == 24  # Full snapshots first and 13th, deltas built on the previous snapshot
+    assert columns(load_checkpoint(manager.directory)) == columns(universe)
+
+def test_resuming_a_scheduled_run_keeps_its_queue(tmp_path):
+    uninterrupted = run_quietly(quiet_universe(200, seed=67), 160, events="scheduled")
+    first_half = quiet_universe(200, seed=67)
+    manager = CheckpointManager(str(tmp_path / "checkpoints"), every_days=40)
+    run_quietly(first_half, 80, events="scheduled", checkpoints=manager)
+    resumed = load_checkpoint(manager.directory)  # A delta, extending the queue of the full snapshot
+    assert len(resumed.scheduler) == sum(entry[3].alive for entry in first_half.scheduler.entries())
+    run_quietly(resumed, 80, events="scheduled")
+    assert resumed.day == uninterrupted.day and resumed.population == uninterrupted.population
+    assert universe_state(resumed)[:2] == universe_state(uninterrupted)[:2]
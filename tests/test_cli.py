@@ -0,0 +1,39 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from VeraMatrix import main, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_has_no_side_effects(tmp_path):
+    code = "import sys, VeraMatrix; print(sorted(m for m in ('numpy', 'matplotlib', 'tkinter') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+    assert result.stdout.strip() == "[]"
+    assert os.listdir(tmp_path) == []
+
+def test_main_runs_headless(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert main(["--population", "10", "--days", "5", "--seed", "1", "--storage", "none",
+                     "--output-dir", str(tmp_path)]) == 0
+    assert "Simulation Date" in out.getvalue()
+
+def test_simulate_returns_the_universe(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        universe = simulate(population=12, days=7, seed=2, output_dir=str(tmp_path), storage="none")
+    assert universe.day == 7
+
+@pytest.mark.parametrize("argv", [
+    ["--metrics", "m", "--workers", "2"],
+    ["--checkpoint-dir", "c", "--workers", "2"],
+    ["--profile-days", "1-2"],
+])
+def test_conflicting_options_are_refused(argv, tmp_path):
+    with contextlib.redirect_stderr(io.StringIO()), pytest.raises(SystemExit) as exit:
+        main(["--days", "1", "--output-dir", str(tmp_path), *argv])
+    assert exit.value.code == 2
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from VeraMatrix.downsample import MinMaxDecimator, lttb_indices
+
+from .conftest import quiet_universe, run_quietly
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(10_000)
+    y = np.sin(x / 500.0)
+    y[4321] = 50.0
+    picked = lttb_indices(x, y, 200)
+    assert len(picked) == 200 and picked[0] == 0 and picked[-1] == len(x) - 1
+    assert np.all(np.diff(picked) > 0) and 4321 in picked
+    assert len(lttb_indices(x[:50], y[:50], 200)) == 50
+
+def test_min_max_decimation_is_bounded_and_keeps_every_extreme():
+    decimator = MinMaxDecimator(buckets=100)
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=100_000)
+    values[[12_345, 77_777]] = (40.0, -40.0)
+    for x, y in enumerate(values.tolist()):
+        decimator.append(x, y)
+    xs, ys = decimator.points()
+    assert len(xs) <= 200 and xs == sorted(xs)
+    assert (decimator.y_min, decimator.y_max) == (-40.0, 40.0) and {12_345, 77_777} <= set(xs)
+    assert ys[xs.index(12_345)] == 40.0
+
+@pytest.mark.parametrize("suffix", ["png", "svg"])
+def test_dashboard_file_is_rewritten_while_the_run_goes(suffix, tmp_path):
+    pytest.importorskip("matplotlib")
+    from VeraMatrix.dashboard import Dashboard
+    path = tmp_path / f"run.{suffix}"
+    dashboard = Dashboard(str(path), every_days=50, points=50)
+    run_quietly(quiet_universe(50, seed=101), 200, dashboard=dashboard)
+    assert path.stat().st_size > 0
+    assert dashboard.updates == 4
+    assert all(len(series.points()[0]) <= 100 for lines in dashboard.series for series in lines)
@@ -0,0 +1,90 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from VeraMatrix import EconomyAggregates, Population, QuantileSketch
+from VeraMatrix.npc import LOCATION_CODES
+
+from .conftest import quiet_universe
+from .test_population import make_npcs
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_sketch_quantiles_are_within_the_relative_accuracy(accuracy):
+    rng = random.Random(81)
+    values = [rng.lognormvariate(7, 2) for _ in range(20_000)] + [-rng.expovariate(0.01) for _ in range(2_000)] + [0.0] * 500
+    sketch = QuantileSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+    for value in values[:3_000]:  # Removing values keeps the guarantee for what is left
+        sketch.remove(value)
+    ordered = sorted(values[3_000:])
+    for q in (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= accuracy * abs(exact) + 1e-12
+
+def test_sketch_moves_and_gini():
+    sketch = QuantileSketch()
+    for value in (1.0, 1.0, 1.0, 1.0):
+        sketch.add(value)
+    assert abs(sketch.gini()) < 1e-9  # Everyone equal
+    sketch.move(1.0, 1000.0)
+    sketch.move(1.0, 0.0)
+    assert sketch.count == 4 and sketch.zeros == 1
+    assert sketch.gini() > 0.5
+
+def test_running_totals_match_the_npcs_after_many_updates():
+    npcs = make_npcs(500)
+    population = Population(npcs)
+    rng = random.Random(82)
+    for _ in range(20_000):
+        npc = rng.choice(npcs)
+        field = rng.choice(("money", "health", "stress_level"))
+        setattr(npc, field, getattr(npc, field) + rng.uniform(-1e6, 1e6) * rng.random() ** 8)
+    for npc in rng.sample(npcs, 50):
+        npc.state = "Marseille"
+    for npc in rng.sample(npcs, 40):
+        population.remove(npc)
+    members = list(population)
+    economy = population.economy
+    for field in ("money", "health", "stress_level"):
+        assert economy.total(field) == math.fsum(getattr(npc, field) for npc in members)
+        assert economy.total(field, state="Marseille") == math.fsum(
+            getattr(npc, field) for npc in members if npc.state == "Marseille")
+    assert economy.count() == len(members) and economy.count(country="France", state="Lyon") == \
+        sum(npc.state == "Lyon" for npc in members)
+
+def test_combined_and_columnar_aggregates_equal_a_rebuild():
+    universe = quiet_universe(400, seed=83)
+    npcs = list(universe.npcs)
+    parts = []
+    for part in (npcs[:150], npcs[150:]):
+        aggregates = EconomyAggregates()
+        aggregates.add_many(part)
+        parts.append(aggregates)
+    exact = EconomyAggregates()
+    exact.rebuild(npcs)
+    combined = EconomyAggregates.combine(parts)
+    assert combined.count() == exact.count()
+    assert math.isclose(combined.total("money"), exact.total("money"), rel_tol=1e-14)
+    assert combined.sketch.positive == exact.sketch.positive
+    countries = sorted({npc.country for npc in npcs})
+    states = sorted({npc.state for npc in npcs})
+    columns = EconomyAggregates.from_columns(
+        np.array([npc.money for npc in npcs]), np.array([npc.health for npc in npcs]),
+        np.array([npc.stress_level for npc in npcs]), np.array([countries.index(npc.country) for npc in npcs]),
+        np.array([states.index(npc.state) for npc in npcs]), countries, states)
+    assert set(columns.groups) == set(exact.groups)
+    assert columns.count(state=npcs[0].state) == exact.count(state=npcs[0].state)
+    assert math.isclose(columns.total("health"), exact.total("health"), rel_tol=1e-12)
+    assert columns.median() == exact.median()
+
+def test_pickled_aggregates_carry_location_names():
+    npcs = make_npcs(20)
+    economy = Population(npcs).economy
+    state = economy.__getstate__()
+    assert all(isinstance(country, str) for country, _ in state["groups"])
+    copy = EconomyAggregates.__new__(EconomyAggregates)
+    copy.__setstate__(state)
+    assert copy.groups.keys() == economy.groups.keys() and LOCATION_CODES.code("Lyon") in {s for _, s in copy.groups}
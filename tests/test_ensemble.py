@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from VeraMatrix import Ensemble
+from VeraMatrix.ensemble import FIELDS, EnsembleResult
+
+@pytest.fixture(scope="module")
+def results():
+    ensemble = Ensemble(20, population=[20, 40], repeats=2, probabilities={"death": [0.0, 0.01]}, seed=5, workers=2)
+    return ensemble, ensemble.run()
+
+def test_the_sweep_expands_into_seeded_runs(results):
+    ensemble, result = results
+    assert len(ensemble) == 8
+    assert len(set(ensemble.seeds)) == 8
+    assert ensemble.seeds == Ensemble(20, population=[20, 40], repeats=2, probabilities={"death": [0.0, 0.01]},
+                                      seed=5).seeds
+    assert result.runs(population=40, death=0.0) == [4, 5]
+    assert all(summary["deaths"] == 0 for summary in result.summaries if summary["death"] == 0.0)
+
+def test_series_match_the_summaries(results):
+    _, result = results
+    for summary in result.summaries:
+        run = summary["run"]
+        assert result.series["population"][run, 0] == summary["population"]
+        assert result.series["population"][run, -1] == summary["final_population"]
+        assert result.series["deaths"][run, 1:].sum() == summary["deaths"]
+
+def test_runs_do_not_depend_on_the_worker_count(results):
+    _, result = results
+    again = Ensemble(20, population=[20, 40], repeats=2, probabilities={"death": [0.0, 0.01]}, seed=5, workers=1).run()
+    for field in FIELDS:
+        np.testing.assert_array_equal(result.series[field], again.series[field])
+
+def test_bands_skip_days_past_shorter_runs(tmp_path):
+    series = np.full((len(FIELDS), 3, 4), np.nan)
+    series[:, 0, :] = 1.0
+    series[:, 1, :] = 3.0
+    series[:, 2, :2] = 5.0
+    result = EnsembleResult(series, [{"run": run} for run in range(3)])
+    bands = result.bands("population", percentiles=(50,))
+    np.testing.assert_array_equal(bands["mean"], [3.0, 3.0, 2.0, 2.0])
+    np.testing.assert_array_equal(bands[50], [3.0, 3.0, 2.0, 2.0])
+    path = tmp_path / "bands.csv"
+    result.write_csv(str(path), percentiles=(50,))
+    lines = path.read_text().splitlines()
+    assert lines[0].split(",")[:3] == ["day", "population_mean", "population_p50"] and len(lines) == 5
+
+def test_unknown_options():
+    with pytest.raises(ValueError):
+        Ensemble(10, probabilities={"luck": 0.5})
+    with pytest.raises(ValueError):
+        Ensemble(10, engine="gpu")
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+import pytest
+
+from .conftest import population_state, quiet_universe
+
+def test_fast_forward_covers_exactly_the_days_asked_for():
+    universe = quiet_universe(100, seed=31)
+    start = universe.current_time
+    universe.fast_forward(400)
+    assert universe.current_time == start + timedelta(days=400)
+    assert universe.population == len(universe.npcs)
+    assert all(npc.alive for npc in universe.npcs)
+
+def test_fast_forward_is_reproducible():
+    runs = []
+    for _ in range(2):
+        universe = quiet_universe(100, seed=32)
+        universe.fast_forward(365, "month")
+        runs.append(universe)
+    assert population_state(runs[0].npcs) == population_state(runs[1].npcs)
+
+def test_summaries_once_per_period():
+    universe = quiet_universe(50, seed=33)
+    start = universe.current_time
+    months = {((start + timedelta(days=day)).year, (start + timedelta(days=day)).month) for day in range(1, 367)}
+    points = len(universe.population_over_time)
+    universe.fast_forward(366, "month")
+    assert len(universe.population_over_time) - points == len(months)
+    universe.fast_forward(10)
+    assert len(universe.population_over_time) - points == len(months)  # No summaries without a resolution
+
+def test_bad_options_are_rejected():
+    universe = quiet_universe(5)
+    with pytest.raises(ValueError):
+        universe.fast_forward(10, "week")
+    with pytest.raises(ValueError):
+        universe.fast_forward(10, checkpoints=object())
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from VeraMatrix import LogWriter
+
+SQL = "INSERT INTO Rows (value) VALUES (?)"
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "rows.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Rows (value INTEGER)")
+    conn.commit()
+    conn.close()
+    return path
+
+def stored(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [value for value, in conn.execute("SELECT value FROM Rows ORDER BY rowid")]
+    finally:
+        conn.close()
+
+def test_rows_wait_for_a_flush(database):
+    writer = LogWriter(flush_rows=10, flush_days=100)
+    for value in range(9):
+        writer.write(database, SQL, (value,))
+    assert stored(database) == []
+    writer.write(database, SQL, (9,))
+    assert stored(database) == list(range(10))
+    assert writer.pending_rows == 0
+    writer.close()
+
+def test_flush_every_few_days_commits_once_per_file(database, tmp_path):
+    other = str(tmp_path / "other.sqlite")
+    sqlite3.connect(other).execute("CREATE TABLE Rows (value INTEGER)").connection.close()
+    writer = LogWriter(flush_rows=1000, flush_days=2)
+    writer.write_many(database, SQL, [(1,), (2,)])
+    writer.write(other, SQL, (3,))
+    writer.end_day()
+    assert stored(database) == [] and writer.commits == 0
+    writer.end_day()
+    assert stored(database) == [1, 2] and stored(other) == [3]
+    assert writer.commits == 2 and writer.rows_written == 3
+    writer.close()
+
+def test_close_flushes_and_evicted_connections_keep_their_rows(tmp_path):
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"{i}.sqlite")
+        sqlite3.connect(path).execute("CREATE TABLE Rows (value INTEGER)").connection.close()
+        paths.append(path)
+    writer = LogWriter(flush_rows=1000, max_connections=1)
+    for i, path in enumerate(paths):
+        writer.connection(path)
+        writer.write(path, SQL, (i,))
+    writer.close()
+    assert [stored(path) for path in paths] == [[0], [1], [2]]
+
+def test_unknown_durability_is_rejected():
+    with pytest.raises(ValueError):
+        LogWriter(durability="sometimes")
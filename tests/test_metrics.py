@@ -0,0 +1,61 @@
+import json
+import pstats
+
+import pytest
+
+from VeraMatrix import Metrics, WorldStorage, metrics
+from VeraMatrix.metrics import Histogram
+
+from .conftest import population_state, quiet_universe, run_quietly
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.count == 4 and histogram.sum == pytest.approx(3.65)
+
+def test_a_measured_run(output_dir, tmp_path):
+    json_path, prometheus_path = str(tmp_path / "run.json"), str(tmp_path / "run.prom")
+    collected = Metrics(json_path, prometheus_path, every_days=10, profile_days=(2, 3),
+                        profile_path=str(tmp_path / "run.prof"))
+    universe = quiet_universe(60, seed=31, storage=WorldStorage())
+    start = universe.population
+    run_quietly(universe, 25, metrics=collected)
+    with open(json_path) as f:
+        summary = json.load(f)
+    assert summary["days"] == 25 and summary["population"] == universe.population
+    counters = summary["counters"]
+    assert universe.population == start + counters["births"] - counters["deaths"]
+    assert start * 25 * 0.9 < counters["npcs_stepped"] < (start + counters["births"]) * 25 + 1
+    assert counters["rows_written"] > 0 and counters["commits"] == summary["commit_seconds"]["count"] > 0
+    assert sum(phase["share"] for phase in summary["phases"].values()) == pytest.approx(1.0)
+    assert sum(summary["events"].values()) > 0
+    with open(prometheus_path) as f:
+        text = f.read()
+    assert "veramatrix_simulated_days_total 25\n" in text
+    assert f'veramatrix_commit_seconds_bucket{{le="+Inf"}} {counters["commits"]}\n' in text
+    assert pstats.Stats(str(tmp_path / "run.prof")).total_calls > 0
+    assert metrics.active is None
+
+def test_files_are_written_during_the_run(tmp_path):
+    json_path = str(tmp_path / "run.json")
+    collected = Metrics(json_path, every_days=10)
+    universe = quiet_universe(20, seed=32)
+    collected.start(universe)
+    for _ in range(9):
+        collected.end_day(universe, 20)
+    assert not (tmp_path / "run.json").exists()
+    collected.end_day(universe, 20)
+    with open(json_path) as f:
+        assert json.load(f)["counters"]["npcs_stepped"] == 200
+    collected.finish(universe)
+
+def test_measuring_does_not_change_the_run(tmp_path):
+    plain = run_quietly(quiet_universe(80, seed=33), 30)
+    measured = run_quietly(quiet_universe(80, seed=33), 30, metrics=Metrics(str(tmp_path / "run.json")))
+    assert population_state(measured.npcs) == population_state(plain.npcs)
+
+def test_a_profile_needs_a_path():
+    with pytest.raises(ValueError):
+        Metrics(profile_days=(1, 2))
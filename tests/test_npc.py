@@ -0,0 +1,36 @@
+import pickle
+import random
+
+import pytest
+
+from VeraMatrix import NPC, NullStorage
+from VeraMatrix.npc import LOCATION_CODES, MOOD_CODES, base_name
+
+@pytest.fixture
+def npc():
+    return NPC("Alice Smith 1", 30, "France", "Paris", NullStorage(), random.Random(1))
+
+def test_npcs_have_no_instance_dict(npc):
+    assert not hasattr(npc, "__dict__")
+    with pytest.raises(AttributeError):
+        npc.nickname = "Al"
+
+def test_categorical_fields_are_interned_codes(npc):
+    other = NPC("Bob Jones 2", 40, "France", "Paris", NullStorage(), random.Random(2))
+    assert npc._state == other._state == LOCATION_CODES.code("Paris")
+    npc.mood = "Happy"
+    assert npc.mood == "Happy" and npc._mood == MOOD_CODES.code("Happy")
+    npc.state = "Lyon"
+    assert npc.state == "Lyon" and npc.home == ("France", "Paris")  # Records stay filed under the home
+
+def test_pickles_carry_names_not_codes(npc):
+    npc.mood = "Curious today"
+    npc.money = 123.5
+    copy = pickle.loads(pickle.dumps(npc))
+    assert (copy.name, copy.mood, copy.state, copy.home, copy.money, copy.id) == \
+        (npc.name, npc.mood, npc.state, npc.home, npc.money, npc.id)
+    assert copy._observer is None
+
+def test_base_name_drops_only_the_id_suffix():
+    assert base_name("Alice Smith 12", 12) == "Alice Smith"
+    assert base_name("Alice Smith 12", 13) == "Alice Smith 12"
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from VeraMatrix import NPC, NullStorage, Population
+
+from .conftest import quiet_universe
+
+def make_npcs(count, first_id=1):
+    rng = random.Random(count)
+    npcs = []
+    for npc_id in range(first_id, first_id + count):
+        npc = NPC(f"Npc {npc_id}", rng.uniform(0, 90), "France", rng.choice(["Paris", "Lyon", "Nice"]),
+                  NullStorage(), rng)
+        npc.id = npc_id
+        npcs.append(npc)
+    return npcs
+
+def test_ids_resolve_until_removed():
+    npcs = make_npcs(10)
+    population = Population(npcs)
+    assert population.get(4) is npcs[3] and len(population) == 10
+    population.remove(npcs[3])
+    assert population.get(4) is None and npcs[3] not in population and len(population) == 9
+    assert population.ids() == [npc.id for npc in npcs if npc.id != 4]
+    with pytest.raises(ValueError):
+        population.add(npcs[0])
+
+def test_removing_while_iterating_visits_everyone_else_once():
+    npcs = make_npcs(100)
+    population = Population(npcs)
+    seen = []
+    for npc in population:
+        seen.append(npc.id)
+        if npc.id % 2:
+            population.remove(population.get(npc.id + 1))
+        if npc.id == 51:
+            population.add(make_npcs(1, 1000)[0])  # Not visited by this iteration
+    assert seen == list(range(1, 101, 2))
+    assert sorted(npc.id for npc in population) == list(range(1, 101, 2)) + [1000]
+
+def test_indexes_follow_every_change():
+    npcs = make_npcs(300)
+    population = Population(npcs)
+    assert population.by_state("Paris")  # Builds the indexes
+    rng = random.Random(7)
+    for npc in rng.sample(npcs, 100):
+        npc.state = rng.choice(["Paris", "Lyon", "Marseille"])
+        npc.age = rng.uniform(0, 120)
+    for npc in rng.sample(npcs, 30):
+        npc.alive = False
+    for npc in rng.sample([npc for npc in npcs if npc in population], 20):
+        population.remove(npc)
+    members = list(population)
+    for state in ("Paris", "Lyon", "Nice", "Marseille"):
+        assert set(population.by_state(state)) == {npc for npc in members if npc.state == state}
+    assert set(population.by_age(20, 45)) == {npc for npc in members if 20 <= npc.age < 45}
+    assert set(population.dead()) == {npc for npc in members if not npc.alive}
+    assert set(population.living()) == {npc for npc in members if npc.alive}
+
+def test_partners_are_picked_by_id():
+    universe = quiet_universe(50, seed=71)
+    npc = next(iter(universe.npcs))
+    picks = {getattr(universe.npcs.partner(npc, random.Random(seed)), "id", None) for seed in range(200)}
+    assert npc.id not in picks and picks - {None} <= set(universe.npcs.ids())
@@ -0,0 +1,144 @@
+import io
+import math
+import random
+
+import numpy as np
+import pytest
+
+from VeraMatrix import QueryReport, query
+
+from .conftest import quiet_universe, run_quietly
+
+WHERES = [
+    None,
+    {"alive": True},
+    {"self_awareness": False, "age": (30, 60)},
+    {"money": (None, 500.0)},
+    {"money": (1000.0, None), "health": (50.0, None)},
+    {"stress_level": (20.0, 80.0), "age": (None, 40)},
+    {"personality": ["Introvert", "Extrovert"], "alive": True},
+]
+
+def matches(npc, where):
+    for field, value in (where or {}).items():
+        if field in query.ORDERED:
+            low, high = value
+            if (low is not None and getattr(npc, field) < low) or (high is not None and getattr(npc, field) >= high):
+                return False
+        elif getattr(npc, field) not in (value if isinstance(value, (list, set)) else [value]):
+            return False
+    return True
+
+def check_queries(universe):
+    """Every kind of query against a scan of the population."""
+    npcs = list(universe.npcs)
+    some_state = npcs[0].state
+    for where in WHERES + [{"state": some_state}, {"country": npcs[-1].country, "money": (0.0, None)}]:
+        expected = {npc.id for npc in npcs if matches(npc, where)}
+        assert {npc.id for npc in universe.query(where)} == expected, where
+        assert universe.count(where) == len(expected), where
+        for field in ("money", "age"):
+            for descending in (False, True):
+                top = universe.query(where, order_by=field, descending=descending, limit=7)
+                values = sorted((getattr(npc, field) for npc in npcs if npc.id in expected), reverse=descending)
+                assert [getattr(npc, field) for npc in top] == values[:7], (where, field)
+    for by in query.CATEGORICAL:
+        for where in (None, {"alive": True}):
+            groups = universe.group_by(by, "money", where)
+            expected = {}
+            for npc in npcs:
+                if matches(npc, where):
+                    expected.setdefault(getattr(npc, by), []).append(npc.money)
+            assert set(groups) == set(expected), by
+            for value, money in expected.items():
+                assert groups[value]["count"] == len(money)
+                assert math.isclose(groups[value]["sum"], math.fsum(money), rel_tol=1e-9, abs_tol=1e-6)
+    for npc in npcs:  # The population's own indexes
+        assert npc in universe.npcs.by_state(npc.state)
+    assert len(universe.npcs.living()) + len(universe.npcs.dead()) == len(npcs)
+    assert {npc.id for npc in universe.npcs.by_age(25, 45)} == {npc.id for npc in npcs if 25 <= npc.age < 45}
+
+@pytest.mark.parametrize("engine", ["object", "vector"])
+def test_indexes_follow_a_run(engine):
+    universe = quiet_universe(400, seed=61)
+    check_queries(universe)  # Builds every index before the run, so the run has to keep them up to date
+    run_quietly(universe, 120, engine=engine)
+    check_queries(universe)
+
+def test_indexes_follow_direct_changes():
+    universe = quiet_universe(300, seed=62)
+    check_queries(universe)
+    rng = random.Random(5)
+    npcs = list(universe.npcs)
+    for npc in rng.sample(npcs, 100):
+        npc.money = rng.uniform(-100, 5000)
+        npc.age += rng.choice([0.01, 20])
+        npc.stress_level = rng.uniform(0, 100)
+        npc.self_awareness = not npc.self_awareness
+    for npc in rng.sample(npcs, 30):
+        universe.npcs.remove(npc)
+    check_queries(universe)
+
+def test_order_index_against_a_sorted_list(monkeypatch):
+    monkeypatch.setattr(query.OrderIndex, "LOAD", 4)
+    rng = random.Random(6)
+    keys = [(rng.randint(0, 50), i) for i in range(60)]
+    index = query.OrderIndex(keys[:30])
+    for key in keys[30:]:
+        index.add(key)
+    for _ in range(200):
+        position = rng.randrange(len(keys))
+        new = (rng.randint(0, 50), keys[position][1])
+        index.replace(keys[position], new)
+        keys[position] = new
+    for key in keys[:20]:
+        index.remove(key)
+    keys = sorted(keys[20:])
+    assert list(index.irange()) == keys and len(index) == 40
+    assert list(index.irange(reverse=True)) == keys[::-1]
+    assert list(index.irange(10, 30)) == [key for key in keys if 10 <= key[0] < 30]
+    assert index.count(10, 30) == sum(1 for key in keys if 10 <= key[0] < 30)
+
+def test_bitmaps_against_a_set():
+    rng = random.Random(7)
+    bitmap = query.Bitmap()
+    members = set()
+    for _ in range(500):
+        i = rng.randrange(300)
+        if rng.random() < 0.7:
+            bitmap.add(i)
+            members.add(i)
+        else:
+            bitmap.discard(i)
+            members.discard(i)
+    assert query._members(bitmap.bits) == sorted(members) and query._popcount(bitmap.bits) == len(members)
+    assert query._members(query.Bitmap.of(np.array(sorted(members))).bits) == sorted(members)
+    other = query.Bitmap.of(np.arange(0, 500, 3))
+    assert query._members(query._union(bitmap.bits, other.bits)) == sorted(members | set(range(0, 500, 3)))
+    assert query._members(query._intersection(bitmap.bits, other.bits)) == sorted(members & set(range(0, 500, 3)))
+
+def test_bad_queries_are_rejected():
+    universe = quiet_universe(20, seed=63)
+    for call in (lambda: universe.query({"money": 5}), lambda: universe.query({"name": "Bob"}),
+                 lambda: universe.query(order_by="state"), lambda: universe.group_by("money"),
+                 lambda: universe.group_by("state", "personality")):
+        with pytest.raises(ValueError):
+            call()
+
+def test_query_reports_are_due_every_few_days():
+    sink = io.StringIO()
+    report = QueryReport({"Adults": lambda u: u.count({"age": (18, None)}),
+                          "Richest": lambda u: u.query(order_by="money", descending=True, limit=2)},
+                         every_days=5, sink=sink)
+    universe = run_quietly(quiet_universe(50, seed=64), 25, queries=report)
+    assert sink.getvalue().count("Queries on") == 5
+    assert report.results["Adults"] == universe.count({"age": (18, None)})  # The last report came on the last day
+    richest = report.results["Richest"]
+    assert len(richest) == 2 and f"{richest[0].name} (#{richest[0].id})" in sink.getvalue()
+
+def test_query_reports_append_to_a_file(tmp_path):
+    path = tmp_path / "queries.txt"
+    report = QueryReport({"Everyone": lambda u: u.count()}, every_days=10, sink=str(path))
+    run_quietly(quiet_universe(30, seed=65), 20, queries=report)
+    assert report._sink is None  # Closed at the end of the run
+    assert path.read_text().count("Everyone: ") == 2
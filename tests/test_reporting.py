@@ -0,0 +1,46 @@
+import io
+import time
+
+import pytest
+
+from VeraMatrix import Pacing
+
+from .conftest import quiet_universe
+
+def reports(sink):
+    return sink.getvalue().count("Simulation Date")
+
+def test_reports_every_few_days_and_on_the_last_day():
+    universe = quiet_universe(20, seed=41)
+    sink = io.StringIO()
+    universe.run_headless(25, report_every_days=10, sink=sink)
+    assert reports(sink) == 3  # Days 10, 20 and the last day
+
+def test_no_reports_but_the_last_one_when_disabled():
+    universe = quiet_universe(20, seed=42)
+    sink = io.StringIO()
+    universe.run_headless(25, report_every_days=0, sink=sink)
+    assert reports(sink) == 1
+
+def test_delta_reports_count_births_and_deaths():
+    universe = quiet_universe(200, seed=43)
+    sink = io.StringIO()
+    universe.run_headless(200, report_every_days=200, verbosity="delta", sink=sink)
+    assert f"Population: {universe.population} (" in sink.getvalue()
+    assert "births" in sink.getvalue() and "deaths" in sink.getvalue()
+
+def test_headless_runs_do_not_sleep():
+    universe = quiet_universe(5, seed=44)
+    started = time.perf_counter()
+    universe.run_headless(50, report_every_days=0, sink=io.StringIO())
+    assert time.perf_counter() - started < 5  # The interactive default sleeps 0.1s a day
+
+def test_pacing_takes_a_sleep_or_a_speed():
+    with pytest.raises(ValueError):
+        Pacing(sleep=0.1, speed=10)
+    pacing = Pacing(speed=86400 * 100)  # 100 simulated days per second
+    pacing.start()
+    started = time.perf_counter()
+    for _ in range(10):
+        pacing.wait()
+    assert time.perf_counter() - started >= 0.09
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import pickle
+
+import numpy as np
+import pytest
+
+from VeraMatrix import simulate
+from VeraMatrix.rng import REFILL, RandomStreams
+
+from .conftest import population_state, quiet_universe, run_quietly, social_links
+
+def test_blocks_equal_single_draws():
+    streams = RandomStreams(42)
+    entities = [1, 7, 99, 2 ** 31]
+    block = streams.block("life", entities, 12, 5, first=3)
+    assert block.tolist() == [[streams.value("life", entity, 12, index) for index in range(3, 8)] for entity in entities]
+
+def test_dice_serve_the_stream_in_order():
+    streams = RandomStreams(42)
+    expected = [streams.value("life", 5, 3, index) for index in range(3 * REFILL)]
+    preloaded = streams.dice_many("life", [4, 5, 6], 3, 4)[1]
+    for dice in (streams.dice("life", 5, 3), preloaded):
+        assert [dice.random() for _ in range(3 * REFILL)] == expected
+
+def test_draws_depend_only_on_their_key():
+    streams = RandomStreams(9)
+    first = streams.value("life", 3, 10)
+    for entity in range(50):  # Draws made in between change nothing
+        streams.dice("life", entity, 10).random()
+    assert streams.value("life", 3, 10) == first == RandomStreams(9).value("life", 3, 10)
+    assert first != streams.value("events", 3, 10)
+    assert first != streams.value("life", 3, 11)
+    assert first != RandomStreams(10).value("life", 3, 10)
+    assert pickle.loads(pickle.dumps(streams)).value("life", 3, 10) == first
+
+def test_draws_are_uniform():
+    draws = RandomStreams(1).block("life", np.arange(20000), 0, 5).ravel()
+    assert draws.min() >= 0.0 and draws.max() < 1.0
+    counts = np.histogram(draws, bins=10, range=(0, 1))[0]
+    assert np.all(np.abs(counts - len(draws) / 10) < 5 * np.sqrt(len(draws) / 10))
+
+def sharded(workers, output_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return simulate(population=200, days=45, seed=77, output_dir=str(output_dir / str(workers)), storage="none",
+                        workers=workers, report_every_days=0)
+
+@pytest.fixture(scope="module")
+def serial(tmp_path_factory):
+    return sharded(1, tmp_path_factory.mktemp("serial"))
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_runs_do_not_depend_on_the_worker_count(serial, workers, tmp_path):
+    universe = sharded(workers, tmp_path)
+    assert population_state(universe.npcs) == population_state(serial.npcs)
+    assert social_links(universe.npcs) == social_links(serial.npcs)
+    assert (universe.day, universe.population) == (serial.day, serial.population)
+
+def test_batching_does_not_change_a_run():
+    whole = run_quietly(quiet_universe(150, seed=78), 30)
+    split = quiet_universe(150, seed=78)
+    for _ in range(3):
+        run_quietly(split, 10)
+    assert population_state(split.npcs) == population_state(whole.npcs)
+    assert social_links(split.npcs) == social_links(whole.npcs)
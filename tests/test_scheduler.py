@@ -0,0 +1,44 @@
+import statistics
+
+from VeraMatrix import EventScheduler, RandomStreams
+from VeraMatrix.scheduler import geometric_delay
+
+from .conftest import population_state, quiet_universe, run_quietly
+
+def test_geometric_delays_have_the_daily_chance():
+    chance = 0.01
+    delays = [geometric_delay(chance, (i + 0.5) / 20_000) for i in range(20_000)]
+    assert min(delays) == 1
+    assert abs(statistics.fmean(delays) - 1 / chance) < 1
+    assert abs(sum(delay == 1 for delay in delays) / len(delays) - chance) < 0.001
+
+def test_stream_delays_do_not_depend_on_the_order_npcs_are_added():
+    universe = quiet_universe(50, seed=21)
+    npcs = list(universe.npcs)
+    due = []
+    for order in (npcs, npcs[::-1]):
+        scheduler = EventScheduler(RandomStreams(5), origin=0)
+        for npc in order:
+            scheduler.add(npc, 0)
+        entries = []
+        entry = scheduler.pop_next(10**6)
+        while entry is not None:
+            day, kind, npc = entry
+            entries.append((day, kind, npc.id))
+            entry = scheduler.pop_next(10**6)
+        due.append(sorted(entries))
+    assert due[0] == due[1]
+
+def test_pop_due_skips_the_dead():
+    universe = quiet_universe(20, seed=22)
+    scheduler = EventScheduler(RandomStreams(1))
+    for npc in universe.npcs:
+        scheduler.add(npc, 0)
+    for npc in list(universe.npcs)[:10]:
+        npc.alive = False
+    due = scheduler.pop_due(10**6)
+    assert due and all(npc.alive for _, npc in due)
+
+def test_scheduled_runs_are_reproducible():
+    runs = [run_quietly(quiet_universe(200, seed=23), 120, events="scheduled") for _ in range(2)]
+    assert population_state(runs[0].npcs) == population_state(runs[1].npcs)
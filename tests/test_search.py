@@ -0,0 +1,50 @@
+import pytest
+
+from VeraMatrix import WorldStorage
+from VeraMatrix.npc import base_name
+from VeraMatrix.search import NameIndex
+
+from .conftest import quiet_universe, run_quietly
+
+@pytest.fixture(scope="module")
+def population():
+    return quiet_universe(2000, seed=111).npcs
+
+@pytest.mark.parametrize("text", ["a", "Smith", "ice sm", "CHARLIE", "eve", "zz", "Bob Jones"])
+def test_search_finds_what_a_scan_finds(population, text):
+    index = NameIndex(population)
+    found = index.search(text, population.get)
+    matching = {npc.id for npc in population if text.lower() in base_name(npc.name, npc.id).lower()}
+    assert len(found) == len(set(found)) and set(found) == matching
+    starting = {npc.id for npc in population if base_name(npc.name, npc.id).lower().startswith(text.lower())}
+    assert set(found[:len(starting)]) == starting  # Prefix matches come first
+
+def test_a_trailing_number_is_an_id(population):
+    index = NameIndex(population)
+    npc = population.get(1234)
+    assert index.search("1234", population.get) == [1234]
+    assert index.search(npc.name, population.get) == [1234]
+    assert index.search("Nobody 1234", population.get) == []
+    assert index.search("99999", population.get) == []
+
+def test_the_index_grows_with_distinct_names(population):
+    index = NameIndex(population)
+    assert len(index) == len(population)
+    assert len(index.ids) <= 100  # Ten first names times ten last names
+
+def test_history_pages_follow_each_other():
+    pytest.importorskip("tkinter")
+    from VeraMatrix.gui import HistoryLoader
+    storage = WorldStorage()
+    universe = run_quietly(quiet_universe(5, seed=112, storage=storage), 45)
+    npc = next(iter(universe.npcs))
+    loader = HistoryLoader()
+    pages, after = [], None
+    while True:
+        records, after = loader.load(storage, npc, "Finances", after, limit=10).result()
+        pages.append(records)
+        if after is None:
+            break
+    loader.close()
+    assert [len(page) for page in pages] == [10, 10, 10, 10, 5]
+    assert [record for page in pages for record in page] == storage.history(npc, "Finances", limit=1000)
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import math
+import sqlite3
+
+import numpy as np
+import pytest
+
+from VeraMatrix import EconomyAggregates, WorldStorage, log_writer, main, paths, simulate
+from VeraMatrix.sharding import Roster, ShardedSimulation, _apply_delta, _economy_delta, home_unit, partition_homes
+
+from .conftest import quiet_universe
+
+def test_homes_are_shared_out_by_population():
+    universe = quiet_universe(600, seed=51)
+    homes = sorted({npc.home for npc in universe.npcs})
+    owner = partition_homes(universe.npcs, homes, 3, home_unit(universe.storage))
+    loads = [0, 0, 0]
+    for npc in universe.npcs:
+        loads[owner[npc.home]] += 1
+    assert set(owner) == set(homes)
+    assert max(loads) - min(loads) <= max(sum(npc.home == home for npc in universe.npcs) for home in homes)
+
+def test_world_storage_shards_are_owned_whole():
+    by_country = home_unit(WorldStorage(shard_by="country"))
+    assert by_country(("USA", "Texas")) == by_country(("USA", "Ohio")) == "USA"
+    assert home_unit(WorldStorage(shard_by="state"))(("USA", "Texas")) == ("USA", "Texas")
+    with pytest.raises(ValueError):
+        ShardedSimulation(quiet_universe(20, seed=54, storage=WorldStorage()), 2)
+    with contextlib.redirect_stderr(io.StringIO()), pytest.raises(SystemExit):
+        main(["--days", "1", "--storage", "world", "--workers", "2"])
+
+@pytest.mark.parametrize("shard_by", ["state", "country"])
+def test_each_shard_file_has_one_worker(shard_by, output_dir):
+    universe = quiet_universe(400, seed=55, storage=WorldStorage(shard_by=shard_by))
+    simulation = ShardedSimulation(universe, 3)
+    writers = {}
+    for npc in universe.npcs:
+        writers.setdefault(universe.storage.db_path(npc), set()).add(simulation.owner[simulation.unit_of(npc.home)])
+    assert len(writers) > 3 and all(len(workers) == 1 for workers in writers.values())
+
+def test_roster_keeps_ids_sorted():
+    roster = Roster()
+    roster.update(np.array([5, 1]), np.array([b"Eve 5", b"Bob 1"]), np.zeros(0, dtype=np.int64))
+    roster.update(np.array([3]), np.array([b"Ann 3"]), np.array([5]))
+    assert roster.ids.tolist() == [1, 3]
+    assert roster.name(3) == "Ann 3" and len(roster) == 2
+
+def test_economy_deltas_rebuild_the_workers_figures():
+    universe = quiet_universe(300, seed=52)
+    worker = universe.npcs.economy
+    sent = [{}, {}]
+    coordinator = EconomyAggregates()
+    _apply_delta(coordinator, _economy_delta(worker, sent))
+    npcs = list(universe.npcs)
+    for npc in npcs[:50]:
+        npc.money = -npc.money if npc.id % 3 else 0.0
+    for npc in npcs[50:60]:
+        universe.npcs.remove(npc)
+    rows, counts = delta = _economy_delta(worker, sent)
+    assert len(rows) < len(worker.groups) + 10
+    _apply_delta(coordinator, delta)
+    assert coordinator.groups == worker.groups
+    assert (coordinator.sketch.positive, coordinator.sketch.negative, coordinator.sketch.zeros) == \
+        (worker.sketch.positive, worker.sketch.negative, worker.sketch.zeros)
+    assert _economy_delta(worker, sent) == ({}, {})
+
+def test_sharded_economy_matches_the_npcs(output_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        universe = simulate(population=300, days=60, seed=53, output_dir=str(output_dir), storage="none", workers=2)
+    log_writer.flush()
+    conn = sqlite3.connect(paths.economy_data_db())
+    total, median = conn.execute("SELECT total_money, median_money FROM EconomyData ORDER BY rowid DESC").fetchone()
+    conn.close()
+    exact = EconomyAggregates()
+    exact.rebuild(universe.npcs)
+    assert universe.population == len(universe.npcs) == exact.count()
+    assert math.isclose(total, exact.total("money"), rel_tol=1e-12)  # The last day's figures came from the deltas
+    assert median == exact.median()
+
+@pytest.mark.parametrize("argv", [["--engine", "vector", "--workers", "2"], ["--events", "scheduled", "--fast-forward"]])
+def test_options_a_sharded_or_fast_forward_run_would_ignore_are_refused(argv, tmp_path):
+    with contextlib.redirect_stderr(io.StringIO()), pytest.raises(SystemExit):
+        main(["--days", "1", "--output-dir", str(tmp_path), *argv])
+    options = dict(engine="vector", workers=2) if "--workers" in argv else dict(events="scheduled", fast_forward=True)
+    with pytest.raises(ValueError):
+        simulate(population=5, days=1, seed=1, output_dir=str(tmp_path), storage="none", **options)
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from VeraMatrix import social
+from VeraMatrix.rng import RandomStreams
+from VeraMatrix.social import KIND_CODES, KINDS, SocialGraph
+
+def random_links(count, size, seed):
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, size, count)
+    targets = rng.integers(0, size, count)
+    keep = sources != targets
+    return sources[keep], targets[keep], rng.integers(0, len(KINDS), count)[keep]
+
+def expected_edges(sources, targets, kinds, removed=()):
+    """The live links by (low id, high id), the last link between two NPCs giving the kind."""
+    found = {}
+    for a, b, kind in zip(sources.tolist(), targets.tolist(), kinds.tolist()):
+        if a not in removed and b not in removed:
+            found[min(a, b), max(a, b)] = kind
+    return sorted((a, b, kind) for (a, b), kind in found.items())
+
+def edge_list(graph):
+    return sorted(zip(*(column.tolist() for column in graph.edges())))
+
+def build(links, merge_every=None):
+    graph = SocialGraph()
+    for start in range(0, len(links[0]), merge_every or len(links[0])):
+        graph.link_many(*(column[start:start + (merge_every or len(links[0]))] for column in links))
+        if merge_every:
+            graph.merge()
+    return graph
+
+def test_edges_match_the_links_made():
+    links = random_links(5000, 300, seed=1)
+    graph = build(links)
+    assert edge_list(graph) == expected_edges(*links)
+    assert graph.degrees().sum() == 2 * len(edge_list(graph))
+
+def test_one_link_at_a_time_and_the_later_kind_wins():
+    graph = SocialGraph()
+    graph.link(1, 2, "Friend")
+    graph.link(3, 1, "Colleague")
+    assert sorted(graph.neighbors(1)) == [(2, "Friend"), (3, "Colleague")]  # Read from the buffer
+    graph.merge()
+    graph.link(2, 1, "Family")
+    assert dict(graph.neighbors(1))[2] == "Family"
+    assert edge_list(graph) == [(1, 2, KIND_CODES["Family"]), (1, 3, KIND_CODES["Colleague"])]
+
+def test_removed_npcs_lose_their_links():
+    links = random_links(3000, 200, seed=2)
+    graph = build(links)
+    removed = {5, 17, 120}
+    for npc_id in removed:
+        graph.remove(npc_id)
+    assert all(other not in removed for other, _ in graph.neighbors(int(links[0][0])))
+    assert edge_list(graph) == expected_edges(*links, removed=removed)
+    graph.retain([npc_id for npc_id in range(100)])
+    assert edge_list(graph) == [edge for edge in expected_edges(*links, removed=removed) if edge[1] < 100]
+
+@pytest.mark.parametrize("merge_every", [1, 7, 250])
+def test_merge_timing_does_not_change_the_graph(merge_every):
+    links = random_links(2000, 150, seed=3)
+    once, often = build(links), build(links, merge_every)
+    assert edge_list(once) == edge_list(often)
+    rows = min(len(once.indptr), len(often.indptr))  # Trailing rows are empty ids the graph grew room for
+    np.testing.assert_array_equal(once.indptr[:rows], often.indptr[:rows])
+    np.testing.assert_array_equal(once.indices, often.indices)
+    np.testing.assert_array_equal(once.kinds, often.kinds)
+    rows = min(once.size, often.size)
+    np.testing.assert_array_equal(once.components()[:rows], often.components()[:rows])
+
+def test_automatic_merges_keep_the_arrays_sorted(monkeypatch):
+    monkeypatch.setattr(social, "MERGE_MIN", 64)
+    links = random_links(4000, 500, seed=4)
+    graph = SocialGraph()
+    for a, b, kind in zip(*(column.tolist() for column in links)):
+        graph.link(a, b, KINDS[kind])
+    assert len(graph._sources) < len(graph.indices)  # Merges happened along the way
+    assert edge_list(graph) == expected_edges(*links)
+    keys = np.repeat(np.arange(len(graph.indptr) - 1), np.diff(graph.indptr)) * 1000 + graph.indices
+    assert np.all(np.diff(keys) > 0)
+
+def test_influence_does_not_depend_on_merge_timing():
+    links = random_links(1500, 120, seed=5)
+    streams = RandomStreams(7)
+    stress = np.random.default_rng(8).random(120) * 100
+    mood = np.arange(120, dtype=np.int32) % 5
+    draws = streams.block("social", np.arange(120), 3, 2)
+    results = [build(links, merge_every).influence(stress, mood, draws) for merge_every in (None, 11)]
+    np.testing.assert_array_equal(results[0][0], results[1][0])
+    np.testing.assert_array_equal(results[0][1], results[1][1])
+    unlinked = build(links).degrees()[:120] == 0
+    np.testing.assert_array_equal(results[0][0][unlinked], stress[unlinked])
+
+def test_components():
+    graph = SocialGraph()
+    for a, b in ((1, 2), (2, 3), (5, 6), (8, 7)):
+        graph.link(a, b, "Neighbor")
+    labels = graph.components()
+    assert labels[[1, 2, 3, 5, 6, 7, 8]].tolist() == [1, 1, 1, 5, 5, 7, 7]
+    assert graph.component_sizes([1, 2, 3, 4, 5, 6, 7, 8, 42]).tolist() == [3, 2, 2, 1, 1]
+
+def test_influence_draws_only_for_linked_npcs():
+    graph = SocialGraph()
+    for a, b in ((2, 9), (9, 4), (30, 31)):
+        graph.link(a, b, "Friend")
+    graph.remove(31)
+    assert graph.linked().tolist() == [2, 4, 9]
+    streams = RandomStreams(3)
+    asked = []
+    block = streams.block
+    streams.block = lambda subsystem, entities, day, count: asked.append(list(entities)) or block(
+        subsystem, entities, day, count)
+    ids = np.arange(1, 41)
+    stress = np.linspace(0, 100, 40)
+    new_stress, _ = social.influence_columns(graph, ids, stress, ids.astype(np.int32) % 5, streams, 4)
+    assert asked == [[2, 4, 9]]
+    changed = ids[new_stress != stress].tolist()
+    assert changed == [2, 4, 9]
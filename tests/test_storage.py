@@ -0,0 +1,79 @@
+import glob
+import os
+import sqlite3
+
+import pytest
+
+from VeraMatrix import PerNPCStorage, WorldStorage, log_writer, migrate_per_npc_files
+
+from .conftest import quiet_universe, run_quietly
+
+def npc_rows(directory):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "world*.sqlite"))):
+        conn = sqlite3.connect(path)
+        rows.extend(conn.execute("SELECT npc_id, name, country, state FROM Npcs"))
+        conn.close()
+    return sorted(rows)
+
+def test_world_storage_ids_start_at_one_and_key_every_record(output_dir):
+    storage = WorldStorage()
+    universe = run_quietly(quiet_universe(30, seed=2, storage=storage), 20)
+    log_writer.flush()
+    rows = npc_rows(storage.directory)
+    assert [npc_id for npc_id, _, _, _ in rows][:30] == list(range(1, 31))
+    events = 0
+    for npc in universe.npcs:
+        for table in ("LifeEvents", "Finances", "Status"):
+            records = storage.history(npc, table, limit=1000)
+            assert all(record[0] == npc.id for record in records)
+            assert records or table == "LifeEvents"  # Events are rare; finances and status are daily
+            events += table == "LifeEvents" and len(records)
+    assert events
+
+def test_a_directory_holds_one_run(output_dir):
+    first = WorldStorage()
+    run_quietly(quiet_universe(10, storage=first), 2)
+    log_writer.flush()
+    second = WorldStorage()  # A new run gets a directory of its own
+    run_quietly(quiet_universe(10, storage=second), 2)
+    log_writer.flush()
+    assert second.directory == first.directory + "_2"
+    assert [row[0] for row in npc_rows(second.directory)] == list(range(1, 11))
+    assert WorldStorage().directory == first.directory + "_3"
+    with pytest.raises(ValueError):
+        quiet_universe(10, storage=WorldStorage(directory=first.directory))
+
+def test_runs_in_fresh_directories_are_identical(tmp_path):
+    directories = [str(tmp_path / name) for name in ("a", "b")]
+    for directory in directories:
+        run_quietly(quiet_universe(25, seed=3, storage=WorldStorage(directory=directory)), 10)
+        log_writer.flush()
+    assert npc_rows(directories[0]) == npc_rows(directories[1])
+
+def test_state_shards(output_dir):
+    storage = WorldStorage(shard_by="state")
+    universe = quiet_universe(40, seed=4, storage=storage)
+    log_writer.flush()
+    states = {npc.home for npc in universe.npcs}
+    assert len(glob.glob(os.path.join(storage.directory, "world_*.sqlite"))) == len(states)
+    assert len(npc_rows(storage.directory)) == 40
+
+def test_migrate_per_npc_files(output_dir):
+    run_quietly(quiet_universe(15, seed=5, storage=PerNPCStorage()), 5)
+    log_writer.flush()
+    files = glob.glob(os.path.join(str(output_dir), "EarthData", "*", "*", "*_db.sqlite"))
+    events = 0
+    for path in files:
+        conn = sqlite3.connect(path)
+        events += conn.execute("SELECT COUNT(*) FROM LifeEvents").fetchone()[0]
+        conn.close()
+    storage = WorldStorage()
+    assert migrate_per_npc_files(storage) == len(files)
+    log_writer.flush()
+    conn = sqlite3.connect(os.path.join(storage.directory, "world.sqlite"))
+    assert conn.execute("SELECT COUNT(*) FROM LifeEvents").fetchone()[0] == events
+    assert [npc_id for npc_id, in conn.execute("SELECT npc_id FROM Npcs ORDER BY npc_id")] == list(range(1, len(files) + 1))
+    conn.close()
+    assert migrate_per_npc_files(storage) == len(files)  # A second import goes after the first
+    assert storage.next_id == 2 * len(files) + 1
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from VeraMatrix import PopulationTimeline, TimeSeries
+from VeraMatrix.timeseries import query, resolution_for
+
+from .conftest import quiet_universe, run_quietly
+
+def test_spilled_series_read_back_in_order(tmp_path):
+    series = TimeSeries((("day", "q"), ("value", "d")), memory_rows=100, spill_dir=str(tmp_path))
+    for day in range(1050):
+        series.append((day, day / 2))
+    assert len(series) == 1050 and series.spilled == 1000
+    assert list(series) == [(day, day / 2) for day in range(1050)]
+    assert series[999] == (999, 499.5) and series[-1] == (1049, 524.5)
+    assert series[95:105] == [(day, day / 2) for day in range(95, 105)]
+
+def test_population_timeline_keeps_datetimes(tmp_path):
+    timeline = PopulationTimeline(memory_rows=4, spill_dir=str(tmp_path))
+    points = [(datetime(2020, 1, 1, 12, 30) + timedelta(days=day), 100 + day) for day in range(10)]
+    timeline.extend(points)
+    assert list(timeline) == points
+
+def test_rollups_sum_the_days_of_their_period():
+    universe = run_quietly(quiet_universe(300, seed=91), 400)
+    daily = universe.history("day")
+    assert len(daily["date"]) == 400 and daily["population"][-1] == universe.population
+    for resolution in ("month", "year"):
+        rolled = universe.history(resolution, ("births", "deaths", "population"))
+        assert sum(rolled["births"]) == sum(daily["births"])
+        assert sum(rolled["deaths"]) == sum(daily["deaths"])
+        assert rolled["population"][-1] == universe.population
+        for last_day, births in zip(rolled["date"], rolled["births"]):
+            same = [b for date, b in zip(daily["date"], daily["births"])
+                    if (date.year, date.month if resolution == "month" else 0) ==
+                    (last_day.year, last_day.month if resolution == "month" else 0)]
+            assert births == sum(same)
+
+def test_runs_are_kept_apart():
+    first = run_quietly(quiet_universe(30, seed=92), 20)
+    second = run_quietly(quiet_universe(30, seed=93), 35)
+    assert first.run_id != second.run_id
+    assert len(first.history("day")["date"]) == 20 and len(second.history("day")["date"]) == 35
+    start = second.current_time - timedelta(days=9)
+    assert len(query(second.run_id, "day", ("population",), start=start)["population"]) == 10
+    assert resolution_for(second.run_id) == "day" and resolution_for(second.run_id, max_points=10) == "month"
@@ -0,0 +1,37 @@
+import math
+
+import numpy as np
+
+from VeraMatrix import EconomyAggregates
+from VeraMatrix.vectorized import VectorizedPopulation
+
+from .conftest import population_state, quiet_universe, run_quietly
+
+def test_vector_runs_are_reproducible():
+    first = run_quietly(quiet_universe(300, seed=11), 60, engine="vector")
+    second = run_quietly(quiet_universe(300, seed=11), 60, engine="vector")
+    assert population_state(first.npcs) == population_state(second.npcs)
+
+def test_columns_round_trip_through_the_npcs():
+    universe = quiet_universe(200, seed=12)
+    before = population_state(universe.npcs)
+    population = VectorizedPopulation(universe.npcs, log_records=False, streams=universe.random)
+    assert population.size == 200
+    np.testing.assert_array_equal(population.id[:200], [npc.id for npc in universe.npcs])
+    population.sync_to_npcs(universe.npcs)
+    assert population_state(universe.npcs) == before
+
+def test_sync_rebuilds_the_population_aggregates_and_indexes():
+    universe = run_quietly(quiet_universe(400, seed=13), 90, engine="vector")
+    exact = EconomyAggregates()
+    exact.rebuild(universe.npcs)
+    economy = universe.npcs.economy
+    assert economy.count() == exact.count() == len(universe.npcs)
+    assert math.isclose(economy.total("money"), exact.total("money"), rel_tol=1e-12)
+    assert economy.sketch.positive == exact.sketch.positive
+    for npc in list(universe.npcs)[:20]:
+        assert npc in universe.npcs.by_state(npc.state)
+    assert universe.count({"self_awareness": True}) == sum(npc.self_awareness for npc in universe.npcs)
+    npc = next(iter(universe.npcs))
+    npc.money += 5  # The setters report to the refreshed aggregates
+    assert math.isclose(universe.npcs.economy.total("money"), exact.total("money") + 5, rel_tol=1e-12)
@@ -0,0 +1,111 @@
+import json
+import os
+import pickle
+import random
+import sqlite3
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from VeraMatrix import WorldStorage, log_writer, vectorized
+from VeraMatrix.world import AliasTable, build_earth, load_planet, planet_from_dict
+
+from .conftest import quiet_universe, run_quietly
+
+GEOGRAPHY = {
+    "name": "Tiny",
+    "countries": [
+        {"name": "North", "states": [{"name": "Hills", "weight": 3.0}, "Coast"]},
+        {"name": "South", "states": [{"name": "Plains", "weight": 12.0}]},
+        {"name": "Island", "weight": 0.0, "states": ["Harbor"]},
+    ],
+    "migration": {"North": {"Island": 1.0}},
+}
+
+@pytest.mark.parametrize("weights", [[1.0], [1.0, 3.0], [5.0, 0.0, 2.0, 1.0], [0.1] * 7 + [9.3]])
+def test_alias_tables_pick_in_proportion(weights):
+    table = AliasTable(weights)
+    grid = (np.arange(100_000) + 0.5) / 100_000  # Evenly spread draws: the shares are exact up to the grid
+    picks = table.index_array(grid)
+    shares = np.bincount(picks, minlength=len(weights)) / len(grid)
+    np.testing.assert_allclose(shares, np.array(weights) / sum(weights), atol=1e-4)
+    assert [table.index(u) for u in grid[::997].tolist()] == picks[::997].tolist()
+    assert pickle.loads(pickle.dumps(table)).index_array(grid).tolist() == picks.tolist()
+
+@pytest.mark.parametrize("weights", [[], [0.0, 0.0], [1.0, -1.0]])
+def test_alias_tables_need_positive_weights(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+def test_geography_files_round_trip(tmp_path):
+    path = tmp_path / "tiny.json"
+    path.write_text(json.dumps(GEOGRAPHY))
+    planet = load_planet(str(path))
+    assert [country.weight for country in planet.countries] == [4.0, 12.0, 0.0]
+    assert planet_from_dict(planet.to_dict()).to_dict() == planet.to_dict()
+    earth = build_earth()
+    assert earth.name == "Earth" and all(country.states for country in earth.countries)
+
+@pytest.mark.parametrize("change", [
+    lambda data: data["countries"][0].update(states=[]),
+    lambda data: data["migration"].update(Atlantis={"North": 1.0}),
+    lambda data: data["migration"]["North"].update(Atlantis=1.0),
+])
+def test_bad_geography_is_rejected(change):
+    data = json.loads(json.dumps(GEOGRAPHY))
+    change(data)
+    with pytest.raises(ValueError):
+        planet_from_dict(data)
+
+def test_locations_and_trips_follow_the_weights():
+    planet = planet_from_dict(GEOGRAPHY)
+    rng = random.Random(3)
+    placed = Counter(planet.random_location(rng) for _ in range(16_000))
+    assert set(placed) == {("North", "Hills"), ("North", "Coast"), ("South", "Plains")}  # The island weighs nothing
+    assert placed["South", "Plains"] / 16_000 == pytest.approx(0.75, abs=0.02)
+    assert placed["North", "Hills"] / placed["North", "Coast"] == pytest.approx(3.0, rel=0.15)
+    north, south = planet.countries[:2]
+    assert {north.travel(rng) for _ in range(50)} == {("Island", "Harbor")}
+    assert {south.travel(rng)[0] for _ in range(200)} == {"North", "South"}  # No row: picked like a new NPC
+
+def test_a_universe_on_a_geography_file(tmp_path):
+    path = tmp_path / "tiny.json"
+    path.write_text(json.dumps(GEOGRAPHY))
+    universe = run_quietly(quiet_universe(200, seed=41, geography=str(path)), 30)
+    states = {"Hills", "Coast", "Plains", "Harbor"}
+    assert {npc.state for npc in universe.npcs} <= states
+    assert {state for _, state in (npc.home for npc in universe.npcs)} <= states - {"Harbor"}
+
+def test_vector_status_rows_follow_travel(output_dir, monkeypatch):
+    storage = WorldStorage()
+    universe = run_quietly(quiet_universe(300, seed=5, storage=storage), 200, engine="vector")
+    monkeypatch.setattr(vectorized, "DAILY_EVENT_CHANCE", 0.0)  # So no trip comes after the last Status rows
+    run_quietly(universe, 1, engine="vector")
+    log_writer.flush()
+    conn = sqlite3.connect(os.path.join(storage.directory, "world.sqlite"))
+    homes = {npc_id: f"{state}, {country}" for npc_id, country, state in conn.execute(
+        "SELECT npc_id, country, state FROM Npcs")}
+    last = dict(conn.execute("SELECT npc_id, location FROM Status ORDER BY rowid"))
+    logged = {location for location, in conn.execute("SELECT DISTINCT location FROM Status")}
+    travelled = {npc_id for npc_id, in conn.execute(
+        "SELECT DISTINCT npc_id FROM LifeEvents WHERE event = 'Traveled' AND consequences != 'Stayed home'")}
+    conn.close()
+    living = [npc.id for npc in universe.npcs if npc.alive]
+    assert logged <= {f"{state.name}, {country.name}" for planet in universe.planets
+                      for country in planet.countries for state in country.states}
+    assert len(travelled & set(living)) > 10
+    assert {npc_id: last[npc_id] for npc_id in living} == {npc_id: homes[npc_id] for npc_id in living}
+
+@pytest.mark.parametrize("engine", ["object", "vector"])
+def test_universes_travel_on_their_own_planets(engine, tmp_path):
+    path = tmp_path / "mirror.json"  # Countries named like Earth's, with other states
+    path.write_text(json.dumps({"name": "Mirror", "countries": [{"name": "USA", "states": ["Hills"]},
+                                                               {"name": "Germany", "states": ["Plains"]}]}))
+    mirror = quiet_universe(200, seed=42, geography=str(path))
+    earth = quiet_universe(200, seed=43)
+    for universe in (mirror, earth, mirror):
+        run_quietly(universe, 120, engine=engine)
+    assert {npc.state for npc in mirror.npcs} == {"Hills", "Plains"}
+    earth_states = {state.name for country in build_earth().countries for state in country.states}
+    assert {npc.state for npc in earth.npcs} <= earth_states